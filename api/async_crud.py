@@ -0,0 +1,514 @@
+from contextlib import asynccontextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from sqlalchemy import delete, func, select
+from sqlalchemy.sql import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import SQLAlchemyError
+from database.models import (
+    User,
+    UserType,
+    Magasin,
+    Produit,
+    Client,
+    Promotion,
+    Commande,
+    LigneCommande,
+    Livraison,
+    Facture,
+    StockMagasin,
+    HistoriqueFidelite,
+)
+from .catalog_cache import catalog_version, mark_catalog_dirty
+from .crud import (
+    PAGE_SIZE,
+    SEARCH_LIMIT,
+    _active_promotions_statement,
+    _decode_cursor,
+    _in_transaction,
+    _produit_page,
+    _produit_page_statement,
+    _produit_search_statement,
+    _search_match_expression,
+    _update_statement,
+    insert_historique_fidelite as _insert_historique_fidelite,
+)
+from .pricing import cached_prices, effective_prices_statement, store_prices
+
+# Async twins of the helpers in crud.py, for use from `async def` routes with
+# the session provided by `get_async_db`. Same arguments, same errors.
+
+
+@asynccontextmanager
+async def transaction(db: AsyncSession):
+    """Async counterpart of crud.transaction(); the two can be nested."""
+    depth = db.info.get("uow_depth", 0)
+    db.info["uow_depth"] = depth + 1
+    try:
+        yield db
+    except BaseException:
+        if depth == 0:
+            await db.rollback()
+        raise
+    else:
+        if depth == 0:
+            await db.commit()
+    finally:
+        db.info["uow_depth"] = depth
+
+
+async def _commit(db: AsyncSession, *instances) -> None:
+    if _in_transaction(db):
+        await db.flush()
+        return
+    await db.commit()
+    for instance in instances:
+        await db.refresh(instance)
+
+
+async def _rollback(db: AsyncSession) -> None:
+    if not _in_transaction(db):
+        await db.rollback()
+
+
+async def _get_foreign_key_record(db: AsyncSession, model, **filters):
+    result = await db.execute(select(model).filter_by(**filters).limit(1))
+    record = result.scalars().first()
+    if not record:
+        raise ValueError(f"{model.__name__} not found with filters {filters}")
+    return record
+
+
+async def _execute_update(
+    db: AsyncSession, model, filters: dict, values: dict, returning: tuple = ()
+) -> int | list:
+    result = await db.execute(_update_statement(model, filters, values, returning))
+    rows = result.all() if returning else None
+    num_rows_updated = len(rows) if returning else result.rowcount
+    if num_rows_updated == 0:
+        raise ValueError(
+            f"No records found for {model.__name__} with filters {filters}"
+        )
+    return rows if returning else num_rows_updated
+
+
+async def _update_fields(
+    db: AsyncSession, model, filters: dict, updates: dict, returning: tuple = ()
+) -> int | list:
+    try:
+        updated = await _execute_update(db, model, filters, updates, returning)
+        await _commit(db)
+        return updated
+    except SQLAlchemyError as e:
+        await _rollback(db)
+        raise ValueError(f"Error updating {model.__name__}: {e}")
+
+
+async def _increment_field(
+    db: AsyncSession,
+    model,
+    filters: dict,
+    field_to_increment: str,
+    increment_value: float,
+    returning: tuple = (),
+) -> int | list:
+    try:
+        updated = await _execute_update(
+            db,
+            model,
+            filters,
+            {field_to_increment: getattr(model, field_to_increment) + increment_value},
+            returning,
+        )
+        await _commit(db)
+        return updated
+    except SQLAlchemyError as e:
+        await _rollback(db)
+        raise ValueError(
+            f"Error incrementing {field_to_increment} for {model.__name__}: {e}"
+        )
+
+
+async def _decrement_field(
+    db: AsyncSession,
+    model,
+    filters: dict,
+    field_to_decrement: str,
+    decrement_value: float,
+    returning: tuple = (),
+) -> int | list:
+    try:
+        updated = await _execute_update(
+            db,
+            model,
+            filters,
+            {
+                field_to_decrement: func.max(
+                    getattr(model, field_to_decrement) - decrement_value, 0
+                )
+            },
+            returning,
+        )
+        await _commit(db)
+        return updated
+    except SQLAlchemyError as e:
+        await _rollback(db)
+        raise ValueError(
+            f"Error incrementing {field_to_decrement} for {model.__name__}: {e}"
+        )
+
+
+async def _fetch_by(db: AsyncSession, model, filters: dict) -> list:
+    result = await db.execute(select(model).filter_by(**filters))
+    return list(result.scalars().all())
+
+
+async def _fetch_by_conditions(
+    db: AsyncSession, model, conditions: list, logic: str
+) -> list:
+    if not conditions:
+        result = await db.execute(select(model))
+        return list(result.scalars().all())
+
+    logic_func = and_ if logic == "and" else or_ if logic == "or" else None
+    if logic_func is None:
+        raise ValueError(f"Unsupported logic: {logic}")
+
+    try:
+        result = await db.execute(select(model).filter(logic_func(*conditions)))
+        return list(result.scalars().all())
+    except SQLAlchemyError as e:
+        raise ValueError(
+            f"Error fetching with {logic} conditions {conditions}. Error: {e}"
+        )
+
+
+async def _delete_by(db: AsyncSession, model, filters: dict) -> int:
+    try:
+        result = await db.execute(delete(model).filter_by(**filters))
+        await _commit(db)
+        return result.rowcount
+    except SQLAlchemyError as e:
+        await _rollback(db)
+        raise ValueError(f"Error deleting {model.__name__} with {filters}: {e}")
+
+
+async def _save(db: AsyncSession, instance):
+    db.add(instance)
+    await _commit(db, instance)
+    return instance
+
+
+# AUTH
+async def insert_regular_user(
+    db: AsyncSession, id_user: int | None, username: str, password: str
+) -> User:
+    user = User(
+        id_user=id_user,
+        username=username,
+        hashed_password=password,
+        role=UserType.regular,
+    )
+    return await _save(db, user)
+
+
+async def insert_admin_user(
+    db: AsyncSession, id_user: int | None, username: str, password: str
+) -> User:
+    user = User(
+        id_user=id_user,
+        username=username,
+        hashed_password=password,
+        role=UserType.admin,
+    )
+    return await _save(db, user)
+
+
+async def fetch_user_by_username(db: AsyncSession, username: str) -> User | None:
+    users = await _fetch_by(db, User, {"username": username})
+    return users[0] if users else None
+
+
+# Insert Magasin entry
+async def insert_magasin(
+    db: AsyncSession,
+    id_magasin: int | None,
+    nom_magasin: str,
+    adresse: str,
+    ville: str,
+    telephone: str,
+) -> Magasin:
+    magasin = Magasin(
+        id_magasin=id_magasin,
+        nom_magasin=nom_magasin,
+        adresse=adresse,
+        ville=ville,
+        telephone=telephone,
+    )
+    return await _save(db, magasin)
+
+
+# Insert Produit entry
+async def insert_produit(
+    db: AsyncSession,
+    id_produit: int | None,
+    nom_produit: str,
+    categorie: str,
+    prix_unitaire: float,
+    stock_central: int | None,
+) -> Produit:
+    produit = Produit(
+        id_produit=id_produit,
+        nom_produit=nom_produit,
+        categorie=categorie,
+        prix_unitaire=prix_unitaire,
+        stock_central=stock_central,
+    )
+    mark_catalog_dirty(db)
+    return await _save(db, produit)
+
+
+# Insert Client entry
+async def insert_client(
+    db: AsyncSession,
+    id_client: int | None,
+    nom_client: str,
+    type_client: str,
+    adresse: str | None,
+    telephone: str | None,
+    point_fidelite: int | None,
+) -> Client:
+    client = Client(
+        id_client=id_client,
+        nom_client=nom_client,
+        type_client=type_client,
+        adresse=adresse,
+        telephone=telephone,
+        points_fidelite=point_fidelite,
+    )
+    return await _save(db, client)
+
+
+# Insert Promotion entry
+async def insert_promotion(
+    db: AsyncSession,
+    id_promotion: int | None,
+    id_produit: int,
+    description: str,
+    date_debut: str,
+    date_fin: str,
+    taux_reduction: float,
+) -> Promotion:
+    produit = await _get_foreign_key_record(db, Produit, id_produit=id_produit)
+
+    promotion = Promotion(
+        id_promotion=id_promotion,
+        id_produit=produit.id_produit,
+        description=description,
+        date_debut=date_debut,
+        date_fin=date_fin,
+        taux_reduction=taux_reduction,
+    )
+    mark_catalog_dirty(db)
+    return await _save(db, promotion)
+
+
+# Insert Commande entry
+async def insert_commande(
+    db: AsyncSession,
+    id_commande: int | None,
+    id_client: int,
+    id_magasin: int,
+    date_commande: datetime,
+    statut_commande: str,
+) -> Commande:
+    client = await _get_foreign_key_record(db, Client, id_client=id_client)
+    magasin = await _get_foreign_key_record(db, Magasin, id_magasin=id_magasin)
+
+    commande = Commande(
+        id_commande=id_commande,
+        id_client=client.id_client,
+        id_magasin=magasin.id_magasin,
+        date_commande=date_commande,
+        statut_commande=statut_commande,
+    )
+    return await _save(db, commande)
+
+
+# Insert LigneCommande entry
+async def insert_ligne_commande(
+    db: AsyncSession,
+    id_ligne: int | None,
+    id_commande: int,
+    id_produit: int,
+    quantite: int,
+    prix_unitaire: float,
+) -> LigneCommande:
+    commande = await _get_foreign_key_record(db, Commande, id_commande=id_commande)
+    produit = await _get_foreign_key_record(db, Produit, id_produit=id_produit)
+
+    ligne_commande = LigneCommande(
+        id_ligne=id_ligne,
+        id_commande=commande.id_commande,
+        id_produit=produit.id_produit,
+        quantite=quantite,
+        prix_unitaire=prix_unitaire,
+    )
+    return await _save(db, ligne_commande)
+
+
+# Insert Livraison entry
+async def insert_livraison(
+    db: AsyncSession,
+    id_livraison: int | None,
+    id_commande: int,
+    id_magasin: int,
+    date_livraison: datetime,
+    statut_livraison: str,
+) -> Livraison:
+    commande = await _get_foreign_key_record(db, Commande, id_commande=id_commande)
+    magasin = await _get_foreign_key_record(db, Magasin, id_magasin=id_magasin)
+
+    livraison = Livraison(
+        id_livraison=id_livraison,
+        id_commande=commande.id_commande,
+        id_magasin=magasin.id_magasin,
+        date_livraison=date_livraison,
+        statut_livraison=statut_livraison,
+    )
+    return await _save(db, livraison)
+
+
+# Insert Facture entry
+async def insert_facture(
+    db: AsyncSession,
+    id_facture: int | None,
+    id_commande: int,
+    montant_total: float,
+    date_facture: datetime,
+) -> Facture:
+    commande = await _get_foreign_key_record(db, Commande, id_commande=id_commande)
+
+    facture = Facture(
+        id_facture=id_facture,
+        id_commande=commande.id_commande,
+        date_facture=date_facture,
+        montant_total=montant_total,
+    )
+    return await _save(db, facture)
+
+
+# Insert StockMagasin entry
+async def insert_stock_magasin(
+    db: AsyncSession, id_magasin: int, id_produit: int, quantite: int | None
+) -> StockMagasin:
+    magasin = await _get_foreign_key_record(db, Magasin, id_magasin=id_magasin)
+    produit = await _get_foreign_key_record(db, Produit, id_produit=id_produit)
+
+    stock_magasin = StockMagasin(
+        id_magasin=magasin.id_magasin,
+        id_produit=produit.id_produit,
+        stock_disponible=quantite,
+    )
+    return await _save(db, stock_magasin)
+
+
+# Insert HistoriqueFidelite entry
+async def insert_historique_fidelite(
+    db: AsyncSession,
+    id_historique: int | None,
+    id_client: int,
+    date_operation: datetime,
+    point_ajoutes: int,
+    description: str | None,
+) -> HistoriqueFidelite:
+    # Through the loyalty ledger, which is sync
+    return await db.run_sync(
+        lambda session: _insert_historique_fidelite(
+            session,
+            id_historique,
+            id_client,
+            date_operation,
+            point_ajoutes,
+            description,
+        )
+    )
+
+
+async def update_produit_prix(
+    db: AsyncSession, id_produit: int, new_prix: float
+) -> int:
+    mark_catalog_dirty(db)
+    return await _update_fields(
+        db, Produit, {"id_produit": id_produit}, {"prix_unitaire": new_prix}
+    )
+
+
+async def increment_produit_stock(
+    db: AsyncSession, id_produit: int, increment_value: float
+) -> int:
+    return await _increment_field(
+        db, Produit, {"id_produit": id_produit}, "stock_central", increment_value
+    )
+
+
+async def decrement_produit_stock(
+    db: AsyncSession, id_produit: int, decrement_value: float
+) -> int:
+    return await _decrement_field(
+        db, Produit, {"id_produit": id_produit}, "stock_central", decrement_value
+    )
+
+
+async def fetch_produit_by_id(db: AsyncSession, id_produit: int) -> Produit:
+    return (await _fetch_by(db, Produit, {"id_produit": id_produit}))[0]
+
+
+async def fetch_produit_by_categorie(db: AsyncSession, categorie: str) -> list[Produit]:
+    return await _fetch_by(db, Produit, {"categorie": categorie})
+
+
+async def fetch_active_promotions(db: AsyncSession, day: date) -> list[Promotion]:
+    result = await db.scalars(_active_promotions_statement(day))
+    return list(result.all())
+
+
+async def search_produits(
+    db: AsyncSession, query: str, limit: int = SEARCH_LIMIT
+) -> list[Produit]:
+    match = _search_match_expression(query)
+    if match is None:
+        return []
+    result = await db.scalars(_produit_search_statement(match, limit))
+    return list(result.all())
+
+
+async def fetch_produits_page(
+    db: AsyncSession,
+    categorie: str | None = None,
+    sort: str = "nom",
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+) -> tuple[list[Produit], str | None]:
+    after = _decode_cursor(cursor, sort) if cursor else None
+    result = await db.scalars(_produit_page_statement(categorie, sort, after, limit))
+    return _produit_page(list(result.all()), sort, limit)
+
+
+async def fetch_categories(db: AsyncSession) -> list[str]:
+    result = await db.scalars(
+        select(Produit.categorie).distinct().order_by(Produit.categorie)
+    )
+    return list(result.all())
+
+
+async def effective_prices(
+    db: AsyncSession, ids, day: date | None = None
+) -> dict[int, Decimal]:
+    day = day or date.today()
+    prices, missing = cached_prices(ids, day)
+    if missing:
+        version = catalog_version()
+        result = await db.execute(effective_prices_statement(missing, day))
+        prices.update(store_prices(result.all(), day, version))
+    return prices
@@ -3,11 +3,14 @@ from typing import Annotated
 from fastapi import APIRouter, Depends, HTTPException, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
-from ..database.connect_db import get_db_connection
+from ..database.connect_db import get_async_db
 from ..database.models import User, UserType
-from passlib.context import CryptContext
+from .passwords import hash_password, verify_password
+from .sessions import create_session, lookup_session, revoke_session
+from .token_cache import cache_payload, cached_payload, invalidate_token
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
 import jwt
 import os
@@ -19,9 +22,9 @@ auth_router = APIRouter(prefix="/auth", tags=["auth"])
 
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("HASH_ALGORITHM")
+# Tokens and their server-side session expire together
+ACCESS_TOKEN_TTL = timedelta(minutes=20)
 
-
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="auth/token")
 
 
@@ -35,7 +38,7 @@ class Token(BaseModel):
     token_type: str
 
 
-db_dependency = Annotated[Session, Depends(get_db_connection)]
+db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
 
 
 @auth_router.post("/signup", response_class=HTMLResponse)
@@ -54,7 +57,9 @@ async def signup(
         """
 
     # Check if user exists
-    existing_user = db.query(User).filter(User.username == username).first()
+    existing_user = (
+        await db.scalars(select(User).filter(User.username == username).limit(1))
+    ).first()
     if existing_user:
         return """
         <div class="error-message" role="alert">
@@ -65,11 +70,11 @@ async def signup(
     # Create new user
     create_user_model = User(
         username=username,
-        hashed_password=bcrypt_context.hash(password),
+        hashed_password=await hash_password(password),
         role=UserType.regular,
     )
     db.add(create_user_model)
-    db.commit()
+    await db.commit()
 
     # Return success message
     return """
@@ -85,7 +90,7 @@ async def login(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: db_dependency,
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
 
     if not user:
         # If it's an HTMX request, return error HTML
@@ -102,8 +107,9 @@ async def login(
         )
 
     # If the login is successful, create the access token
+    session = await create_session(db, user.id_user, ACCESS_TOKEN_TTL)
     token = create_access_token(
-        user.username, user.id_user, user.role, timedelta(minutes=20)
+        user.username, user.id_user, user.role, ACCESS_TOKEN_TTL, session.session_token
     )
 
     # Check if the request is an HTMX request
@@ -120,40 +126,79 @@ async def login(
     return Token(access_token=token, token_type="bearer")
 
 
-def authenticate_user(db, username: str, password: str) -> bool | User:
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(
+    db: AsyncSession, username: str, password: str
+) -> bool | User:
+    user = (
+        await db.scalars(select(User).filter(User.username == username).limit(1))
+    ).first()
     if not user:
         return False
-    if not bcrypt_context.verify(password, user.hashed_password):
+    valid, new_hash = await verify_password(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
 def create_access_token(
-    username: str, id_user: int, role: UserType, expires_delta: timedelta
+    username: str,
+    id_user: int,
+    role: UserType,
+    expires_delta: timedelta,
+    session_token: str,
 ):
-    encode = {"id": id_user, "sub": username, "role": role.value}
+    encode = {"id": id_user, "sub": username, "role": role.value, "sid": session_token}
     expires = datetime.now(timezone.utc) + expires_delta
     encode.update({"exp": expires})
     return jwt.encode(encode, SECRET_KEY, algorithm=ALGORITHM)  # type: ignore
 
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_bearer)]):
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])  # type: ignore
-        username: str | None = payload.get("sub")
-        id_user: str | None = payload.get("id")
-        role: str | None = payload.get("role")
-        if username is None or id_user is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Could not validate user.",
-            )
-        return {"id_user": id_user, "username": username, "role": role}
-    except jwt.InvalidTokenError:
+def _decode_token(token: str) -> dict | None:
+    payload = cached_payload(token)
+    if payload is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])  # type: ignore
+        except jwt.InvalidTokenError:
+            return None
+        cache_payload(token, payload)
+    return payload
+
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_bearer)], db: db_dependency
+):
+    payload = _decode_token(token)
+    if payload is None:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate user."
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate user.",
         )
+    username: str | None = payload.get("sub")
+    id_user: str | None = payload.get("id")
+    role: str | None = payload.get("role")
+    session_token: str | None = payload.get("sid")
+    if (
+        username is None
+        or id_user is None
+        or session_token is None
+        # Logged out, or the session expired or was revoked
+        or await lookup_session(db, session_token) != id_user
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate user.",
+        )
+    return {"id_user": id_user, "username": username, "role": role}
+
+
+def _request_token(request: Request) -> str | None:
+    token = request.cookies.get("access_token") or request.headers.get("authorization")
+    if token and token.lower().startswith("bearer "):
+        token = token[len("bearer ") :]
+    return token
 
 
 async def get_current_admin_user(
@@ -168,7 +213,14 @@ async def get_current_admin_user(
 
 
 @auth_router.post("/logout", response_class=RedirectResponse)
-async def logout():
+async def logout(request: Request, db: db_dependency):
+    token = _request_token(request)
+    if token:
+        payload = _decode_token(token)
+        invalidate_token(token)
+        if payload and payload.get("sid"):
+            await revoke_session(db, payload["sid"])
+
     # Create a RedirectResponse that directly points to the login page
     response = RedirectResponse(url="/login")
 
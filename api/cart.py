@@ -0,0 +1,247 @@
+import asyncio
+import fcntl
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Panier, Produit
+from .async_crud import effective_prices
+
+# Shopping carts are kept in memory, one {id_produit: quantite} dict per user,
+# so add/remove/update and the badge count are O(1) and never query the
+# database once a cart is loaded. Writes are deferred: every edit records the
+# product's latest quantity in _pending, so ten clicks on "Add to Cart" become
+# one upsert, and flush_carts() writes everything pending in one transaction.
+# The app runs it every FLUSH_INTERVAL seconds and at shutdown.
+#
+# Carts are per process: a second worker would serve, and write back, its own
+# stale copy of them. The app claims CART_LOCK_FILE at startup, so a second
+# process sharing the database refuses to start.
+MAX_CACHED_CARTS = 10_000
+FLUSH_INTERVAL = 2.0  # seconds
+CART_LOCK_FILE = os.getenv("CART_LOCK_FILE", "database/carts.lock")
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_carts: OrderedDict[int, dict[int, int]] = OrderedDict()
+_counts: dict[int, int] = {}
+# {id_user: {id_produit: quantite}}, quantite 0 deletes the row
+_pending: dict[int, dict[int, int]] = {}
+_flushing: dict[int, dict[int, int]] = {}
+stats = {"flushes": 0, "rows_written": 0}
+# The open lock file while this process serves the carts
+_owner = None
+
+
+@dataclass
+class CartItem:
+    id: int  # id_produit
+    product: Produit
+    quantity: int
+    price: Decimal  # effective unit price
+
+    @property
+    def subtotal(self) -> Decimal:
+        return self.price * self.quantity
+
+
+def claim_carts(path: str = CART_LOCK_FILE) -> None:
+    """Make this process the one serving carts, or raise RuntimeError.
+
+    The lock is held until release_carts() or the end of the process.
+    """
+    global _owner
+    handle = open(path, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        raise RuntimeError(
+            f"Carts are already served by another process holding {path}: "
+            "run a single worker"
+        )
+    _owner = handle
+
+
+def release_carts() -> None:
+    global _owner
+    if _owner is not None:
+        fcntl.flock(_owner, fcntl.LOCK_UN)
+        _owner.close()
+        _owner = None
+
+
+def _evict(keep: int) -> None:
+    # Carts with unsaved changes stay, they are the only copy
+    for id_user in list(_carts):
+        if len(_carts) <= MAX_CACHED_CARTS:
+            return
+        if id_user != keep and id_user not in _pending and id_user not in _flushing:
+            del _carts[id_user]
+            del _counts[id_user]
+
+
+async def _load_cart(db: AsyncSession, id_user: int) -> None:
+    with _lock:
+        if id_user in _carts:
+            _carts.move_to_end(id_user)
+            return
+    rows = (
+        await db.execute(
+            select(Panier.id_produit, Panier.quantite).where(Panier.id_user == id_user)
+        )
+    ).all()
+    with _lock:
+        if id_user not in _carts:
+            _carts[id_user] = dict(rows)
+            _counts[id_user] = sum(quantite for _, quantite in rows)
+            _evict(keep=id_user)
+
+
+def _set_quantity(id_user: int, id_produit: int, quantite: int) -> int:
+    # Caller holds _lock
+    cart = _carts[id_user]
+    _counts[id_user] += quantite - cart.get(id_produit, 0)
+    if quantite:
+        cart[id_produit] = quantite
+    else:
+        cart.pop(id_produit, None)
+    _pending.setdefault(id_user, {})[id_produit] = quantite
+    return _counts[id_user]
+
+
+async def add_item(
+    db: AsyncSession, id_user: int, id_produit: int, quantite: int = 1
+) -> int:
+    """Add quantite of a product to the cart, return the new item count."""
+    if quantite <= 0:
+        raise ValueError(f"Invalid quantity {quantite} for produit {id_produit}")
+    if id_produit not in await effective_prices(db, [id_produit]):
+        raise ValueError(
+            f"Produit not found with filters {{'id_produit': {id_produit}}}"
+        )
+    await _load_cart(db, id_user)
+    with _lock:
+        current = _carts[id_user].get(id_produit, 0)
+        return _set_quantity(id_user, id_produit, current + quantite)
+
+
+async def update_quantity(
+    db: AsyncSession, id_user: int, id_produit: int, quantite: int
+) -> int:
+    """Set a product's quantity, 0 removes it; return the new item count."""
+    if quantite < 0:
+        raise ValueError(f"Invalid quantity {quantite} for produit {id_produit}")
+    await _load_cart(db, id_user)
+    with _lock:
+        if id_produit not in _carts[id_user]:
+            raise ValueError(
+                f"Cart item not found with filters "
+                f"{{'id_user': {id_user}, 'id_produit': {id_produit}}}"
+            )
+        return _set_quantity(id_user, id_produit, quantite)
+
+
+async def remove_item(db: AsyncSession, id_user: int, id_produit: int) -> int:
+    await _load_cart(db, id_user)
+    with _lock:
+        return _set_quantity(id_user, id_produit, 0)
+
+
+async def cart_count(db: AsyncSession, id_user: int) -> int:
+    await _load_cart(db, id_user)
+    with _lock:
+        return _counts[id_user]
+
+
+async def cart_items(
+    db: AsyncSession, id_user: int, day: date | None = None
+) -> list[CartItem]:
+    await _load_cart(db, id_user)
+    with _lock:
+        quantities = dict(_carts[id_user])
+    if not quantities:
+        return []
+    produits = {
+        produit.id_produit: produit
+        for produit in await db.scalars(
+            select(Produit).where(Produit.id_produit.in_(quantities))
+        )
+    }
+    prices = await effective_prices(db, quantities, day)
+    return [
+        CartItem(id_produit, produits[id_produit], quantite, prices[id_produit])
+        for id_produit, quantite in quantities.items()
+        if id_produit in produits
+    ]
+
+
+async def flush_carts(db: AsyncSession) -> int:
+    """Write pending cart changes in one transaction, return the rows written."""
+    global _flushing
+    with _lock:
+        if not _pending:
+            return 0
+        _flushing = dict(_pending)
+        _pending.clear()
+    batch = _flushing
+    upserts, deletes = [], []
+    for id_user, quantities in batch.items():
+        for id_produit, quantite in quantities.items():
+            row = {"id_user": id_user, "id_produit": id_produit, "quantite": quantite}
+            (upserts if quantite else deletes).append(row)
+
+    try:
+        if upserts:
+            upsert = insert(Panier.__table__)
+            await db.execute(
+                upsert.on_conflict_do_update(
+                    index_elements=["id_user", "id_produit"],
+                    set_={"quantite": upsert.excluded.quantite},
+                ),
+                upserts,
+            )
+        if deletes:
+            await db.execute(
+                delete(Panier.__table__).where(
+                    Panier.id_user == bindparam("id_user"),
+                    Panier.id_produit == bindparam("id_produit"),
+                ),
+                deletes,
+            )
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        with _lock:
+            # Requeue, keeping any newer edit made during the flush
+            for id_user, quantities in batch.items():
+                newer = _pending.setdefault(id_user, {})
+                for id_produit, quantite in quantities.items():
+                    newer.setdefault(id_produit, quantite)
+        raise
+    finally:
+        with _lock:
+            _flushing = {}
+
+    stats["flushes"] += 1
+    stats["rows_written"] += len(upserts) + len(deletes)
+    return len(upserts) + len(deletes)
+
+
+async def run_cart_flusher(session_factory, interval: float = FLUSH_INTERVAL) -> None:
+    """Background task: flush pending cart changes every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                await flush_carts(db)
+        except SQLAlchemyError:
+            logger.exception("Cart flush failed")
@@ -0,0 +1,84 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Rendered catalog fragments (promotions, product grid, ...) shared by every
+# request of this worker. Entries are dropped when a transaction that touched
+# products or promotions commits. Writes made by another process can't reach
+# us, so entries also expire after FRAGMENT_TTL seconds. At most
+# MAX_FRAGMENTS are kept, least recently used first out.
+FRAGMENT_TTL = 60.0
+MAX_FRAGMENTS = 256
+
+_lock = threading.Lock()
+_version = 0
+# key -> (expiry, html), least recently used first
+_fragments: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0}
+
+
+def catalog_version() -> int:
+    return _version
+
+
+def invalidate_catalog() -> None:
+    global _version
+    with _lock:
+        _version += 1
+        _fragments.clear()
+        stats["invalidations"] += 1
+
+
+def mark_catalog_dirty(db) -> None:
+    # Invalidation is deferred to commit so a concurrent request can't cache
+    # the old catalog again between our write and our commit. The callback
+    # itself is stored so that whichever listener pops it, it is this
+    # module's cache that gets cleared.
+    db.info["invalidate_catalog"] = invalidate_catalog
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_after_commit(session):
+    invalidate = session.info.pop("invalidate_catalog", None)
+    if invalidate is not None:
+        invalidate()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("invalidate_catalog", None)
+
+
+def _store(key: tuple, expires: float, html: str, now: float) -> None:
+    # Called with _lock held. Expired entries go first (keys carry the day,
+    # so yesterday's would otherwise linger), then the least recently used.
+    for stale in [k for k, (expiry, _) in _fragments.items() if expiry <= now]:
+        del _fragments[stale]
+        stats["evictions"] += 1
+    _fragments[key] = (expires, html)
+    _fragments.move_to_end(key)
+    while len(_fragments) > MAX_FRAGMENTS:
+        _fragments.popitem(last=False)
+        stats["evictions"] += 1
+
+
+async def get_fragment(key: tuple, render: Callable[[], Awaitable[str]]) -> str:
+    now = time.monotonic()
+    with _lock:
+        cached = _fragments.get(key)
+        if cached is not None and cached[0] > now:
+            _fragments.move_to_end(key)
+            stats["hits"] += 1
+            return cached[1]
+        stats["misses"] += 1
+        version = _version
+
+    html = await render()
+    with _lock:
+        # Don't store a fragment rendered from data that changed meanwhile
+        if version == _version:
+            _store(key, now + FRAGMENT_TTL, html, now)
+    return html
@@ -0,0 +1,103 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from database.models import (
+    Client,
+    Magasin,
+    Commande,
+    LigneCommande,
+    Facture,
+)
+from .crud import check_foreign_keys, transaction
+from .loyalty import accrue_points, points_for
+from .pricing import effective_prices
+from .reservations import confirm_reservation, merge_lines, take_stock
+
+
+def place_order(
+    db: Session,
+    id_client: int,
+    id_magasin: int,
+    lines: Iterable[tuple[int, int]],
+    date_commande: datetime | None = None,
+    reservation: str | None = None,
+) -> Commande:
+    """Create a paid order from (id_produit, quantite) lines in one transaction.
+
+    Lines are charged at the products' effective (promotion-adjusted) price.
+    Inserts the Commande, its lines and its Facture, takes the quantities out
+    of the central stock and credits the client's loyalty points. With the
+    token of a reservation (see api/reservations.py) holding exactly these
+    lines, in the central stock or this store's, the held stock is used
+    instead and the reservation is confirmed.
+    Raises ValueError, leaving nothing behind, if the client, the store or a
+    product is unknown, if a product doesn't have enough stock, or if the
+    reservation is unknown, expired, held at another store or for other lines.
+    """
+    quantities = merge_lines(lines)
+    date_commande = date_commande or datetime.now()
+
+    with transaction(db):
+        check_foreign_keys(db, Client, "id_client", [id_client])
+        check_foreign_keys(db, Magasin, "id_magasin", [id_magasin])
+
+        prix = effective_prices(db, quantities, date_commande.date())
+        missing = sorted(quantities.keys() - prix.keys())
+        if missing:
+            raise ValueError(f"Produit not found with id_produit in {missing}")
+        if reservation is None:
+            take_stock(db, quantities)
+        elif confirm_reservation(db, reservation, id_magasin) != quantities:
+            raise ValueError(f"Reservation {reservation} doesn't match the order")
+
+        commande = Commande(
+            id_client=id_client,
+            id_magasin=id_magasin,
+            date_commande=date_commande,
+            statut_commande="En cours",
+        )
+        db.add(commande)
+        db.flush()
+
+        db.execute(
+            insert(LigneCommande),
+            [
+                {
+                    "id_commande": commande.id_commande,
+                    "id_produit": id_produit,
+                    "quantite": quantite,
+                    "prix_unitaire": prix[id_produit],
+                }
+                for id_produit, quantite in quantities.items()
+            ],
+        )
+
+        montant_total = sum(
+            (
+                Decimal(prix[id_produit]) * quantite
+                for id_produit, quantite in quantities.items()
+            ),
+            Decimal(0),
+        )
+        facture = Facture(
+            commande=commande,
+            montant_total=montant_total,
+            date_facture=date_commande,
+        )
+        db.add(facture)
+        db.flush()
+
+        points = points_for(montant_total)
+        if points:
+            accrue_points(
+                db,
+                id_client,
+                points,
+                f"Commande {commande.id_commande}",
+                facture.id_facture,
+                date_commande,
+            )
+
+    return commande
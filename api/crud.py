@@ -1,7 +1,23 @@
-from datetime import datetime
+import base64
+import json
+import re
+from contextlib import contextmanager
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import batched
+from typing import Iterable
 from sqlalchemy.sql import and_, or_
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy import (
+    case,
+    func,
+    insert,
+    literal_column,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy.exc import SQLAlchemyError
 from database.models import (
     User,
@@ -16,7 +32,64 @@ from database.models import (
     Facture,
     StockMagasin,
     HistoriqueFidelite,
+    produits_fts,
 )
+from .catalog_cache import mark_catalog_dirty
+
+BULK_CHUNK_SIZE = 1000
+SEARCH_LIMIT = 20
+PAGE_SIZE = 24
+
+# sort name -> (column, descending)
+PRODUIT_SORTS = {
+    "nom": (Produit.nom_produit, False),
+    "prix": (Produit.prix_unitaire, False),
+    "prix_desc": (Produit.prix_unitaire, True),
+}
+
+
+@contextmanager
+def transaction(db: Session):
+    """Run several crud calls as one atomic unit of work.
+
+    Inside the block the crud functions only flush; the outermost block
+    commits once on exit, or rolls everything back if an exception escapes.
+    Blocks can be nested.
+    """
+    depth = db.info.get("uow_depth", 0)
+    db.info["uow_depth"] = depth + 1
+    try:
+        yield db
+    except BaseException:
+        if depth == 0:
+            db.rollback()
+        raise
+    else:
+        if depth == 0:
+            db.commit()
+    finally:
+        db.info["uow_depth"] = depth
+
+
+def _in_transaction(db) -> bool:
+    return db.info.get("uow_depth", 0) > 0
+
+
+def _commit(db: Session, *instances) -> None:
+    if _in_transaction(db):
+        # Flushing assigns the generated ids, and flushed attributes are not
+        # expired, so there is nothing to refresh.
+        db.flush()
+        return
+    db.commit()
+    for instance in instances:
+        db.refresh(instance)
+
+
+def _rollback(db: Session) -> None:
+    # Within a unit of work the outermost transaction() block decides
+    if not _in_transaction(db):
+        db.rollback()
 
 
 def _get_foreign_key_record(db: Session, model, **filters):
@@ -26,75 +99,128 @@ def _get_foreign_key_record(db: Session, model, **filters):
     return record
 
 
-def _update_fields(db: Session, model, filters: dict, updates: dict) -> int:
-    query = db.query(model).filter_by(**filters)
+def _update_statement(model, filters: dict, values: dict, returning: tuple = ()):
+    statement = update(model).filter_by(**filters).values(values)
+    if returning:
+        statement = statement.returning(*(getattr(model, name) for name in returning))
+    return statement
+
 
-    if query.count() == 0:
+def _execute_update(
+    db: Session, model, filters: dict, values: dict, returning: tuple = ()
+) -> int | list:
+    # A single UPDATE: "not found" is read from the rowcount (or the returned
+    # rows) instead of a COUNT beforehand, which could also race the update.
+    result = db.execute(_update_statement(model, filters, values, returning))
+    rows = result.all() if returning else None
+    num_rows_updated = len(rows) if returning else result.rowcount
+    if num_rows_updated == 0:
         raise ValueError(
             f"No records found for {model.__name__} with filters {filters}"
         )
+    return rows if returning else num_rows_updated
+
 
+def _update_fields(
+    db: Session, model, filters: dict, updates: dict, returning: tuple = ()
+) -> int | list:
     try:
-        # Update record(s) with new values
-        num_rows_updated = query.update(updates, synchronize_session="fetch")
-        db.commit()
-        return num_rows_updated
+        updated = _execute_update(db, model, filters, updates, returning)
+        _commit(db)
+        return updated
     except SQLAlchemyError as e:
-        db.rollback()
+        _rollback(db)
         raise ValueError(f"Error updating {model.__name__}: {e}")
 
 
 def _increment_field(
-    db: Session, model, filters: dict, field_to_increment: str, increment_value: float
-) -> int:
-    query = db.query(model).filter_by(**filters)
-    if query.count() == 0:
-        raise ValueError(
-            f"No records found for {model.__name__} with filters {filters}"
-        )
+    db: Session,
+    model,
+    filters: dict,
+    field_to_increment: str,
+    increment_value: float,
+    returning: tuple = (),
+) -> int | list:
     try:
-        # Update record(s) with new values
-        num_rows_updated = query.update(
+        updated = _execute_update(
+            db,
+            model,
+            filters,
             {field_to_increment: getattr(model, field_to_increment) + increment_value},
-            synchronize_session="fetch",
+            returning,
         )
-        db.commit()
-        return num_rows_updated
+        _commit(db)
+        return updated
     except SQLAlchemyError as e:
-        db.rollback()
+        _rollback(db)
         raise ValueError(
             f"Error incrementing {field_to_increment} for {model.__name__}: {e}"
         )
 
 
 def _decrement_field(
-    db: Session, model, filters: dict, field_to_decrement: str, decrement_value: float
-) -> int:
-    query = db.query(model).filter_by(**filters)
-    if query.count() == 0:
-        raise ValueError(
-            f"No records found for {model.__name__} with filters {filters}"
-        )
-
+    db: Session,
+    model,
+    filters: dict,
+    field_to_decrement: str,
+    decrement_value: float,
+    returning: tuple = (),
+) -> int | list:
     try:
-        # Update record(s) with new values
-        num_rows_updated = query.update(
+        updated = _execute_update(
+            db,
+            model,
+            filters,
             {
                 field_to_decrement: func.max(
                     getattr(model, field_to_decrement) - decrement_value, 0
                 )
             },
-            synchronize_session="fetch",
+            returning,
         )
-        db.commit()
-        return num_rows_updated
+        _commit(db)
+        return updated
     except SQLAlchemyError as e:
-        db.rollback()
+        _rollback(db)
         raise ValueError(
             f"Error incrementing {field_to_decrement} for {model.__name__}: {e}"
         )
 
 
+def _bulk_increment_field(
+    db: Session, model, key: str, field_to_increment: str, deltas: dict
+) -> dict:
+    # Applies {key value: delta} pairs with one UPDATE ... CASE and returns
+    # {key value: new value}. Negative deltas are allowed and not clamped.
+    if not deltas:
+        return {}
+    key_column = getattr(model, key)
+    field = getattr(model, field_to_increment)
+    statement = (
+        update(model)
+        .where(key_column.in_(deltas))
+        .values({field_to_increment: field + case(deltas, value=key_column)})
+        .returning(key_column, field)
+    )
+    try:
+        new_values = dict(db.execute(statement).all())
+        missing = sorted(deltas.keys() - new_values.keys())
+        if missing:
+            raise ValueError(
+                f"No records found for {model.__name__} with {key} in {missing}"
+            )
+        _commit(db)
+        return new_values
+    except SQLAlchemyError as e:
+        _rollback(db)
+        raise ValueError(
+            f"Error incrementing {field_to_increment} for {model.__name__}: {e}"
+        )
+    except ValueError:
+        _rollback(db)
+        raise
+
+
 def _fetch_by(db: Session, model, filters: dict) -> list:
     query = db.query(model).filter_by(**filters)
     return query.all()
@@ -120,13 +246,59 @@ def _fetch_by_conditions(db: Session, model, conditions: list, logic: str) -> li
 def _delete_by(db: Session, model, filters: dict) -> int:
     try:
         num_deleted = db.query(model).filter_by(**filters).delete()
-        db.commit()
+        _commit(db)
         return num_deleted
     except SQLAlchemyError as e:
-        db.rollback()
+        _rollback(db)
         raise ValueError(f"Error deleting {model.__name__} with {filters}: {e}")
 
 
+def check_foreign_keys(db: Session, model, column_name: str, values) -> None:
+    """Raise ValueError listing the values with no model row, in one query."""
+    wanted = set(values)
+    if not wanted:
+        return
+    column = getattr(model, column_name)
+    found = set(db.scalars(select(column).where(column.in_(wanted))))
+    missing = wanted - found
+    if missing:
+        raise ValueError(
+            f"{model.__name__} not found with {column_name} in {sorted(missing)}"
+        )
+
+
+def _bulk_insert(
+    db: Session,
+    model,
+    rows: Iterable[dict],
+    foreign_keys: tuple = (),
+    chunk_size: int = BULK_CHUNK_SIZE,
+    catalog: bool = False,
+) -> list[int]:
+    # One set-based FK check per parent table and one multi-row INSERT per
+    # chunk, each chunk in its own transaction unless we're inside a
+    # transaction() block. Generated ids come back through RETURNING, in the
+    # order the rows were given. Each commit consumes the catalog mark, so
+    # catalog rows mark it again for every chunk.
+    primary_key = model.__mapper__.primary_key[0]
+    statement = insert(model).returning(primary_key, sort_by_parameter_order=True)
+    ids = []
+    for chunk in batched(rows, chunk_size):
+        for column_name, parent in foreign_keys:
+            check_foreign_keys(
+                db, parent, column_name, (row[column_name] for row in chunk)
+            )
+        try:
+            ids.extend(db.scalars(statement, list(chunk)))
+            if catalog:
+                mark_catalog_dirty(db)
+            _commit(db)
+        except SQLAlchemyError as e:
+            _rollback(db)
+            raise ValueError(f"Error inserting {model.__name__}: {e}")
+    return ids
+
+
 # AUTH
 def insert_regular_user(
     db: Session, id_user: int | None, username: str, password: str
@@ -139,8 +311,7 @@ def insert_regular_user(
     )
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    _commit(db, user)
     return user
 
 
@@ -155,8 +326,7 @@ def insert_admin_user(
     )
 
     db.add(user)
-    db.commit()
-    db.refresh(user)
+    _commit(db, user)
     return user
 
 
@@ -178,8 +348,7 @@ def insert_magasin(
     )
 
     db.add(magasin)
-    db.commit()
-    db.refresh(magasin)
+    _commit(db, magasin)
     return magasin
 
 
@@ -201,8 +370,8 @@ def insert_produit(
     )
 
     db.add(produit)
-    db.commit()
-    db.refresh(produit)
+    mark_catalog_dirty(db)
+    _commit(db, produit)
     return produit
 
 
@@ -226,8 +395,7 @@ def insert_client(
     )
 
     db.add(client)
-    db.commit()
-    db.refresh(client)
+    _commit(db, client)
     return client
 
 
@@ -256,8 +424,8 @@ def insert_promotion(
     )
 
     db.add(promotion)
-    db.commit()
-    db.refresh(promotion)
+    mark_catalog_dirty(db)
+    _commit(db, promotion)
     return promotion
 
 
@@ -288,8 +456,7 @@ def insert_commande(
     )
 
     db.add(commande)
-    db.commit()
-    db.refresh(commande)
+    _commit(db, commande)
     return commande
 
 
@@ -320,8 +487,7 @@ def insert_ligne_commande(
     )
 
     db.add(ligne_commande)
-    db.commit()
-    db.refresh(ligne_commande)
+    _commit(db, ligne_commande)
     return ligne_commande
 
 
@@ -352,8 +518,7 @@ def insert_livraison(
     )
 
     db.add(livraison)
-    db.commit()
-    db.refresh(livraison)
+    _commit(db, livraison)
     return livraison
 
 
@@ -378,8 +543,7 @@ def insert_facture(
     )
 
     db.add(facture)
-    db.commit()
-    db.refresh(facture)
+    _commit(db, facture)
     return facture
 
 
@@ -403,8 +567,7 @@ def insert_stock_magasin(
     )
 
     db.add(stock_magasin)
-    db.commit()
-    db.refresh(stock_magasin)
+    _commit(db, stock_magasin)
     return stock_magasin
 
 
@@ -417,38 +580,92 @@ def insert_historique_fidelite(
     point_ajoutes: int,
     description: str | None,
 ) -> HistoriqueFidelite:
-    client = _get_foreign_key_record(db, Client, id_client=id_client)
+    """Journal an accrual (positive) or a redemption (negative) through the
+    ledger, which also moves the balance. The journal assigns id_historique."""
+    from .loyalty import accrue_points, redeem_points
+
+    if point_ajoutes < 0:
+        redeem_points(db, id_client, -point_ajoutes, description, date_operation)
+    else:
+        accrue_points(db, id_client, point_ajoutes, description, None, date_operation)
+    return db.scalars(
+        select(HistoriqueFidelite)
+        .where(HistoriqueFidelite.id_client == id_client)
+        .order_by(HistoriqueFidelite.id_historique.desc())
+        .limit(1)
+    ).one()
+
+
+def bulk_insert_magasins(
+    db: Session, magasins: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(db, Magasin, magasins, chunk_size=chunk_size)
+
+
+def bulk_insert_produits(
+    db: Session, produits: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(db, Produit, produits, chunk_size=chunk_size, catalog=True)
+
+
+def bulk_insert_clients(
+    db: Session, clients: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(db, Client, clients, chunk_size=chunk_size)
+
+
+def bulk_insert_commandes(
+    db: Session, commandes: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(
+        db,
+        Commande,
+        commandes,
+        foreign_keys=(("id_client", Client), ("id_magasin", Magasin)),
+        chunk_size=chunk_size,
+    )
 
-    if not client:
-        raise ValueError("Client not found")
 
-    historique_fidelite = HistoriqueFidelite(
-        id_historique=id_historique,
-        id_client=client.id_client,
-        date_operation=date_operation,
-        point_ajoutes=point_ajoutes,
-        description=description,
+def bulk_insert_lignes_commande(
+    db: Session, lignes: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(
+        db,
+        LigneCommande,
+        lignes,
+        foreign_keys=(("id_commande", Commande), ("id_produit", Produit)),
+        chunk_size=chunk_size,
     )
 
-    db.add(historique_fidelite)
-    db.commit()
-    db.refresh(historique_fidelite)
-    return historique_fidelite
+
+def bulk_insert_factures(
+    db: Session, factures: Iterable[dict], chunk_size: int = BULK_CHUNK_SIZE
+) -> list[int]:
+    return _bulk_insert(
+        db,
+        Facture,
+        factures,
+        foreign_keys=(("id_commande", Commande),),
+        chunk_size=chunk_size,
+    )
 
 
 def update_produit_prix(db: Session, id_produit: int, new_prix: float) -> int:
+    mark_catalog_dirty(db)
     return _update_fields(
         db, Produit, {"id_produit": id_produit}, {"prix_unitaire": new_prix}
     )
 
 
 def update_produit_nom(db: Session, id_produit: int, new_nom: str) -> int:
+    mark_catalog_dirty(db)
     return _update_fields(
         db, Produit, {"id_produit": id_produit}, {"nom_produit": new_nom}
     )
 
 
 def update_produit_categorie(db: Session, id_produit: int, new_categorie: str) -> int:
+    mark_catalog_dirty(db)
     return _update_fields(
         db, Produit, {"id_produit": id_produit}, {"categorie": new_categorie}
     )
@@ -466,44 +683,204 @@ def fetch_produit_by_categorie(db: Session, categorie: str) -> list[Produit]:
     return _fetch_by(db, Produit, {"categorie": categorie})
 
 
+def _search_match_expression(query: str) -> str | None:
+    # Every word of the user's input becomes a quoted prefix term, so FTS5
+    # operators typed in the search box are treated as plain text.
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def _produit_search_statement(match: str, limit: int):
+    # The best matches are picked inside the FTS query, where ORDER BY rank
+    # LIMIT keeps only the top ones as it goes; just those join Produits.
+    candidates = (
+        select(produits_fts.c.rowid, produits_fts.c.rank)
+        .where(literal_column("Produits_fts").op("MATCH")(match))
+        .order_by(produits_fts.c.rank)
+        .limit(limit)
+        .subquery()
+    )
+    return (
+        select(Produit)
+        .join(candidates, candidates.c.rowid == Produit.id_produit)
+        .order_by(candidates.c.rank)
+        .limit(limit)
+    )
+
+
+def search_produits(
+    db: Session, query: str, limit: int = SEARCH_LIMIT
+) -> list[Produit]:
+    match = _search_match_expression(query)
+    if match is None:
+        return []
+    return list(db.scalars(_produit_search_statement(match, limit)).all())
+
+
+def rebuild_produit_search_index(db: Session) -> None:
+    # For databases whose Produits rows predate the index
+    db.execute(text("INSERT INTO Produits_fts(Produits_fts) VALUES ('rebuild')"))
+    _commit(db)
+
+
+def _encode_cursor(produit: Produit, sort: str) -> str:
+    column, _ = PRODUIT_SORTS[sort]
+    value = getattr(produit, column.key)
+    payload = json.dumps([str(value), produit.id_produit])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        value, id_produit = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        column, _ = PRODUIT_SORTS[sort]
+        if column is Produit.prix_unitaire:
+            value = Decimal(value)
+        return value, int(id_produit)
+    except (ValueError, TypeError, ArithmeticError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}: {e}")
+
+
+def _produit_page_statement(
+    categorie: str | None, sort: str, after: tuple | None, limit: int
+):
+    if sort not in PRODUIT_SORTS:
+        raise ValueError(f"Unsupported sort: {sort}")
+    column, descending = PRODUIT_SORTS[sort]
+
+    statement = select(Produit)
+    if categorie:
+        statement = statement.where(Produit.categorie == categorie)
+    if after is not None:
+        # Seek past the last row of the previous page instead of OFFSET, so
+        # page N costs the same as page 1.
+        key = tuple_(column, Produit.id_produit)
+        statement = statement.where(
+            key < tuple_(*after) if descending else key > tuple_(*after)
+        )
+    if descending:
+        statement = statement.order_by(column.desc(), Produit.id_produit.desc())
+    else:
+        statement = statement.order_by(column, Produit.id_produit)
+    # One extra row tells us whether there is a next page
+    return statement.limit(limit + 1)
+
+
+def _produit_page(produits: list, sort: str, limit: int) -> tuple[list, str | None]:
+    if len(produits) <= limit:
+        return produits, None
+    produits = produits[:limit]
+    return produits, _encode_cursor(produits[-1], sort)
+
+
+def fetch_produits_page(
+    db: Session,
+    categorie: str | None = None,
+    sort: str = "nom",
+    cursor: str | None = None,
+    limit: int = PAGE_SIZE,
+) -> tuple[list[Produit], str | None]:
+    after = _decode_cursor(cursor, sort) if cursor else None
+    statement = _produit_page_statement(categorie, sort, after, limit)
+    return _produit_page(list(db.scalars(statement).all()), sort, limit)
+
+
+def fetch_categories(db: Session) -> list[str]:
+    statement = select(Produit.categorie).distinct().order_by(Produit.categorie)
+    return list(db.scalars(statement).all())
+
+
+def _active_promotions_statement(day: date):
+    # Promotion.produit is eager-loaded: the promotion cards all show the
+    # product name and would otherwise lazy-load it one promotion at a time.
+    return (
+        select(Promotion)
+        .options(joinedload(Promotion.produit))
+        .where(Promotion.date_debut <= day, Promotion.date_fin >= day)
+        .order_by(Promotion.date_fin)
+    )
+
+
+def fetch_active_promotions(db: Session, day: date) -> list[Promotion]:
+    return list(db.scalars(_active_promotions_statement(day)).all())
+
+
 def fetch_produit_by_condition(db: Session, conditions: list) -> list[Produit]:
     return _fetch_by_conditions(db, Produit, conditions, "and")
 
 
 def delete_produit_by_id(db: Session, id_produit: int) -> int:
+    mark_catalog_dirty(db)
     return _delete_by(db, Produit, {"id_produit": id_produit})
 
 
 def increment_produit_stock(
-    db: Session, id_produit: int, increment_value: float
-) -> int:
+    db: Session, id_produit: int, increment_value: float, returning: tuple = ()
+) -> int | list:
     return _increment_field(
-        db, Produit, {"id_produit": id_produit}, "stock_central", increment_value
+        db,
+        Produit,
+        {"id_produit": id_produit},
+        "stock_central",
+        increment_value,
+        returning,
     )
 
 
 def decrement_produit_stock(
-    db: Session, id_produit: int, decrement_value: float
-) -> int:
+    db: Session, id_produit: int, decrement_value: float, returning: tuple = ()
+) -> int | list:
     return _decrement_field(
-        db, Produit, {"id_produit": id_produit}, "stock_central", decrement_value
+        db,
+        Produit,
+        {"id_produit": id_produit},
+        "stock_central",
+        decrement_value,
+        returning,
     )
 
 
+def bulk_increment_produit_stock(db: Session, deltas: dict[int, int]) -> dict[int, int]:
+    return _bulk_increment_field(db, Produit, "id_produit", "stock_central", deltas)
+
+
+# Loyalty points go through the ledger in api/loyalty.py, which moves
+# Clients.points_fidelite and journals the change in Historique_Fidelite in
+# the same transaction. It imports this module, hence the local imports.
+def _client_columns(db: Session, id_client: int, returning: tuple) -> list:
+    columns = [getattr(Client, name) for name in returning]
+    return db.execute(select(*columns).where(Client.id_client == id_client)).all()
+
+
 def increment_fidelite_client(
-    db: Session, id_client: int, increment_value: float
-) -> int:
-    return _increment_field(
-        db, Client, {"id_client": id_client}, "points_fidelite", increment_value
-    )
+    db: Session, id_client: int, increment_value: float, returning: tuple = ()
+) -> int | list:
+    from .loyalty import accrue_points
+
+    accrue_points(db, id_client, int(increment_value))
+    return _client_columns(db, id_client, returning) if returning else 1
 
 
 def decrement_fidelite_client(
-    db: Session, id_client: int, decrement_value: float
-) -> int:
-    return _decrement_field(
-        db, Client, {"id_client": id_client}, "points_fidelite", decrement_value
-    )
+    db: Session, id_client: int, decrement_value: float, returning: tuple = ()
+) -> int | list:
+    # Spends what is there, down to 0, rather than refusing
+    from .loyalty import balance, redeem_points
+
+    points = min(int(decrement_value), balance(db, id_client))
+    if points > 0:
+        redeem_points(db, id_client, points)
+    return _client_columns(db, id_client, returning) if returning else 1
+
+
+def bulk_increment_fidelite_clients(
+    db: Session, deltas: dict[int, int]
+) -> dict[int, int]:
+    from .loyalty import bulk_accrue_points
+
+    return bulk_accrue_points(db, deltas)
 
 
 # Rechercher client par id
@@ -0,0 +1,231 @@
+import argparse
+import csv
+import io
+import json
+import sys
+from collections.abc import AsyncIterator, Iterator
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from database.models import Commande, Facture, LigneCommande
+
+# Streaming exports of the orders and invoices, for accounting. Rows are read
+# as plain Core rows (no ORM objects, no identity map) with server-side
+# iteration, BATCH_SIZE at a time, and each batch is formatted and handed on
+# before the next one is fetched: memory stays flat whatever the date range.
+# From the repository root:
+#
+#     python -m api.exports factures --start 2024-01-01 --end 2024-12-31 > f.csv
+
+BATCH_SIZE = 1000
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+# Export name: (model, date column, exported columns)
+EXPORTS = {
+    "commandes": (
+        Commande,
+        Commande.date_commande,
+        (
+            Commande.id_commande,
+            Commande.id_client,
+            Commande.id_magasin,
+            Commande.date_commande,
+            Commande.statut_commande,
+        ),
+    ),
+    "lignes": (
+        LigneCommande,
+        Commande.date_commande,
+        (
+            LigneCommande.id_ligne,
+            LigneCommande.id_commande,
+            Commande.id_magasin,
+            Commande.date_commande,
+            LigneCommande.id_produit,
+            LigneCommande.quantite,
+            LigneCommande.prix_unitaire,
+        ),
+    ),
+    "factures": (
+        Facture,
+        Facture.date_facture,
+        (
+            Facture.id_facture,
+            Facture.id_commande,
+            Commande.id_magasin,
+            Facture.date_facture,
+            Facture.montant_total,
+        ),
+    ),
+}
+
+
+def _check(kind: str, fmt: str | None = None) -> None:
+    if kind not in EXPORTS:
+        raise ValueError(f"Unknown export {kind!r}, expected one of {list(EXPORTS)}")
+    if fmt is not None and fmt not in MEDIA_TYPES:
+        raise ValueError(
+            f"Unknown export format {fmt!r}, expected one of {list(MEDIA_TYPES)}"
+        )
+
+
+def export_columns(kind: str) -> list[str]:
+    _check(kind)
+    return [column.key for column in EXPORTS[kind][2]]
+
+
+def export_statement(
+    kind: str, start: date, end: date, id_magasin: int | None = None
+) -> Select:
+    """The rows of an export from start to end included, optionally for one
+    store, in date order (the order the date indexes give them in)."""
+    _check(kind)
+    model, date_column, columns = EXPORTS[kind]
+    stmt = select(*columns).select_from(model)
+    if model is not Commande:
+        stmt = stmt.join(Commande, Commande.id_commande == model.id_commande)
+    # A half-open range on the column itself, so that its index is used
+    stmt = stmt.where(
+        date_column >= datetime.combine(start, time.min),
+        date_column < datetime.combine(end + timedelta(days=1), time.min),
+    )
+    if id_magasin is not None:
+        stmt = stmt.where(Commande.id_magasin == id_magasin)
+    # The lines of a Commande follow each other
+    if model is LigneCommande:
+        return stmt.order_by(date_column, Commande.id_commande, columns[0])
+    return stmt.order_by(date_column, columns[0])
+
+
+def iter_rows(
+    db: Session,
+    kind: str,
+    start: date,
+    end: date,
+    id_magasin: int | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> Iterator[list[tuple]]:
+    """Batches of up to batch_size rows of an export, fetched as they are
+    consumed."""
+    stmt = export_statement(kind, start, end, id_magasin)
+    result = db.execute(stmt.execution_options(yield_per=batch_size))
+    try:
+        for batch in result.partitions():
+            yield [tuple(row) for row in batch]
+    finally:
+        result.close()
+
+
+async def aiter_rows(
+    db: AsyncSession,
+    kind: str,
+    start: date,
+    end: date,
+    id_magasin: int | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> AsyncIterator[list[tuple]]:
+    """iter_rows() over an AsyncSession."""
+    stmt = export_statement(kind, start, end, id_magasin)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    try:
+        async for batch in result.partitions():
+            yield [tuple(row) for row in batch]
+    finally:
+        await result.close()
+
+
+def _csv_lines(rows) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+
+def _json_value(value):
+    # Amounts as strings, so that they stay exact
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Cannot export {type(value).__name__} as JSON")
+
+
+def _ndjson_lines(columns: list[str], rows) -> str:
+    return "".join(
+        json.dumps(dict(zip(columns, row)), default=_json_value, ensure_ascii=False)
+        + "\n"
+        for row in rows
+    )
+
+
+def format_header(fmt: str, columns: list[str]) -> str:
+    return _csv_lines([columns]) if fmt == "csv" else ""
+
+
+def format_batch(fmt: str, columns: list[str], rows: list[tuple]) -> str:
+    return _csv_lines(rows) if fmt == "csv" else _ndjson_lines(columns, rows)
+
+
+def write_export(
+    db: Session,
+    out,
+    kind: str,
+    fmt: str,
+    start: date,
+    end: date,
+    id_magasin: int | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> int:
+    """Write an export as CSV or NDJSON to the text file out, one batch at a
+    time, and return the number of rows written."""
+    _check(kind, fmt)
+    columns = export_columns(kind)
+    out.write(format_header(fmt, columns))
+    written = 0
+    for batch in iter_rows(db, kind, start, end, id_magasin, batch_size):
+        out.write(format_batch(fmt, columns, batch))
+        written += len(batch)
+    return written
+
+
+async def stream_export(
+    db: AsyncSession,
+    kind: str,
+    fmt: str,
+    start: date,
+    end: date,
+    id_magasin: int | None = None,
+    batch_size: int = BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """An export as CSV or NDJSON text, a batch per chunk, for a streaming
+    response."""
+    _check(kind, fmt)
+    columns = export_columns(kind)
+    header = format_header(fmt, columns)
+    if header:
+        yield header
+    async for batch in aiter_rows(db, kind, start, end, id_magasin, batch_size):
+        yield format_batch(fmt, columns, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export orders and invoices")
+    parser.add_argument("kind", choices=list(EXPORTS))
+    parser.add_argument("--format", choices=list(MEDIA_TYPES), default="csv")
+    parser.add_argument("--start", type=date.fromisoformat, required=True)
+    parser.add_argument("--end", type=date.fromisoformat, required=True)
+    parser.add_argument("--magasin", type=int, default=None)
+    args = parser.parse_args()
+
+    from database.connect_db import SessionLocal
+
+    with SessionLocal() as db:
+        written = write_export(
+            db, sys.stdout, args.kind, args.format, args.start, args.end, args.magasin
+        )
+    print(f"{written} rows", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import argparse
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from sqlalchemy import Integer, String, case, cast, exists, func, insert, select, update
+from sqlalchemy.orm import Session
+from database.models import Client, Commande, Facture, HistoriqueFidelite
+from .crud import transaction
+
+# Loyalty ledger. Historique_Fidelite is the journal of every accrual and
+# redemption; Clients.points_fidelite is its running total, updated in the
+# same transaction as each entry, so reading a balance is a primary key
+# lookup. Factures earn points once (unique id_facture in the journal):
+# checkout credits them right away and the nightly accrual picks up the
+# others, e.g. imported ones, in one set-based pass. The nightly run is a
+# cron job rather than an app task, so that it runs once however many
+# workers serve the app:
+#
+#     0 2 * * * cd /path/to/app && python -m api.loyalty nightly
+POINTS_PER_EURO = 1
+# Days the nightly accrual looks back, to catch up on missed runs
+ACCRUAL_CATCHUP_DAYS = 3
+ADJUSTMENT = "Régularisation"
+
+logger = logging.getLogger(__name__)
+
+
+def points_for(montant_total: Decimal) -> int:
+    return int(montant_total) * POINTS_PER_EURO
+
+
+def balance(db: Session, id_client: int) -> int:
+    points = db.scalar(
+        select(Client.points_fidelite).where(Client.id_client == id_client)
+    )
+    if points is None and db.get(Client, id_client) is None:
+        raise ValueError(f"Client not found with filters {{'id_client': {id_client}}}")
+    return points or 0
+
+
+def _credit(db: Session, deltas: dict[int, int]) -> dict[int, int]:
+    # One UPDATE for all clients; a NULL balance counts as 0
+    if not deltas:
+        return {}
+    new_balances = dict(
+        db.execute(
+            update(Client)
+            .where(Client.id_client.in_(deltas))
+            .values(
+                points_fidelite=func.coalesce(Client.points_fidelite, 0)
+                + case(deltas, value=Client.id_client)
+            )
+            .returning(Client.id_client, Client.points_fidelite)
+            .execution_options(synchronize_session=False)
+        ).all()
+    )
+    missing = sorted(deltas.keys() - new_balances.keys())
+    if missing:
+        raise ValueError(f"Client not found with id_client in {missing}")
+    return new_balances
+
+
+def _append(db: Session, entries: list[dict]) -> dict[int, int]:
+    """Journal the entries and move the balances, in the caller's transaction."""
+    deltas: dict[int, int] = defaultdict(int)
+    for entry in entries:
+        deltas[entry["id_client"]] += entry["points_ajoutes"]
+    new_balances = _credit(db, deltas)
+    db.execute(insert(HistoriqueFidelite), entries)
+    return new_balances
+
+
+def _entry(id_client, points, description, date_operation, id_facture=None):
+    return {
+        "id_client": id_client,
+        "date_operation": date_operation or datetime.now(),
+        "points_ajoutes": points,
+        "description": description,
+        "id_facture": id_facture,
+    }
+
+
+def accrue_points(
+    db: Session,
+    id_client: int,
+    points: int,
+    description: str | None = None,
+    id_facture: int | None = None,
+    date_operation: datetime | None = None,
+) -> int:
+    """Credit points to a client, return the new balance."""
+    if points <= 0:
+        raise ValueError(f"Invalid points {points}")
+    with transaction(db):
+        new_balances = _append(
+            db, [_entry(id_client, points, description, date_operation, id_facture)]
+        )
+    return new_balances[id_client]
+
+
+def bulk_accrue_points(
+    db: Session,
+    points: dict[int, int],
+    description: str | None = None,
+    date_operation: datetime | None = None,
+) -> dict[int, int]:
+    """Credit {id_client: points} in one transaction, return the new balances."""
+    invalid = sorted(id_client for id_client, p in points.items() if p <= 0)
+    if invalid:
+        raise ValueError(f"Invalid points for id_client in {invalid}")
+    with transaction(db):
+        return _append(
+            db,
+            [
+                _entry(id_client, p, description, date_operation)
+                for id_client, p in points.items()
+            ],
+        )
+
+
+def redeem_points(
+    db: Session,
+    id_client: int,
+    points: int,
+    description: str | None = None,
+    date_operation: datetime | None = None,
+) -> int:
+    """Spend points, return the new balance.
+
+    Raises ValueError, spending nothing, if the balance is too low.
+    """
+    if points <= 0:
+        raise ValueError(f"Invalid points {points}")
+    with transaction(db):
+        # Conditional like take_stock(): two redemptions can't both spend
+        # the same points
+        new_balance = db.scalar(
+            update(Client)
+            .where(Client.id_client == id_client, Client.points_fidelite >= points)
+            .values(points_fidelite=Client.points_fidelite - points)
+            .returning(Client.points_fidelite)
+            .execution_options(synchronize_session=False)
+        )
+        if new_balance is None:
+            balance(db, id_client)  # raises if the client is unknown
+            raise ValueError(f"Insufficient loyalty points for client {id_client}")
+        db.execute(
+            insert(HistoriqueFidelite),
+            [_entry(id_client, -points, description, date_operation)],
+        )
+    return new_balance
+
+
+def accrue_factures(db: Session, since: datetime, until: datetime) -> int:
+    """Credit the points of the Factures dated in [since, until) that haven't
+    earned theirs yet, return the number of Factures credited."""
+    # Whole euros, from centimes so that a float like 60.999... can't lose one
+    points = (
+        cast(func.round(Facture.montant_total * 100), Integer) // 100 * POINTS_PER_EURO
+    )
+    pending = (
+        select(
+            Commande.id_client,
+            Facture.date_facture,
+            points,
+            "Commande " + cast(Commande.id_commande, String),
+            Facture.id_facture,
+        )
+        .join(Commande, Commande.id_commande == Facture.id_commande)
+        .where(
+            Facture.date_facture >= since,
+            Facture.date_facture < until,
+            points > 0,
+            ~exists().where(HistoriqueFidelite.id_facture == Facture.id_facture),
+        )
+    )
+    with transaction(db):
+        credited = db.execute(
+            insert(HistoriqueFidelite)
+            .from_select(
+                [
+                    "id_client",
+                    "date_operation",
+                    "points_ajoutes",
+                    "description",
+                    "id_facture",
+                ],
+                pending,
+            )
+            .returning(HistoriqueFidelite.id_client, HistoriqueFidelite.points_ajoutes)
+        ).all()
+        deltas: dict[int, int] = defaultdict(int)
+        for id_client, points_ajoutes in credited:
+            deltas[id_client] += points_ajoutes
+        _credit(db, deltas)
+    return len(credited)
+
+
+def accrue_day(db: Session, day: date) -> int:
+    start = datetime.combine(day, time())
+    return accrue_factures(db, start, start + timedelta(days=1))
+
+
+def reconcile_balances(db: Session, repair: bool = False) -> dict[int, tuple]:
+    """Clients whose balance isn't the sum of their journal, as
+    {id_client: (balance, journal total)}.
+
+    With repair, the difference is journaled as an adjustment: the balance
+    is kept, since clients created with points have no journal entry.
+    """
+    journal = (
+        select(
+            HistoriqueFidelite.id_client,
+            func.sum(HistoriqueFidelite.points_ajoutes).label("total"),
+        )
+        .group_by(HistoriqueFidelite.id_client)
+        .subquery()
+    )
+    points = func.coalesce(Client.points_fidelite, 0)
+    total = func.coalesce(journal.c.total, 0)
+    mismatches = {
+        id_client: (points, total)
+        for id_client, points, total in db.execute(
+            select(Client.id_client, points, total)
+            .outerjoin(journal, journal.c.id_client == Client.id_client)
+            .where(points != total)
+            .order_by(Client.id_client)
+        )
+    }
+    if repair and mismatches:
+        with transaction(db):
+            db.execute(
+                insert(HistoriqueFidelite),
+                [
+                    _entry(id_client, points - total, ADJUSTMENT, None)
+                    for id_client, (points, total) in mismatches.items()
+                ],
+            )
+    return mismatches
+
+
+def nightly_accrual(db: Session, today: date | None = None) -> tuple[int, dict]:
+    """Credit the Factures of the last ACCRUAL_CATCHUP_DAYS days before today
+    that haven't earned their points, then check the balances. Returns the
+    number of Factures credited and reconcile_balances()'s mismatches."""
+    today = today or date.today()
+    since = datetime.combine(today - timedelta(days=ACCRUAL_CATCHUP_DAYS), time())
+    credited = accrue_factures(db, since, datetime.combine(today, time()))
+    mismatches = reconcile_balances(db)
+    logger.info("Credited loyalty points for %d factures", credited)
+    if mismatches:
+        logger.warning(
+            "%d loyalty balances don't match their journal: %s",
+            len(mismatches),
+            list(mismatches)[:20],
+        )
+    return credited, mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loyalty ledger")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("nightly", help="credit the last days, check balances")
+    accrue = commands.add_parser("accrue", help="credit a day's Factures")
+    accrue.add_argument("day", type=date.fromisoformat)
+    reconcile = commands.add_parser("reconcile", help="check balances")
+    reconcile.add_argument("--repair", action="store_true")
+    args = parser.parse_args()
+
+    from database.connect_db import SessionLocal
+
+    with SessionLocal() as db:
+        if args.command == "accrue":
+            print(f"Credited {accrue_day(db, args.day)} factures")
+            return
+        if args.command == "nightly":
+            credited, mismatches = nightly_accrual(db)
+            print(f"Credited {credited} factures")
+        else:
+            mismatches = reconcile_balances(db, args.repair)
+    for id_client, (points, total) in mismatches.items():
+        print(f"client {id_client}: balance {points}, journal {total}")
+    print(f"{len(mismatches)} mismatched balances")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import time
+from bisect import bisect_left
+
+# Prometheus-style metrics, in process. MetricsMiddleware records every
+# HTTP request with a few dict and list operations (no lock: it only runs
+# on the event loop thread); everything else is read from the modules' own
+# `stats` dicts and from the connection pools when /metrics is scraped.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Request duration histogram buckets, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PREFIX = "affineur"
+
+# (method, route) -> [bucket counts..., +Inf count], and its sum of seconds
+_durations: dict[tuple[str, str], list[int]] = {}
+_duration_sums: dict[tuple[str, str], float] = {}
+# (method, route, status) -> count
+_responses: dict[tuple[str, str, int], int] = {}
+# (method, route) -> 5xx responses and unhandled exceptions
+_errors: dict[tuple[str, str], int] = {}
+_in_flight = {"value": 0}
+
+# name -> (stats dict, keys that are gauges rather than counters)
+_stats_sources: dict[str, tuple[dict, tuple[str, ...]]] = {}
+# name -> connection pool
+_pools: dict = {}
+
+
+def register_stats(name: str, stats: dict, gauges: tuple[str, ...] = ()) -> None:
+    """Export a module's stats dict; keys not in gauges are counters."""
+    _stats_sources[name] = (stats, gauges)
+
+
+def register_pool(name: str, engine) -> None:
+    """Export an Engine's pool (for an AsyncEngine, pass its sync_engine)."""
+    _pools[name] = engine.pool
+
+
+def reset_metrics() -> None:
+    _durations.clear()
+    _duration_sums.clear()
+    _responses.clear()
+    _errors.clear()
+
+
+def route_label(scope) -> str:
+    # The route's path template, never the raw path, so that ids in URLs
+    # don't create a series each; mounts (static files) by their prefix.
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    return scope.get("root_path") or "unmatched"
+
+
+def record_request(
+    method: str, route: str, status: int, seconds: float, error: bool
+) -> None:
+    key = (method, route)
+    counts = _durations.get(key)
+    if counts is None:
+        counts = _durations[key] = [0] * (len(BUCKETS) + 1)
+        _duration_sums[key] = 0.0
+    counts[bisect_left(BUCKETS, seconds)] += 1
+    _duration_sums[key] += seconds
+    response = (method, route, status)
+    _responses[response] = _responses.get(response, 0) + 1
+    if error:
+        _errors[key] = _errors.get(key, 0) + 1
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware feeding the request metrics."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight["value"] += 1
+        error = True
+        try:
+            await self.app(scope, receive, send_with_status)
+            error = status >= 500
+        finally:
+            _in_flight["value"] -= 1
+            record_request(
+                scope["method"],
+                route_label(scope),
+                status,
+                time.perf_counter() - start,
+                error,
+            )
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _http_lines() -> list[str]:
+    lines = [
+        "# HELP http_requests_total HTTP responses by route and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(_responses.items()):
+        labels = _labels(method=method, route=route, status=status)
+        lines.append(f"http_requests_total{labels} {count}")
+
+    lines += [
+        "# HELP http_request_errors_total 5xx responses and unhandled errors.",
+        "# TYPE http_request_errors_total counter",
+    ]
+    for (method, route), count in sorted(_errors.items()):
+        lines.append(
+            f"http_request_errors_total{_labels(method=method, route=route)} {count}"
+        )
+
+    lines += [
+        "# HELP http_requests_in_flight HTTP requests being served.",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {_in_flight['value']}",
+        "# HELP http_request_duration_seconds HTTP request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), counts in sorted(_durations.items()):
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, "+Inf"), counts):
+            cumulative += count
+            labels = _labels(method=method, route=route, le=bound)
+            lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+        labels = _labels(method=method, route=route)
+        lines.append(
+            f"http_request_duration_seconds_sum{labels} "
+            f"{_duration_sums[(method, route)]:.6f}"
+        )
+        lines.append(f"http_request_duration_seconds_count{labels} {cumulative}")
+    return lines
+
+
+def _pool_lines() -> list[str]:
+    lines = []
+    for field in ("size", "checkedout", "checkedin", "overflow"):
+        name = f"{PREFIX}_db_pool_{field}"
+        lines.append(f"# TYPE {name} gauge")
+        for pool_name, pool in sorted(_pools.items()):
+            # Only QueuePool has these; the in-memory pools have none
+            value = getattr(pool, field, None)
+            if callable(value):
+                lines.append(f"{name}{_labels(pool=pool_name)} {value()}")
+    return lines
+
+
+def _stats_lines() -> list[str]:
+    lines = []
+    for source, (stats, gauges) in sorted(_stats_sources.items()):
+        values = dict(stats)
+        for key, value in values.items():
+            if key in gauges:
+                name = f"{PREFIX}_{source}_{key}"
+                lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+            else:
+                name = f"{PREFIX}_{source}_{key}_total"
+                lines += [f"# TYPE {name} counter", f"{name} {value}"]
+        if "hits" in values and "misses" in values:
+            lookups = values["hits"] + values["misses"]
+            name = f"{PREFIX}_{source}_hit_ratio"
+            ratio = values["hits"] / lookups if lookups else 0.0
+            lines += [f"# TYPE {name} gauge", f"{name} {ratio:.4f}"]
+    return lines
+
+
+def render_metrics() -> str:
+    """Everything, in the Prometheus text exposition format."""
+    return "\n".join(_http_lines() + _pool_lines() + _stats_lines()) + "\n"
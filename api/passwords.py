@@ -0,0 +1,53 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from passlib.context import CryptContext
+
+# bcrypt is deliberately slow (~250 ms at 12 rounds) and would stall every
+# other request if it ran on the event loop. It releases the GIL while
+# hashing, so a small thread pool gives real parallelism; the pool size caps
+# how many CPU cores a login storm can take.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Pinning min and max rounds to the target cost makes needs_update() flag any
+# hash made with another cost, so changing BCRYPT_ROUNDS re-hashes passwords
+# as their owners log in.
+bcrypt_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+stats = {"pending": 0, "hashed": 0, "verified": 0, "upgraded": 0}
+
+
+async def _run(func, *args):
+    stats["pending"] += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, func, *args)
+    finally:
+        stats["pending"] -= 1
+
+
+async def hash_password(password: str) -> str:
+    hashed = await _run(bcrypt_context.hash, password)
+    stats["hashed"] += 1
+    return hashed
+
+
+async def verify_password(password: str, hashed: str) -> tuple[bool, str | None]:
+    """Check a password against its stored hash.
+
+    Returns (valid, new_hash). new_hash is set when the password is valid but
+    the stored hash uses outdated cost parameters; the caller should save it.
+    """
+    valid, new_hash = await _run(bcrypt_context.verify_and_update, password, hashed)
+    stats["verified"] += 1
+    if new_hash:
+        stats["upgraded"] += 1
+    return valid, new_hash
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Iterable
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from database.models import Produit, Promotion
+from .catalog_cache import catalog_version
+
+# Effective (promotion-adjusted) unit prices, cached per (id_produit, day).
+# Promotion.taux_reduction is a percentage, as shown on the promotion cards.
+# When several promotions overlap, the best one wins.
+#
+# Entries belong to a catalog version: update_produit_prix, insert_promotion
+# and the other catalog writers bump it on commit, which empties the cache.
+# Writes made by another process can't reach us, so entries also expire
+# after PRICE_TTL seconds. Prices are grouped by day and only the
+# MAX_CACHED_DAYS most recently used days are kept.
+PRICE_TTL = 60.0
+MAX_CACHED_DAYS = 3
+MAX_CACHED_PRICES = 100_000
+
+_lock = threading.Lock()
+# day -> {id_produit: (expiry, price)}, least recently used day first
+_prices: OrderedDict[date, dict[int, tuple[float, Decimal]]] = OrderedDict()
+_prices_version = -1
+stats = {"hits": 0, "misses": 0}
+
+CENT = Decimal("0.01")
+
+
+def apply_reduction(prix_unitaire, taux_reduction) -> Decimal:
+    prix = Decimal(prix_unitaire)
+    if taux_reduction:
+        prix = prix * (1 - Decimal(taux_reduction) / 100)
+    return prix.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def effective_prices_statement(ids: Iterable[int], day: date):
+    """(id_produit, prix_unitaire, best taux_reduction) rows of ids on day."""
+    best_reduction = (
+        select(
+            Promotion.id_produit,
+            func.max(Promotion.taux_reduction).label("taux_reduction"),
+        )
+        .where(
+            Promotion.id_produit.in_(ids),
+            Promotion.date_debut <= day,
+            Promotion.date_fin >= day,
+        )
+        .group_by(Promotion.id_produit)
+        .subquery()
+    )
+    return (
+        select(
+            Produit.id_produit, Produit.prix_unitaire, best_reduction.c.taux_reduction
+        )
+        .outerjoin(best_reduction, best_reduction.c.id_produit == Produit.id_produit)
+        .where(Produit.id_produit.in_(ids))
+    )
+
+
+def cached_prices(ids: Iterable[int], day: date) -> tuple[dict, list]:
+    """The cached prices of ids on day, and the ids still to be queried."""
+    global _prices_version
+    now = time.monotonic()
+    with _lock:
+        if _prices_version != catalog_version():
+            _prices.clear()
+            _prices_version = catalog_version()
+        cached = _prices.get(day, {})
+        found, missing = {}, []
+        for id_produit in set(ids):
+            entry = cached.get(id_produit)
+            if entry is None or entry[0] <= now:
+                missing.append(id_produit)
+            else:
+                found[id_produit] = entry[1]
+        stats["hits"] += len(found)
+        stats["misses"] += len(missing)
+    return found, missing
+
+
+def store_prices(rows, day: date, version: int) -> dict:
+    """Prices from effective_prices_statement() rows, cached unless the
+    catalog changed since version (catalog_version() before the query)."""
+    prices = {
+        id_produit: apply_reduction(prix_unitaire, taux_reduction)
+        for id_produit, prix_unitaire, taux_reduction in rows
+    }
+    now = time.monotonic()
+    expires = now + PRICE_TTL
+    with _lock:
+        # Skip the store if the catalog changed while we were querying
+        if version == _prices_version == catalog_version():
+            cached = _prices.setdefault(day, {})
+            _prices.move_to_end(day)
+            while len(_prices) > MAX_CACHED_DAYS:
+                _prices.popitem(last=False)
+            if len(cached) + len(prices) > MAX_CACHED_PRICES:
+                for id_produit in [k for k, (e, _) in cached.items() if e <= now]:
+                    del cached[id_produit]
+                if len(cached) + len(prices) > MAX_CACHED_PRICES:
+                    cached.clear()
+            cached.update(
+                (id_produit, (expires, prix)) for id_produit, prix in prices.items()
+            )
+    return prices
+
+
+def effective_prices(
+    db: Session, ids: Iterable[int], day: date | None = None
+) -> dict[int, Decimal]:
+    """Return {id_produit: effective unit price} for the products that exist."""
+    day = day or date.today()
+    prices, missing = cached_prices(ids, day)
+    if missing:
+        version = catalog_version()
+        rows = db.execute(effective_prices_statement(missing, day)).all()
+        prices.update(store_prices(rows, day, version))
+    return prices
+
+
+def effective_price(db: Session, id_produit: int, day: date | None = None) -> Decimal:
+    prices = effective_prices(db, [id_produit], day)
+    if id_produit not in prices:
+        raise ValueError(
+            f"Produit not found with filters {{'id_produit': {id_produit}}}"
+        )
+    return prices[id_produit]
+
+
+def clear_price_cache() -> None:
+    with _lock:
+        _prices.clear()
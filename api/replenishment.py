@@ -0,0 +1,162 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import chain
+import numpy as np
+from sqlalchemy import bindparam, func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+from database.models import Commande, LigneCommande, Produit, StockMagasin
+from .crud import transaction
+
+# Store replenishment from the central stock, with an (s, S) policy on the
+# daily sales velocity of each (store, product) over the last LOOKBACK_DAYS:
+# a store that holds less than REORDER_DAYS of sales is topped up to
+# COVER_DAYS. When the central stock can't cover every store asking for a
+# product, it is split between them in proportion to what they asked for.
+LOOKBACK_DAYS = 28
+REORDER_DAYS = 7
+COVER_DAYS = 14
+
+# Columns of the sales matrix
+MAGASIN, PRODUIT, VENDU, STOCK_MAGASIN, STOCK_CENTRAL = range(5)
+
+
+@dataclass
+class TransferPlan:
+    """Quantities to move from the central stock to the stores."""
+
+    id_magasin: np.ndarray
+    id_produit: np.ndarray
+    quantite: np.ndarray
+
+    def __len__(self) -> int:
+        return len(self.quantite)
+
+    def rows(self) -> list[tuple[int, int, int]]:
+        return list(
+            zip(
+                self.id_magasin.tolist(),
+                self.id_produit.tolist(),
+                self.quantite.tolist(),
+            )
+        )
+
+
+def _sales_statement(since: datetime):
+    # One row per (store, product) sold since `since`, with both stock levels;
+    # they depend only on the group keys, which SQLite lets us select as is.
+    return (
+        select(
+            Commande.id_magasin,
+            LigneCommande.id_produit,
+            func.sum(LigneCommande.quantite),
+            func.coalesce(StockMagasin.stock_disponible, 0),
+            func.coalesce(Produit.stock_central, 0),
+        )
+        .join(Commande, Commande.id_commande == LigneCommande.id_commande)
+        .join(Produit, Produit.id_produit == LigneCommande.id_produit)
+        .outerjoin(
+            StockMagasin,
+            (StockMagasin.id_magasin == Commande.id_magasin)
+            & (StockMagasin.id_produit == LigneCommande.id_produit),
+        )
+        .where(Commande.date_commande >= since)
+        .group_by(Commande.id_magasin, LigneCommande.id_produit)
+    )
+
+
+def load_sales(db: Session, since: datetime) -> np.ndarray:
+    """Sales matrix: one row per (store, product), columns as above."""
+    rows = db.execute(_sales_statement(since)).all()
+    # Much faster than np.array() on a list of Row objects
+    return np.fromiter(
+        chain.from_iterable(rows), dtype=np.int64, count=len(rows) * 5
+    ).reshape(-1, 5)
+
+
+def plan_transfers(
+    sales: np.ndarray,
+    lookback_days: int = LOOKBACK_DAYS,
+    reorder_days: int = REORDER_DAYS,
+    cover_days: int = COVER_DAYS,
+) -> TransferPlan:
+    velocity = sales[:, VENDU] / lookback_days
+    stock = sales[:, STOCK_MAGASIN]
+    need = np.where(
+        stock < velocity * reorder_days,
+        np.ceil(velocity * cover_days) - stock,
+        0,
+    ).clip(min=0)
+
+    # Share each product's central stock out when it's short
+    produits, produit_index = np.unique(sales[:, PRODUIT], return_inverse=True)
+    requested = np.bincount(produit_index, weights=need, minlength=len(produits))
+    central = np.zeros(len(produits))
+    central[produit_index] = sales[:, STOCK_CENTRAL]
+    ratio = np.divide(
+        central, requested, out=np.ones_like(central), where=requested > central
+    )
+    quantite = np.floor(need * ratio[produit_index]).astype(np.int64)
+
+    keep = quantite > 0
+    return TransferPlan(
+        id_magasin=sales[keep, MAGASIN],
+        id_produit=sales[keep, PRODUIT],
+        quantite=quantite[keep],
+    )
+
+
+def plan_replenishment(
+    db: Session,
+    now: datetime | None = None,
+    lookback_days: int = LOOKBACK_DAYS,
+    reorder_days: int = REORDER_DAYS,
+    cover_days: int = COVER_DAYS,
+) -> TransferPlan:
+    now = now or datetime.now()
+    sales = load_sales(db, now - timedelta(days=lookback_days))
+    return plan_transfers(sales, lookback_days, reorder_days, cover_days)
+
+
+def apply_plan(db: Session, plan: TransferPlan) -> int:
+    """Move the planned quantities in one transaction, return the rows moved.
+
+    Raises ValueError, moving nothing, if the central stock of a product
+    dropped below what the plan takes since it was computed.
+    """
+    if not len(plan):
+        return 0
+    produits, produit_index = np.unique(plan.id_produit, return_inverse=True)
+    totals = np.bincount(produit_index, weights=plan.quantite).astype(np.int64)
+
+    with transaction(db):
+        taken = db.execute(
+            update(Produit.__table__)
+            .where(
+                Produit.id_produit == bindparam("b_id_produit"),
+                Produit.stock_central >= bindparam("b_quantite"),
+            )
+            .values(stock_central=Produit.stock_central - bindparam("b_quantite")),
+            [
+                {"b_id_produit": id_produit, "b_quantite": quantite}
+                for id_produit, quantite in zip(produits.tolist(), totals.tolist())
+            ],
+        )
+        if taken.rowcount != len(produits):
+            raise ValueError("Central stock changed since the plan was computed")
+
+        upsert = insert(StockMagasin.__table__)
+        db.execute(
+            upsert.on_conflict_do_update(
+                index_elements=["id_magasin", "id_produit"],
+                set_={
+                    "stock_disponible": StockMagasin.stock_disponible
+                    + upsert.excluded.stock_disponible
+                },
+            ),
+            [
+                {"id_magasin": m, "id_produit": p, "stock_disponible": q}
+                for m, p, q in plan.rows()
+            ],
+        )
+    return len(plan)
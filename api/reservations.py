@@ -0,0 +1,210 @@
+import asyncio
+import logging
+import secrets
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Iterable
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from database.models import Produit, StockMagasin, Reservation
+from .crud import transaction
+
+# Stock reservations for checkouts in progress. Reserving takes the
+# quantities out of the stock right away with a conditional UPDATE (the row
+# only changes if it still holds enough), so two concurrent checkouts can
+# never both get the last unit. The hold is recorded in Reservations; it is
+# either confirmed when the order is placed, released by the client, or
+# released by the sweeper once it expires, which puts the stock back.
+RESERVATION_TTL = timedelta(minutes=15)
+SWEEP_INTERVAL = 30.0  # seconds
+SWEEP_BATCH_SIZE = 500
+
+logger = logging.getLogger(__name__)
+
+
+def merge_lines(lines: Iterable[tuple[int, int]]) -> dict[int, int]:
+    """{id_produit: quantite} of (id_produit, quantite) lines, summed per
+    product. Raises ValueError for an empty order or a quantity under 1."""
+    quantities: dict[int, int] = {}
+    for id_produit, quantite in lines:
+        if quantite <= 0:
+            raise ValueError(f"Invalid quantity {quantite} for produit {id_produit}")
+        quantities[id_produit] = quantities.get(id_produit, 0) + quantite
+    if not quantities:
+        raise ValueError("Order has no lines")
+    return quantities
+
+
+def _stock(id_magasin: int | None):
+    """(model, key column, stock column, extra filters) of a stock location."""
+    if id_magasin is None:
+        return Produit, Produit.id_produit, Produit.stock_central, ()
+    return (
+        StockMagasin,
+        StockMagasin.id_produit,
+        StockMagasin.stock_disponible,
+        (StockMagasin.id_magasin == id_magasin,),
+    )
+
+
+def take_stock(
+    db: Session, quantities: dict[int, int], id_magasin: int | None = None
+) -> None:
+    """Take {id_produit: quantite} out of the central or a store's stock.
+
+    All or nothing: raises ValueError listing the short products if any of
+    them doesn't have enough, in which case the caller must roll back.
+    """
+    model, key, stock, filters = _stock(id_magasin)
+    # A single UPDATE for all lines; rows without enough stock are left out by
+    # the WHERE clause, which is how we detect them without a prior SELECT
+    # that another checkout could invalidate.
+    quantite = case(quantities, value=key)
+    result = db.execute(
+        update(model)
+        .where(key.in_(quantities), stock >= quantite, *filters)
+        .values({stock.key: stock - quantite})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != len(quantities):
+        stocks = dict(
+            db.execute(select(key, stock).where(key.in_(quantities), *filters)).all()
+        )
+        short = sorted(
+            id_produit
+            for id_produit, wanted in quantities.items()
+            if (stocks.get(id_produit) or 0) < wanted
+        )
+        raise ValueError(f"Insufficient stock for produits {short}")
+
+
+def _put_back(db: Session, rows) -> None:
+    by_location: dict[int | None, dict[int, int]] = defaultdict(dict)
+    for id_produit, id_magasin, quantite in rows:
+        location = by_location[id_magasin]
+        location[id_produit] = location.get(id_produit, 0) + quantite
+    for id_magasin, quantities in by_location.items():
+        model, key, stock, filters = _stock(id_magasin)
+        db.execute(
+            update(model)
+            .where(key.in_(quantities), *filters)
+            .values({stock.key: stock + case(quantities, value=key)})
+            .execution_options(synchronize_session=False)
+        )
+
+
+def _pop_reservations(db: Session, *conditions) -> list:
+    return db.execute(
+        delete(Reservation)
+        .where(*conditions)
+        .returning(Reservation.id_produit, Reservation.id_magasin, Reservation.quantite)
+        .execution_options(synchronize_session=False)
+    ).all()
+
+
+def reserve_stock(
+    db: Session,
+    lines: Iterable[tuple[int, int]],
+    id_magasin: int | None = None,
+    ttl: timedelta = RESERVATION_TTL,
+) -> str:
+    """Hold (id_produit, quantite) lines for ttl, return the reservation token.
+
+    Takes from the central stock, or from id_magasin's stock when given.
+    Raises ValueError, holding nothing, if a product is short.
+    """
+    quantities = merge_lines(lines)
+    token = secrets.token_urlsafe(16)
+    expires_at = datetime.now() + ttl
+    with transaction(db):
+        take_stock(db, quantities, id_magasin)
+        db.execute(
+            insert(Reservation),
+            [
+                {
+                    "token": token,
+                    "id_produit": id_produit,
+                    "id_magasin": id_magasin,
+                    "quantite": quantite,
+                    "expires_at": expires_at,
+                }
+                for id_produit, quantite in quantities.items()
+            ],
+        )
+    return token
+
+
+def confirm_reservation(
+    db: Session, token: str, id_magasin: int | None = None
+) -> dict[int, int]:
+    """Turn a live reservation into a sale: the stock stays taken.
+
+    Returns the reserved {id_produit: quantite}. Raises ValueError if the
+    reservation is unknown, already used or expired, or if id_magasin is
+    given and the stock was held at another store (central stock can be sold
+    by any store).
+    """
+    with transaction(db):
+        rows = _pop_reservations(
+            db, Reservation.token == token, Reservation.expires_at > datetime.now()
+        )
+        if not rows:
+            raise ValueError(
+                f"Reservation not found with filters {{'token': '{token}'}}"
+            )
+        # All the lines of a reservation come from the same location
+        held_at = rows[0][1]
+        if id_magasin is not None and held_at not in (None, id_magasin):
+            raise ValueError(
+                f"Reservation {token} is held at magasin {held_at}, "
+                f"not {id_magasin}"
+            )
+    return {id_produit: quantite for id_produit, _, quantite in rows}
+
+
+def release_reservation(db: Session, token: str) -> int:
+    """Give a reservation's stock back, return the number of lines released."""
+    with transaction(db):
+        rows = _pop_reservations(db, Reservation.token == token)
+        _put_back(db, rows)
+    return len(rows)
+
+
+def release_expired_reservations(
+    db: Session, now: datetime | None = None, batch_size: int = SWEEP_BATCH_SIZE
+) -> int:
+    """Release expired reservations, one transaction per batch_size lines."""
+    now = now or datetime.now()
+    released = 0
+    while True:
+        expired = (
+            select(Reservation.id_reservation)
+            .where(Reservation.expires_at <= now)
+            .limit(batch_size)
+        )
+        with transaction(db):
+            rows = _pop_reservations(
+                db, Reservation.id_reservation.in_(expired.scalar_subquery())
+            )
+            _put_back(db, rows)
+        released += len(rows)
+        if len(rows) < batch_size:
+            return released
+
+
+def _sweep(session_factory) -> int:
+    with session_factory() as db:
+        return release_expired_reservations(db)
+
+
+async def run_reservation_sweeper(
+    session_factory, interval: float = SWEEP_INTERVAL
+) -> None:
+    """Background task: release expired reservations every interval seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(_sweep, session_factory)
+        except SQLAlchemyError:
+            logger.exception("Reservation sweep failed")
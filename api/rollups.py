@@ -0,0 +1,214 @@
+import argparse
+import sys
+from datetime import date
+from decimal import Decimal
+from sqlalchemy import (
+    Date,
+    Integer,
+    cast,
+    delete,
+    except_,
+    func,
+    insert,
+    select,
+    type_coerce,
+    union,
+)
+from sqlalchemy.orm import Session
+from database.models import (
+    Commande,
+    Facture,
+    FactureJournaliere,
+    LigneCommande,
+    VenteJournaliere,
+)
+from .crud import transaction
+
+# Reads over the daily sales rollups (see database/models.py). The triggers
+# keep them current on every write; rebuild_rollups() recomputes them from
+# the orders, e.g. after a bulk load with the triggers off, and
+# check_rollups() compares the two. From the repository root:
+#
+#     python -m api.rollups check
+#     python -m api.rollups rebuild
+
+SALES_KEYS = ("jour", "id_magasin", "id_produit")
+INVOICE_KEYS = ("jour", "id_magasin")
+
+
+def _centimes(amount):
+    # Rounded per row, as the triggers do, so the sums match exactly
+    return cast(func.round(amount * 100), Integer)
+
+
+def _sales_from_orders():
+    return (
+        select(
+            type_coerce(func.date(Commande.date_commande), Date).label("jour"),
+            Commande.id_magasin,
+            LigneCommande.id_produit,
+            func.sum(LigneCommande.quantite).label("quantite"),
+            func.sum(
+                _centimes(LigneCommande.quantite * LigneCommande.prix_unitaire)
+            ).label("montant_centimes"),
+            func.count(LigneCommande.id_commande.distinct()).label("nb_commandes"),
+        )
+        .join(Commande, Commande.id_commande == LigneCommande.id_commande)
+        .group_by("jour", Commande.id_magasin, LigneCommande.id_produit)
+    )
+
+
+def _invoices_from_orders():
+    return (
+        select(
+            type_coerce(func.date(Facture.date_facture), Date).label("jour"),
+            Commande.id_magasin,
+            func.sum(_centimes(Facture.montant_total)).label("montant_centimes"),
+            func.count().label("nb_factures"),
+        )
+        .join(Commande, Commande.id_commande == Facture.id_commande)
+        .group_by("jour", Commande.id_magasin)
+    )
+
+
+def _totals(db: Session, model, keys, measures, start, end, by, filters):
+    unknown = set(by) - set(keys)
+    if unknown:
+        raise ValueError(f"Cannot group by {sorted(unknown)}, expected {keys}")
+    group = [getattr(model, key) for key in by]
+    stmt = (
+        select(*group, *(func.sum(getattr(model, m)).label(m) for m in measures))
+        .where(model.jour >= start, model.jour <= end)
+        .group_by(*group)
+        .order_by(*group)
+    )
+    for key, value in filters.items():
+        if value is not None:
+            stmt = stmt.where(getattr(model, key) == value)
+
+    totals = []
+    for row in db.execute(stmt).mappings():
+        row = dict(row)
+        row["montant"] = Decimal(row.pop("montant_centimes")).scaleb(-2)
+        totals.append(row)
+    return totals
+
+
+def fetch_sales(
+    db: Session,
+    start: date,
+    end: date,
+    by: tuple[str, ...] = ("jour",),
+    id_magasin: int | None = None,
+    id_produit: int | None = None,
+) -> list[dict]:
+    """Quantity, revenue and orders from start to end included, grouped by
+    any of jour, id_magasin and id_produit."""
+    return _totals(
+        db,
+        VenteJournaliere,
+        SALES_KEYS,
+        ("quantite", "montant_centimes", "nb_commandes"),
+        start,
+        end,
+        by,
+        {"id_magasin": id_magasin, "id_produit": id_produit},
+    )
+
+
+def fetch_invoice_totals(
+    db: Session,
+    start: date,
+    end: date,
+    by: tuple[str, ...] = ("jour",),
+    id_magasin: int | None = None,
+) -> list[dict]:
+    """Invoiced amount and invoices from start to end included, grouped by
+    jour and/or id_magasin."""
+    return _totals(
+        db,
+        FactureJournaliere,
+        INVOICE_KEYS,
+        ("montant_centimes", "nb_factures"),
+        start,
+        end,
+        by,
+        {"id_magasin": id_magasin},
+    )
+
+
+def rebuild_rollups(db: Session) -> dict[str, int]:
+    """Recompute both rollups from the orders, return their row counts."""
+    with transaction(db):
+        db.execute(delete(VenteJournaliere))
+        db.execute(delete(FactureJournaliere))
+        sales = _sales_from_orders()
+        invoices = _invoices_from_orders()
+        db.execute(
+            insert(VenteJournaliere).from_select(
+                [c.name for c in sales.selected_columns], sales
+            )
+        )
+        db.execute(
+            insert(FactureJournaliere).from_select(
+                [c.name for c in invoices.selected_columns], invoices
+            )
+        )
+    return {
+        model.__tablename__: db.scalar(select(func.count()).select_from(model))
+        for model in (VenteJournaliere, FactureJournaliere)
+    }
+
+
+def _mismatches(db: Session, expected, actual, keys) -> list[tuple]:
+    # Keys present on one side only, or with different totals. SQLite can't
+    # nest compound selects, hence a subquery for each side.
+    sides = [except_(expected, actual), except_(actual, expected)]
+    diff = union(*(select(side.subquery()) for side in sides)).subquery()
+    columns = [diff.c[key] for key in keys]
+    return [
+        tuple(row) for row in db.execute(select(*columns).distinct().order_by(*columns))
+    ]
+
+
+def check_rollups(db: Session) -> dict[str, list[tuple]]:
+    """Keys whose rollup differs from the orders, per rollup table."""
+    return {
+        VenteJournaliere.__tablename__: _mismatches(
+            db,
+            _sales_from_orders(),
+            select(*VenteJournaliere.__table__.columns),
+            SALES_KEYS,
+        ),
+        FactureJournaliere.__tablename__: _mismatches(
+            db,
+            _invoices_from_orders(),
+            select(*FactureJournaliere.__table__.columns),
+            INVOICE_KEYS,
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Daily sales rollups")
+    parser.add_argument("command", choices=("check", "rebuild"))
+    args = parser.parse_args()
+
+    from database.connect_db import SessionLocal
+
+    with SessionLocal() as db:
+        if args.command == "rebuild":
+            for name, count in rebuild_rollups(db).items():
+                print(f"{name}: {count} rows")
+            return
+        mismatches = check_rollups(db)
+    for name, keys in mismatches.items():
+        print(f"{name}: {len(keys)} mismatched keys")
+        for key in keys[:20]:
+            print(f"  {key}")
+    if any(mismatches.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
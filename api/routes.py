@@ -1,24 +1,83 @@
+import os
+from datetime import date
 from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from ..database.connect_db import get_db_connection
-from ..database.models import Produit, Promotion, Magasin
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+from ..database.connect_db import AsyncSessionLocal, get_async_db
+from ..database.models import Magasin
 from ..api.auth import get_current_user, get_current_admin_user
+from . import async_crud, cart, exports, metrics
+from .catalog_cache import get_fragment
+from .static_assets import asset_url
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+# Compiled templates are kept on disk, so a restarted or newly forked worker
+# skips parsing them again. JINJA_CACHE_DIR defaults to a per-user temp dir.
+templates.env.bytecode_cache = FileSystemBytecodeCache(os.getenv("JINJA_CACHE_DIR"))
+templates.env.globals["asset_url"] = asset_url
 
 
-db_dependency = Annotated[Session, Depends(get_db_connection)]
+db_dependency = Annotated[AsyncSession, Depends(get_async_db)]
 user_dependency = Annotated[dict, Depends(get_current_user)]
 
 
+def is_htmx(request: Request) -> bool:
+    return "hx-request" in request.headers
+
+
+def render_partial(request: Request, template_name: str, **context) -> str:
+    template = templates.get_template(template_name)
+    return template.render(request=request, **context)
+
+
 @router.get("/admin-only")
 async def admin_route(current_user: Annotated[dict, Depends(get_current_admin_user)]):
     return {"message": "Admin access granted", "user": current_user}
 
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(
+    current_user: Annotated[dict, Depends(get_current_admin_user)],
+):
+    return PlainTextResponse(metrics.render_metrics(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/api/export/{kind}.{fmt}")
+async def export_endpoint(
+    kind: str,
+    fmt: str,
+    start: date,
+    end: date,
+    current_user: Annotated[dict, Depends(get_current_admin_user)],
+    id_magasin: int | None = None,
+):
+    if kind not in exports.EXPORTS or fmt not in exports.MEDIA_TYPES:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND)
+
+    async def chunks():
+        # Its own session: the dependencies' are closed before the response
+        # body is sent, and this one is read while it is.
+        async with AsyncSessionLocal() as db:
+            async for chunk in exports.stream_export(
+                db, kind, fmt, start, end, id_magasin
+            ):
+                yield chunk
+
+    filename = f"{kind}_{start}_{end}.{fmt}"
+    return StreamingResponse(
+        chunks(),
+        media_type=exports.MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/login")
 async def login(request: Request):
     return templates.TemplateResponse("index.html", {"request": request})
@@ -28,19 +87,164 @@ async def login(request: Request):
 async def home(
     request: Request,
     current_user=user_dependency,
-    db: Session = Depends(get_db_connection),
-):
-    promotions = db.query(Promotion).all()
-    products = db.query(Produit).all()
-    nearest_store = db.query(Magasin).first()
-
-    return templates.TemplateResponse(
-        "main.html",
-        {
-            "request": request,
-            "user": current_user,
-            "promotions": promotions,
-            "products": products,
-            "nearest_store": nearest_store,
-        },
+    db: AsyncSession = Depends(get_async_db),
+):
+    today = date.today()
+
+    async def render_promotions():
+        promotions = await async_crud.fetch_active_promotions(db, today)
+        return render_partial(
+            request, "partials/promotions.html", promotions=promotions
+        )
+
+    async def render_products():
+        products, next_cursor = await async_crud.fetch_produits_page(db)
+        prices = await async_crud.effective_prices(
+            db, [product.id_produit for product in products], today
+        )
+        return render_partial(
+            request,
+            "partials/products_page.html",
+            products=products,
+            prices=prices,
+            next_cursor=next_cursor,
+            category="",
+            sort="nom",
+        )
+
+    async def render_categories():
+        categories = await async_crud.fetch_categories(db)
+        return render_partial(
+            request, "partials/category_filter.html", categories=categories
+        )
+
+    async def render_store():
+        nearest_store = (await db.scalars(select(Magasin).limit(1))).first()
+        return render_partial(
+            request, "partials/store_card.html", nearest_store=nearest_store
+        )
+
+    context = {
+        "request": request,
+        "user": current_user,
+        "promotions_html": Markup(
+            await get_fragment(("promotions", today), render_promotions)
+        ),
+        "products_html": Markup(
+            await get_fragment(("products", today), render_products)
+        ),
+        "categories_html": Markup(
+            await get_fragment(("categories",), render_categories)
+        ),
+        "store_html": Markup(await get_fragment(("store",), render_store)),
+    }
+    # HTMX navigation only swaps the page body
+    if is_htmx(request):
+        return templates.TemplateResponse("partials/home_content.html", context)
+    return templates.TemplateResponse("main.html", context)
+
+
+@router.get("/api/search", response_class=HTMLResponse)
+async def search(
+    request: Request,
+    db: db_dependency,
+    q: str = "",
+    limit: int = Query(async_crud.SEARCH_LIMIT, ge=1, le=50),
+):
+    produits = await async_crud.search_produits(db, q, limit)
+    return render_partial(
+        request, "partials/search_results.html", produits=produits, query=q.strip()
+    )
+
+
+@router.get("/api/products", response_class=HTMLResponse)
+async def list_products(
+    request: Request,
+    db: db_dependency,
+    category: str = "",
+    sort: str = Query("nom", pattern="^(nom|prix|prix_desc)$"),
+    cursor: str | None = None,
+    limit: int = Query(async_crud.PAGE_SIZE, ge=1, le=100),
+):
+    try:
+        products, next_cursor = await async_crud.fetch_produits_page(
+            db, category or None, sort, cursor, limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    prices = await async_crud.effective_prices(
+        db, [product.id_produit for product in products]
+    )
+    return render_partial(
+        request,
+        "partials/products_page.html",
+        products=products,
+        prices=prices,
+        next_cursor=next_cursor,
+        category=category,
+        sort=sort,
+    )
+
+
+async def render_cart(request: Request, db: AsyncSession, id_user: int) -> str:
+    # The modal contents, plus the badge swapped out-of-band
+    cart_items = await cart.cart_items(db, id_user)
+    return render_partial(
+        request, "partials/cart_items.html", cart_items=cart_items
+    ) + render_partial(
+        request,
+        "partials/cart_count.html",
+        cart_count=await cart.cart_count(db, id_user),
+        oob=True,
     )
+
+
+@router.get("/cart", response_class=HTMLResponse)
+async def view_cart(request: Request, db: db_dependency, current_user: user_dependency):
+    return await render_cart(request, db, current_user["id_user"])
+
+
+@router.get("/api/cart/count", response_class=HTMLResponse)
+async def cart_count(
+    request: Request, db: db_dependency, current_user: user_dependency
+):
+    count = await cart.cart_count(db, current_user["id_user"])
+    return render_partial(request, "partials/cart_count.html", cart_count=count)
+
+
+@router.post("/api/cart/add", response_class=HTMLResponse)
+async def add_to_cart(
+    request: Request,
+    db: db_dependency,
+    current_user: user_dependency,
+    id: int = Form(...),
+    quantity: int = Form(1, ge=1),
+):
+    try:
+        count = await cart.add_item(db, current_user["id_user"], id, quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return render_partial(request, "partials/cart_count.html", cart_count=count)
+
+
+@router.put("/api/cart/{id_produit}", response_class=HTMLResponse)
+async def update_cart_item(
+    request: Request,
+    id_produit: int,
+    db: db_dependency,
+    current_user: user_dependency,
+    quantity: int = Form(..., ge=0),
+):
+    try:
+        await cart.update_quantity(db, current_user["id_user"], id_produit, quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return await render_cart(request, db, current_user["id_user"])
+
+
+@router.delete("/api/cart/{id_produit}", response_class=HTMLResponse)
+async def remove_from_cart(
+    request: Request, id_produit: int, db: db_dependency, current_user: user_dependency
+):
+    await cart.remove_item(db, current_user["id_user"], id_produit)
+    return await render_cart(request, db, current_user["id_user"])
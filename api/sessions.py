@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.models import Session as UserSession
+
+# Server-side sessions, one Sessions row per login. Lookups are served from a
+# write-through LRU; only a miss reads the table. Revoking sets revoked_at
+# rather than deleting the row, so the other workers can find the revocation
+# when they poll (see poll_revocations) and drop their cached copy. The
+# sweeper deletes expired rows, and revoked ones once every worker has had
+# time to see them.
+#
+# Datetimes are naive UTC, which is what SQLite hands back.
+SESSION_TTL = timedelta(days=7)
+MAX_CACHED_SESSIONS = 10_000
+REVOCATION_POLL_INTERVAL = 5.0  # seconds
+SWEEP_INTERVAL = 300.0  # seconds
+SWEEP_BATCH_SIZE = 500
+REVOKED_RETENTION = timedelta(hours=1)
+# Polls look back this far past the newest revocation already seen, to catch
+# revocations whose transaction committed after a later one
+REVOCATION_OVERLAP = timedelta(seconds=30)
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_sessions: OrderedDict[str, tuple[int, datetime]] = OrderedDict()
+stats = {"hits": 0, "misses": 0}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Revocations older than this were already applied to the cache
+_revoked_since = _utcnow()
+
+
+def _cache(token: str, user_id: int, expires_at: datetime) -> None:
+    with _lock:
+        _sessions[token] = (user_id, expires_at)
+        _sessions.move_to_end(token)
+        while len(_sessions) > MAX_CACHED_SESSIONS:
+            _sessions.popitem(last=False)
+
+
+def _evict(tokens) -> None:
+    with _lock:
+        for token in tokens:
+            _sessions.pop(token, None)
+
+
+def _cached_user_id(token: str) -> int | None:
+    with _lock:
+        entry = _sessions.get(token)
+        if entry is not None:
+            user_id, expires_at = entry
+            if expires_at > _utcnow():
+                _sessions.move_to_end(token)
+                stats["hits"] += 1
+                return user_id
+            del _sessions[token]
+        stats["misses"] += 1
+    return None
+
+
+def clear_session_cache() -> None:
+    with _lock:
+        _sessions.clear()
+
+
+async def create_session(
+    db: AsyncSession, user_id: int, ttl: timedelta = SESSION_TTL
+) -> UserSession:
+    now = _utcnow()
+    session = UserSession(
+        user_id=user_id,
+        session_token=secrets.token_urlsafe(32),
+        created_at=now,
+        expires_at=now + ttl,
+    )
+    db.add(session)
+    await db.commit()
+    _cache(session.session_token, user_id, session.expires_at)
+    return session
+
+
+async def lookup_session(db: AsyncSession, token: str) -> int | None:
+    """Return the user id of a live session, None if unknown, expired or revoked."""
+    user_id = _cached_user_id(token)
+    if user_id is not None:
+        return user_id
+    row = (
+        await db.execute(
+            select(UserSession.user_id, UserSession.expires_at).where(
+                UserSession.session_token == token,
+                UserSession.revoked_at.is_(None),
+                UserSession.expires_at > _utcnow(),
+            )
+        )
+    ).first()
+    if row is None:
+        return None
+    _cache(token, row.user_id, row.expires_at)
+    return row.user_id
+
+
+async def revoke_session(db: AsyncSession, token: str) -> None:
+    _evict([token])
+    await db.execute(
+        update(UserSession)
+        .where(UserSession.session_token == token, UserSession.revoked_at.is_(None))
+        .values(revoked_at=_utcnow())
+    )
+    await db.commit()
+
+
+async def poll_revocations(db: AsyncSession) -> int:
+    """Drop sessions revoked by any worker since the last poll from the cache."""
+    global _revoked_since
+    rows = (
+        await db.execute(
+            select(UserSession.session_token, UserSession.revoked_at).where(
+                UserSession.revoked_at >= _revoked_since - REVOCATION_OVERLAP
+            )
+        )
+    ).all()
+    if rows:
+        _evict(token for token, _ in rows)
+        _revoked_since = max(revoked_at for _, revoked_at in rows)
+    return len(rows)
+
+
+async def sweep_sessions(db: AsyncSession, batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """Delete expired sessions, committing every batch_size rows."""
+    now = _utcnow()
+    stale = or_(
+        UserSession.expires_at <= now,
+        UserSession.revoked_at <= now - REVOKED_RETENTION,
+    )
+    deleted = 0
+    while True:
+        batch = select(UserSession.id).where(stale).limit(batch_size)
+        result = await db.execute(
+            delete(UserSession)
+            .where(UserSession.id.in_(batch.scalar_subquery()))
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            return deleted
+
+
+async def run_session_maintenance(
+    session_factory,
+    poll_interval: float = REVOCATION_POLL_INTERVAL,
+    sweep_interval: float = SWEEP_INTERVAL,
+) -> None:
+    """Background task: poll revocations and periodically sweep the table."""
+    last_sweep = time.monotonic()
+    while True:
+        try:
+            async with session_factory() as db:
+                await poll_revocations(db)
+                if time.monotonic() - last_sweep >= sweep_interval:
+                    await sweep_sessions(db)
+                    last_sweep = time.monotonic()
+        except SQLAlchemyError:
+            logger.exception("Session maintenance failed")
+        await asyncio.sleep(poll_interval)
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from functools import lru_cache
+from mimetypes import guess_type
+from pathlib import Path
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:  # optional, gzip only
+    brotli = None
+
+# Fingerprinted, precompressed static assets. The build step copies static/
+# to static/dist/ under content-hashed names (css/main.css ->
+# css/main.3f2a9c1e0b7d.css), with .gz and, if brotli is installed, .br
+# variants of the compressible ones, and maps source to fingerprinted paths
+# in static/dist/manifest.json. Run it before starting the app:
+#
+#     python -m api.static_assets
+#
+# Templates link assets with asset_url("css/main.css"), which falls back to
+# the unbuilt /static file when the manifest has no entry.
+
+STATIC_DIR = Path(__file__).resolve().parent.parent / "static"
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_NAME = "manifest.json"
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".svg", ".html", ".json", ".txt", ".map"}
+# Fingerprinted names never change content, so clients may keep them forever
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _fingerprint(path: Path, content: bytes) -> str:
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f"{path.stem}.{digest}{path.suffix}"
+
+
+def build_static(source: Path = STATIC_DIR, output: Path | None = None) -> dict:
+    """Build output (source/dist by default) and return the manifest."""
+    output = output or source / "dist"
+    if output.exists():
+        shutil.rmtree(output)
+    manifest = {}
+    for path in sorted(source.rglob("*")):
+        if not path.is_file() or output in path.parents:
+            continue
+        content = path.read_bytes()
+        relative = path.relative_to(source)
+        target = output / relative.parent / _fingerprint(path, content)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(content)
+        manifest[relative.as_posix()] = target.relative_to(output).as_posix()
+
+        if path.suffix not in COMPRESSIBLE_SUFFIXES:
+            continue
+        variants = {".gz": gzip.compress(content, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants[".br"] = brotli.compress(content, quality=11)
+        for suffix, compressed in variants.items():
+            if len(compressed) < len(content):
+                target.with_name(target.name + suffix).write_bytes(compressed)
+
+    (output / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    return manifest
+
+
+@lru_cache(maxsize=1)
+def _manifest() -> dict:
+    try:
+        return json.loads((DIST_DIR / MANIFEST_NAME).read_text())
+    except FileNotFoundError:
+        return {}
+
+
+def asset_url(path: str) -> str:
+    """URL of a static asset, fingerprinted when the build has been run."""
+    path = path.lstrip("/")
+    built = _manifest().get(path)
+    if built is None:
+        return f"/static/{path}"
+    return f"/static/dist/{built}"
+
+
+def _accepted_encodings(scope: Scope) -> set[str]:
+    accept = Headers(scope=scope).get("accept-encoding", "")
+    encodings = set()
+    for part in accept.split(","):
+        encoding, _, quality = part.partition(";q=")
+        try:
+            if quality and float(quality) == 0:  # explicitly refused
+                continue
+        except ValueError:
+            continue
+        encodings.add(encoding.strip().lower())
+    return encodings
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles for the build output.
+
+    Serves the .br or .gz variant of a file when the client accepts it,
+    with a long-lived immutable Cache-Control. The ETag is derived from the
+    file actually sent, so each encoding gets its own.
+    """
+
+    def file_response(
+        self,
+        full_path,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        media_type = guess_type(str(full_path))[0] or "application/octet-stream"
+        accepted = _accepted_encodings(scope)
+        response = None
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            if encoding not in accepted:
+                continue
+            try:
+                variant = f"{full_path}{suffix}"
+                response = FileResponse(
+                    variant,
+                    status_code=status_code,
+                    stat_result=os.stat(variant),
+                    media_type=media_type,
+                    headers={"Content-Encoding": encoding},
+                )
+                break
+            except FileNotFoundError:
+                continue
+        if response is None:
+            response = FileResponse(
+                full_path,
+                status_code=status_code,
+                stat_result=stat_result,
+                media_type=media_type,
+            )
+        response.headers["Cache-Control"] = IMMUTABLE
+        response.headers["Vary"] = "Accept-Encoding"
+
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    built = build_static()
+    print(f"Built {len(built)} assets into {DIST_DIR}")
@@ -0,0 +1,47 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Payloads of tokens that already passed jwt.decode, so repeat requests skip
+# the signature check and JSON parsing. Entries expire at the token's own
+# "exp" claim; least recently used tokens are dropped beyond the size limit.
+MAX_CACHED_TOKENS = 10_000
+
+_lock = threading.Lock()
+_tokens: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+stats = {"hits": 0, "misses": 0}
+
+
+def cached_payload(token: str) -> dict | None:
+    with _lock:
+        entry = _tokens.get(token)
+        if entry is not None:
+            expires, payload = entry
+            if expires > time.time():
+                _tokens.move_to_end(token)
+                stats["hits"] += 1
+                return payload
+            del _tokens[token]
+        stats["misses"] += 1
+    return None
+
+
+def cache_payload(token: str, payload: dict) -> None:
+    expires = payload.get("exp")
+    if expires is None:  # never cache a token that doesn't expire
+        return
+    with _lock:
+        _tokens[token] = (float(expires), payload)
+        _tokens.move_to_end(token)
+        while len(_tokens) > MAX_CACHED_TOKENS:
+            _tokens.popitem(last=False)
+
+
+def invalidate_token(token: str) -> None:
+    with _lock:
+        _tokens.pop(token, None)
+
+
+def clear_token_cache() -> None:
+    with _lock:
+        _tokens.clear()
@@ -0,0 +1,163 @@
+"""Latency of the api/crud.py functions against a generated dataset.
+
+Covers single against bulk inserts, the fetch_*_by_* lookups, the
+condition queries and the stock and loyalty increments, on a database
+seeded by database.generate_data at the given scale. Run from the
+repository root:
+
+    python -m benchmarks.bench_crud --scale 0.1 --repeat 200
+"""
+
+import argparse
+import random
+import tempfile
+from pathlib import Path
+from sqlalchemy.orm import sessionmaker
+import api.crud as crud
+from database.connect_db import make_engine
+from database.generate_data import seed_database
+from database.models import Commande, Produit
+from benchmarks.timing import measure
+
+BULK_ROWS = 1000
+BULK_CLIENTS = 100
+
+
+def _cases(db, counts: dict, rng: random.Random, repeat: int) -> dict:
+    nb_produits = counts["Produits"]
+    nb_clients = counts["Clients"]
+    nb_commandes = counts["Commandes"]
+    next_id = {"produit": nb_produits + 1}
+
+    def produit_rows(n):
+        start = next_id["produit"]
+        next_id["produit"] += n
+        return [
+            {
+                "id_produit": i,
+                "nom_produit": f"Bench {i}",
+                "categorie": "Bench",
+                "prix_unitaire": 10,
+                "stock_central": 100,
+            }
+            for i in range(start, start + n)
+        ]
+
+    def insert_produit(_):
+        (row,) = produit_rows(1)
+        crud.insert_produit(db, **row)
+
+    def bulk_insert_produits(_):
+        crud.bulk_insert_produits(db, produit_rows(BULK_ROWS))
+
+    def produit():
+        return rng.randint(1, nb_produits)
+
+    def client():
+        return rng.randint(1, nb_clients)
+
+    categorie = crud.fetch_produit_by_id(db, 1).categorie
+    # Case name: (function, repeat); the scans run fewer times
+    return {
+        "insert_produit": (insert_produit, repeat),
+        f"bulk_insert_produits[{BULK_ROWS}]": (
+            bulk_insert_produits,
+            max(3, repeat // 20),
+        ),
+        "fetch_produit_by_id": (
+            lambda _: crud.fetch_produit_by_id(db, produit()),
+            repeat,
+        ),
+        "fetch_produit_by_categorie": (
+            lambda _: crud.fetch_produit_by_categorie(db, categorie),
+            repeat,
+        ),
+        "fetch_client_by_id": (lambda _: crud.fetch_client_by_id(db, client()), repeat),
+        "fetch_client_by_fidelite": (
+            lambda _: crud.fetch_client_by_fidelite(db, rng.randint(0, 500)),
+            max(3, repeat // 10),
+        ),
+        "fetch_commande_by_id": (
+            lambda _: crud.fetch_commande_by_id(db, rng.randint(1, nb_commandes)),
+            repeat,
+        ),
+        "fetch_produit_by_condition": (
+            lambda _: crud.fetch_produit_by_condition(
+                db,
+                [
+                    Produit.categorie == categorie,
+                    Produit.prix_unitaire <= rng.randint(5, 30),
+                ],
+            ),
+            repeat,
+        ),
+        "fetch_commande_by_conditions": (
+            lambda _: crud.fetch_commande_by_conditions(
+                db,
+                [
+                    Commande.id_client == client(),
+                    Commande.statut_commande == "Livrée",
+                ],
+                "and",
+            ),
+            max(3, repeat // 10),
+        ),
+        "increment_produit_stock": (
+            lambda _: crud.increment_produit_stock(db, produit(), 1),
+            repeat,
+        ),
+        "increment_fidelite_client": (
+            lambda _: crud.increment_fidelite_client(db, client(), 1),
+            repeat,
+        ),
+        f"bulk_increment_fidelite_clients[{BULK_CLIENTS}]": (
+            lambda _: crud.bulk_increment_fidelite_clients(
+                db,
+                {
+                    i: 1
+                    for i in rng.sample(
+                        range(1, nb_clients + 1), min(BULK_CLIENTS, nb_clients)
+                    )
+                },
+            ),
+            repeat,
+        ),
+    }
+
+
+def run_crud(scale: float, repeat: int = 200, seed: int = 42) -> dict:
+    """{case: latency percentiles in ms} at one data scale."""
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'bench.db'}", echo=False)
+        counts = seed_database(engine, scale, seed)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        results = {}
+        with SessionLocal() as db:
+            cases = _cases(db, counts, random.Random(seed), repeat)
+            for name, (fn, times) in cases.items():
+                results[name] = measure(fn, times)
+                # Don't let the identity map grow across cases
+                db.expunge_all()
+        engine.dispose()
+    return results
+
+
+def print_results(results: dict) -> None:
+    print(f"{'case':48} {'p50':>9} {'p95':>9} {'p99':>9}  ms")
+    for name, stats in results.items():
+        print(f"{name:48} {stats['p50']:9.3f} {stats['p95']:9.3f} {stats['p99']:9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print_results(run_crud(args.scale, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
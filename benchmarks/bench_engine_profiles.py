@@ -0,0 +1,111 @@
+"""Mixed read/write throughput of the SQLite engine profiles.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_engine_profiles --threads 8 --ops 2000
+"""
+
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from sqlalchemy.orm import sessionmaker
+from database.connect_db import ENGINE_PROFILES, make_engine
+from database.models import Base, Produit
+import api.crud as crud
+
+
+def _seed(SessionLocal, nb_produits: int) -> None:
+    with SessionLocal() as db:
+        db.add_all(
+            Produit(
+                id_produit=i,
+                nom_produit=f"Produit {i}",
+                categorie="Cheese",
+                prix_unitaire=10,
+                stock_central=1000,
+            )
+            for i in range(1, nb_produits + 1)
+        )
+        db.commit()
+
+
+def _worker(SessionLocal, ops, write_ratio, nb_produits, seed, errors):
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        for _ in range(ops):
+            id_produit = rng.randint(1, nb_produits)
+            try:
+                if rng.random() < write_ratio:
+                    crud.increment_produit_stock(db, id_produit, 1)
+                else:
+                    crud.fetch_produit_by_id(db, id_produit)
+                    db.rollback()  # end the read transaction like a request would
+            except Exception as e:  # "database is locked" on the legacy profile
+                db.rollback()
+                errors.append(e)
+
+
+def run_profile(profile, threads, ops, write_ratio, nb_produits, echo) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{Path(tmp) / 'bench.db'}"
+        engine = make_engine(url, profile=profile, echo=echo)
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(SessionLocal, nb_produits)
+
+        errors: list = []
+        workers = [
+            threading.Thread(
+                target=_worker,
+                args=(SessionLocal, ops, write_ratio, nb_produits, seed, errors),
+            )
+            for seed in range(threads)
+        ]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+
+    total = threads * ops
+    return {
+        "profile": profile,
+        "ops": total,
+        "seconds": round(elapsed, 3),
+        "ops_per_second": round((total - len(errors)) / elapsed, 1),
+        "errors": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=1000, help="operations per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--produits", type=int, default=1000)
+    parser.add_argument(
+        "--legacy-echo",
+        action="store_true",
+        help="run the legacy profile with echo=True, as connect_db.py used to",
+    )
+    args = parser.parse_args()
+
+    for profile in ENGINE_PROFILES:
+        echo = args.legacy_echo and profile == "legacy"
+        result = run_profile(
+            profile, args.threads, args.ops, args.write_ratio, args.produits, echo
+        )
+        print(
+            f"{result['profile']:>10}: {result['ops_per_second']:>9} ops/s "
+            f"({result['ops']} ops in {result['seconds']}s, "
+            f"{result['errors']} errors)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""In-process HTTP latency of the app's hot paths.
+
+Drives the real ASGI app through httpx, with no server or network, against
+a database seeded by database.generate_data: the home page (full and HTMX
+partial), the HTMX login, product search and the product listing.
+Reports p50/p95/p99 per endpoint. Run from the repository root:
+
+    python -m benchmarks.bench_http --scale 0.1 --requests 200
+"""
+
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database.connect_db import make_async_engine, make_engine
+from database.generate_data import FROMAGES, seed_database
+from benchmarks.timing import percentiles
+
+ROOT = Path(__file__).resolve().parent.parent
+# The app uses package-relative imports; the checkout's directory name isn't
+# always a valid package name, so it is loaded under this one.
+APP_PACKAGE = "affineur"
+USERNAME = "bench"
+PASSWORD = "bench-password"
+# bcrypt makes logins two orders of magnitude slower than the rest
+LOGINS = 20
+
+
+def load_app():
+    """Import main.py as part of the app package, return its FastAPI app."""
+    os.environ.setdefault("SECRET_KEY", "benchmark")
+    os.environ.setdefault("HASH_ALGORITHM", "HS256")
+    if APP_PACKAGE not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            APP_PACKAGE, ROOT / "__init__.py", submodule_search_locations=[str(ROOT)]
+        )
+        package = importlib.util.module_from_spec(spec)
+        sys.modules[APP_PACKAGE] = package
+        spec.loader.exec_module(package)
+    return importlib.import_module(f"{APP_PACKAGE}.main").app
+
+
+def _endpoints(categorie: str) -> dict:
+    terms = [nom.split()[0][:4].lower() for nom, _ in FROMAGES]
+    return {
+        "GET /": lambda i: ("GET", "/", {}, None),
+        "GET / (htmx)": lambda i: ("GET", "/", {"HX-Request": "true"}, None),
+        "GET /api/search": lambda i: (
+            "GET",
+            f"/api/search?q={terms[i % len(terms)]}",
+            {},
+            None,
+        ),
+        "GET /api/products": lambda i: ("GET", "/api/products", {}, None),
+        "GET /api/products?category&sort=prix": lambda i: (
+            "GET",
+            f"/api/products?category={categorie}&sort=prix",
+            {},
+            None,
+        ),
+        "POST /auth/token (htmx)": lambda i: (
+            "POST",
+            "/auth/token",
+            {"HX-Request": "true"},
+            {"username": USERNAME, "password": PASSWORD},
+        ),
+    }
+
+
+async def _drive(app, endpoints: dict, requests: int, logins: int) -> dict:
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        for name, make_request in endpoints.items():
+            times = logins if name.startswith("POST /auth") else requests
+            samples = []
+            for i in range(times + 1):
+                method, url, headers, data = make_request(i)
+                start = time.perf_counter()
+                response = await client.request(method, url, headers=headers, data=data)
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    raise RuntimeError(f"{name}: HTTP {response.status_code}")
+                if i:  # the first request warms the caches up
+                    samples.append(elapsed)
+            results[name] = percentiles(samples)
+    return results
+
+
+def run_http(
+    scale: float, requests: int = 200, logins: int = LOGINS, seed: int = 42
+) -> dict:
+    """{endpoint: latency percentiles in ms} at one data scale."""
+    app = load_app()
+    connect_db = importlib.import_module(f"{APP_PACKAGE}.database.connect_db")
+    passwords = importlib.import_module(f"{APP_PACKAGE}.api.passwords")
+    catalog_cache = importlib.import_module(f"{APP_PACKAGE}.api.catalog_cache")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.db"
+        engine = make_engine(f"sqlite:///{path}", echo=False)
+        seed_database(engine, scale, seed)
+        with engine.begin() as connection:
+            connection.exec_driver_sql(
+                "INSERT INTO Users (username, hashed_password, role) "
+                "VALUES (?, ?, 'regular')",
+                (USERNAME, passwords.bcrypt_context.hash(PASSWORD)),
+            )
+            (categorie,) = connection.exec_driver_sql(
+                "SELECT categorie FROM Produits LIMIT 1"
+            ).one()
+        engine.dispose()
+
+        async_engine = make_async_engine(f"sqlite+aiosqlite:///{path}", echo=False)
+        AsyncSessionLocal = async_sessionmaker(
+            bind=async_engine, autoflush=False, expire_on_commit=False
+        )
+
+        async def get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[connect_db.get_async_db] = get_async_db
+        # Fragments cached by an earlier scale would hide this one's data
+        catalog_cache.invalidate_catalog()
+
+        async def run():
+            try:
+                return await _drive(app, _endpoints(categorie), requests, logins)
+            finally:
+                await async_engine.dispose()
+
+        try:
+            return asyncio.run(run())
+        finally:
+            app.dependency_overrides.clear()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scale", type=float, default=0.1)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=LOGINS)
+    args = parser.parse_args()
+
+    results = run_http(args.scale, args.requests, args.logins)
+    print(f"{'endpoint':40} {'p50':>9} {'p95':>9} {'p99':>9}  ms")
+    for name, stats in results.items():
+        print(f"{name:40} {stats['p50']:9.3f} {stats['p95']:9.3f} {stats['p99']:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
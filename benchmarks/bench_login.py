@@ -0,0 +1,98 @@
+"""Login throughput and unrelated-request latency during a login storm.
+
+Compares verifying passwords inline on the event loop (as auth.py used to)
+with the thread pool in api/passwords.py. Run from the repository root:
+
+    python -m benchmarks.bench_login --logins 64 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from api import passwords
+
+
+def make_app(hashed: str) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/login/blocking")
+    async def login_blocking():
+        return {"ok": passwords.bcrypt_context.verify("secret", hashed)}
+
+    @app.post("/login/offloaded")
+    async def login_offloaded():
+        valid, _ = await passwords.verify_password("secret", hashed)
+        return {"ok": valid}
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def _storm(client, mode: str, logins: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_login():
+        async with semaphore:
+            response = await client.post(f"/login/{mode}")
+            assert response.json() == {"ok": True}
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    return time.perf_counter() - start
+
+
+async def _pinger(client, done: asyncio.Event, latencies: list) -> None:
+    while not done.is_set():
+        start = time.perf_counter()
+        await client.get("/ping")
+        latencies.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.01)
+
+
+async def run_mode(app, mode: str, logins: int, concurrency: int) -> dict:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        done = asyncio.Event()
+        latencies: list[float] = []
+        pinger = asyncio.create_task(_pinger(client, done, latencies))
+        elapsed = await _storm(client, mode, logins, concurrency)
+        done.set()
+        await pinger
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "logins_per_second": round(logins / elapsed, 1),
+        "ping_p50_ms": round(statistics.median(latencies), 1),
+        "ping_max_ms": round(latencies[-1], 1),
+        "pings": len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    app = make_app(passwords.bcrypt_context.hash("secret"))
+    print(f"bcrypt rounds={passwords.BCRYPT_ROUNDS}, workers={passwords.HASH_WORKERS}")
+    for mode in ("blocking", "offloaded"):
+        result = asyncio.run(run_mode(app, mode, args.logins, args.concurrency))
+        print(
+            f"{result['mode']:>10}: {result['logins_per_second']:>7} logins/s, "
+            f"ping p50 {result['ping_p50_ms']} ms, max {result['ping_max_ms']} ms "
+            f"({result['pings']} pings)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""Home page render time for a large catalog.
+
+The product grid holds the whole catalog, as the home page used to.
+Compares rendering every fragment on each request with serving them from
+the fragment cache (full page and HTMX partial), and compiling the
+templates from source with loading them from the Jinja bytecode cache.
+Run from the repository root:
+
+    python -m benchmarks.bench_render --produits 5000 --promotions 500
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup
+from api import catalog_cache
+
+TEMPLATES = (
+    "main.html",
+    "partials/home_content.html",
+    "partials/promotions.html",
+    "partials/products_page.html",
+    "partials/category_filter.html",
+    "partials/store_card.html",
+)
+
+
+class _Request:
+    # Just enough of starlette's Request for url_for() in the templates
+    def url_for(self, name, **path_params):
+        return f"/{name}/{path_params.get('path', '')}"
+
+
+def make_catalog(nb_produits: int, nb_promotions: int) -> SimpleNamespace:
+    produits = [
+        SimpleNamespace(
+            id_produit=i,
+            nom_produit=f"Produit {i}",
+            categorie=f"Categorie {i % 20}",
+            description="Affiné en cave pendant douze mois",
+            prix_unitaire=Decimal("12.50"),
+        )
+        for i in range(1, nb_produits + 1)
+    ]
+    promotions = [
+        SimpleNamespace(
+            produit=produits[i % nb_produits],
+            taux_reduction=10,
+            date_fin=date.today() + timedelta(days=7),
+        )
+        for i in range(nb_promotions)
+    ]
+    return SimpleNamespace(
+        produits=produits,
+        promotions=promotions,
+        prices={produit.id_produit: Decimal("11.25") for produit in produits},
+        categories=sorted({produit.categorie for produit in produits}),
+        store=SimpleNamespace(
+            nom_magasin="Store1", adresse="123 Street", telephone="123456789"
+        ),
+        user=SimpleNamespace(username="bench", points_fidelite=0),
+    )
+
+
+def _render(templates, name: str, **context) -> str:
+    return templates.get_template(name).render(request=_Request(), **context)
+
+
+async def render_home(templates, catalog, cached: bool, htmx: bool = False) -> str:
+    async def fragment(key, name, **context):
+        async def render():
+            return _render(templates, name, **context)
+
+        if cached:
+            return Markup(await catalog_cache.get_fragment(key, render))
+        return Markup(await render())
+
+    context = {
+        "promotions_html": await fragment(
+            ("promotions",), "partials/promotions.html", promotions=catalog.promotions
+        ),
+        "products_html": await fragment(
+            ("products",),
+            "partials/products_page.html",
+            products=catalog.produits,
+            prices=catalog.prices,
+            next_cursor=None,
+        ),
+        "categories_html": await fragment(
+            ("categories",),
+            "partials/category_filter.html",
+            categories=catalog.categories,
+        ),
+        "store_html": await fragment(
+            ("store",), "partials/store_card.html", nearest_store=catalog.store
+        ),
+    }
+    if htmx:
+        return _render(templates, "partials/home_content.html", **context)
+    return _render(templates, "main.html", user=catalog.user, **context)
+
+
+def _time_ms(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def bench_pages(catalog, repeat: int) -> dict:
+    templates = Jinja2Templates(directory="templates")
+    catalog_cache.invalidate_catalog()
+    results = {}
+    for label, cached, htmx in (
+        ("uncached page", False, False),
+        ("cached page", True, False),
+        ("cached htmx partial", True, True),
+    ):
+        html = asyncio.run(render_home(templates, catalog, cached, htmx))
+        results[label] = (
+            _time_ms(
+                lambda: asyncio.run(render_home(templates, catalog, cached, htmx)),
+                repeat,
+            ),
+            len(html),
+        )
+    return results
+
+
+def bench_compile(repeat: int) -> dict:
+    def load_all(bytecode_cache):
+        templates = Jinja2Templates(directory="templates")
+        templates.env.bytecode_cache = bytecode_cache
+        for name in TEMPLATES:
+            templates.get_template(name)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        load_all(bytecode_cache)  # fill the cache
+        return {
+            "compile from source": _time_ms(lambda: load_all(None), repeat),
+            "bytecode cache": _time_ms(lambda: load_all(bytecode_cache), repeat),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--produits", type=int, default=5000)
+    parser.add_argument("--promotions", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.produits, args.promotions)
+    print(f"{args.produits} produits, {args.promotions} promotions")
+    for label, (ms, size) in bench_pages(catalog, args.repeat).items():
+        print(f"{label:>20}: {ms:>8.2f} ms ({size // 1024} KiB)")
+    for label, ms in bench_compile(args.repeat).items():
+        print(f"{label:>20}: {ms:>8.2f} ms to load {len(TEMPLATES)} templates")
+
+
+if __name__ == "__main__":
+    main()
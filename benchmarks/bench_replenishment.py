@@ -0,0 +1,133 @@
+"""Replenishment planning time for thousands of products x hundreds of stores.
+
+Fills a temporary database with four weeks of sales, then times the
+aggregate sales query, the vectorized planning pass and the bulk apply.
+Run from the repository root:
+
+    python -m benchmarks.bench_replenishment --produits 5000 --magasins 300
+"""
+
+import argparse
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+import numpy as np
+from sqlalchemy.orm import sessionmaker
+from database.connect_db import make_engine
+from database.models import Base
+from api import replenishment
+
+
+def _seed(engine, nb_produits, nb_magasins, sell_ratio, now, seed) -> int:
+    rng = np.random.default_rng(seed)
+    days = replenishment.LOOKBACK_DAYS
+    # One order per store and day; each store sells a random share of the
+    # catalog, every pair on a random day of the period
+    magasin, produit = np.nonzero(rng.random((nb_magasins, nb_produits)) < sell_ratio)
+    day = rng.integers(0, days, len(magasin))
+    id_commande = magasin * days + day + 1
+    quantite = rng.integers(1, 60, len(magasin))
+    stock = rng.integers(0, 40, len(magasin))
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        cursor.execute(
+            "INSERT INTO Clients (id_client, nom_client, type_client) "
+            "VALUES (1, 'bench', 'Individu')"
+        )
+        cursor.executemany(
+            "INSERT INTO Magasins VALUES (?, ?, '1 rue', 'Annecy', '0102030405')",
+            ((m, f"Magasin {m}") for m in range(1, nb_magasins + 1)),
+        )
+        cursor.executemany(
+            "INSERT INTO Produits (id_produit, nom_produit, categorie, "
+            "prix_unitaire, stock_central) VALUES (?, ?, 'Cheese', 10, ?)",
+            (
+                (p, f"Produit {p}", int(s))
+                for p, s in zip(
+                    range(1, nb_produits + 1),
+                    rng.integers(0, 20 * nb_magasins, nb_produits),
+                )
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO Commandes (id_commande, id_client, id_magasin, "
+            "date_commande, statut_commande) VALUES (?, 1, ?, ?, 'Livrée')",
+            (
+                (m * days + d + 1, m + 1, str(now - timedelta(days=d)))
+                for m in range(nb_magasins)
+                for d in range(days)
+            ),
+        )
+        cursor.executemany(
+            "INSERT INTO Lignes_Commande (id_commande, id_produit, quantite, "
+            "prix_unitaire) VALUES (?, ?, ?, 10)",
+            zip(id_commande.tolist(), (produit + 1).tolist(), quantite.tolist()),
+        )
+        cursor.executemany(
+            "INSERT INTO Stock_Magasins VALUES (?, ?, ?)",
+            zip((magasin + 1).tolist(), (produit + 1).tolist(), stock.tolist()),
+        )
+        raw.commit()
+    finally:
+        raw.close()
+    return len(magasin)
+
+
+def run(nb_produits, nb_magasins, sell_ratio, seed=0) -> dict:
+    now = datetime(2024, 12, 27)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(engine)
+        pairs = _seed(engine, nb_produits, nb_magasins, sell_ratio, now, seed)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        with SessionLocal() as db:
+            start = time.perf_counter()
+            sales = replenishment.load_sales(
+                db, now - timedelta(days=replenishment.LOOKBACK_DAYS)
+            )
+            loaded = time.perf_counter()
+            plan = replenishment.plan_transfers(sales)
+            planned = time.perf_counter()
+            replenishment.apply_plan(db, plan)
+            applied = time.perf_counter()
+        engine.dispose()
+
+    return {
+        "pairs": pairs,
+        "transfers": len(plan),
+        "units": int(plan.quantite.sum()),
+        "query_s": round(loaded - start, 3),
+        "plan_s": round(planned - loaded, 3),
+        "apply_s": round(applied - planned, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--produits", type=int, default=5000)
+    parser.add_argument("--magasins", type=int, default=300)
+    parser.add_argument(
+        "--sell-ratio",
+        type=float,
+        default=0.2,
+        help="share of the catalog each store sold over the period",
+    )
+    args = parser.parse_args()
+
+    result = run(args.produits, args.magasins, args.sell_ratio)
+    print(
+        f"{result['pairs']} (store, product) pairs -> {result['transfers']} "
+        f"transfers, {result['units']} units"
+    )
+    print(
+        f"query {result['query_s']}s, plan {result['plan_s']}s, "
+        f"apply {result['apply_s']}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""Concurrent stock reservations: throughput and an oversell check.
+
+Threads reserve random products from the central stock and from a store's
+stock until it runs out. Each reservation is then confirmed, released, or
+abandoned to expire, while a sweeper thread releases expired ones. At the
+end, every unit must be accounted for: still in stock, sold, or held.
+Run from the repository root:
+
+    python -m benchmarks.bench_reservations --threads 8 --ops 500
+"""
+
+import argparse
+from tests.stress import run_stress
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=500, help="attempts per thread")
+    parser.add_argument("--produits", type=int, default=20)
+    parser.add_argument("--stock", type=int, default=50)
+    args = parser.parse_args()
+
+    result = run_stress(args.threads, args.ops, args.produits, args.stock)
+    print(
+        f"{result['reservations_per_second']} reservations/s "
+        f"({result['reserved']} reserved, {result['rejected']} rejected, "
+        f"{result['confirmed']} confirmed, {result['released']} released, "
+        f"{result['expired']} expired in {result['seconds']}s)"
+    )
+    print(f"unaccounted units: {result['unaccounted_units']}")
+
+
+if __name__ == "__main__":
+    main()
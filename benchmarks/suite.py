@@ -0,0 +1,110 @@
+"""Benchmark suite: crud and HTTP latency at several data scales.
+
+Runs benchmarks.bench_crud and benchmarks.bench_http at each scale and
+writes the percentiles to a JSON file named after the current commit, so
+two commits can be compared. Run from the repository root:
+
+    python -m benchmarks.suite --scales 0.01 0.1 1
+    python -m benchmarks.suite --compare benchmarks/results/abc123.json \\
+        benchmarks/results/def456.json
+
+The comparison exits with status 1 when a case's p50 got slower than the
+threshold (20% by default) in the second file.
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from benchmarks.bench_crud import run_crud
+from benchmarks.bench_http import run_http
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+THRESHOLD = 1.2
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(
+    scales: list[float], repeat: int = 200, requests: int = 200, logins: int = 20
+) -> dict:
+    return {
+        "commit": _commit(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scales": {
+            str(scale): {
+                "crud": run_crud(scale, repeat),
+                "http": run_http(scale, requests, logins),
+            }
+            for scale in scales
+        },
+    }
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """(scale, group, case, baseline p50, current p50, ratio) of every case in
+    both runs, slowest change first."""
+    rows = []
+    for scale, groups in current["scales"].items():
+        for group, cases in groups.items():
+            before = baseline["scales"].get(scale, {}).get(group, {})
+            for case, stats in cases.items():
+                if case in before and before[case]["p50"] > 0:
+                    ratio = stats["p50"] / before[case]["p50"]
+                    rows.append(
+                        (scale, group, case, before[case]["p50"], stats["p50"], ratio)
+                    )
+    return sorted(rows, key=lambda row: row[-1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.01, 0.1])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--logins", type=int, default=20)
+    parser.add_argument("--out", type=Path, help="default: results/<commit>.json")
+    parser.add_argument("--compare", type=Path, nargs=2, metavar=("BASE", "NEW"))
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        baseline, current = (json.loads(path.read_text()) for path in args.compare)
+        rows = compare(baseline, current)
+        print(f"{'scale':>6} {'case':52} {'base':>9} {'new':>9} {'ratio':>6}")
+        for scale, group, case, before, after, ratio in rows:
+            flag = "  <-- slower" if ratio > args.threshold else ""
+            print(
+                f"{scale:>6} {group + ' ' + case:52} {before:9.3f} {after:9.3f}"
+                f" {ratio:6.2f}{flag}"
+            )
+        if any(row[-1] > args.threshold for row in rows):
+            sys.exit(1)
+        return
+
+    results = run_suite(args.scales, args.repeat, args.requests, args.logins)
+    out = args.out or RESULTS_DIR / f"{results['commit']}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""Latency statistics shared by the benchmark suite."""
+
+import time
+import numpy as np
+
+
+def percentiles(samples: list[float]) -> dict:
+    """p50/p95/p99 and mean of durations in seconds, in milliseconds."""
+    ms = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        "n": len(ms),
+        "p50": round(float(p50), 4),
+        "p95": round(float(p95), 4),
+        "p99": round(float(p99), 4),
+        "mean": round(float(ms.mean()), 4),
+    }
+
+
+def measure(fn, repeat: int, warmup: int = 1) -> dict:
+    """Call fn(i) for i in range(repeat) and return the latency percentiles."""
+    for i in range(warmup):
+        fn(i)
+    samples = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
@@ -1,13 +1,115 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from .query_stats import instrument_engine
 
 
 DB_PATH = "database/affineurs.db"
 
-engine = create_engine(f"sqlite:///{DB_PATH}", echo=True)
+# "legacy" is what SQLite and SQLAlchemy give us out of the box (rollback
+# journal, FULL sync, default pool). "production" lets readers run alongside
+# the single writer (WAL), only fsyncs at checkpoints and waits on locks
+# instead of failing straight away with "database is locked".
+ENGINE_PROFILES = {
+    "legacy": {
+        "pragmas": {},
+        "pool": {},
+    },
+    "production": {
+        "pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -64000,  # negative = KiB, so 64 MB per connection
+            "mmap_size": 268435456,
+            "temp_store": "MEMORY",
+        },
+        "pool": {
+            "pool_size": 10,
+            "max_overflow": 10,
+            "pool_timeout": 30,
+        },
+    },
+}
+
+DEFAULT_PROFILE = os.getenv("DB_PROFILE", "production")
+
+
+def _echo_from_env() -> bool:
+    return os.getenv("DB_ECHO", "").lower() in ("1", "true", "yes")
+
+
+def _set_sqlite_pragmas(target: Engine, pragmas: dict) -> None:
+    if not pragmas:
+        return
+
+    @event.listens_for(target, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def _engine_options(url: str, profile: str, echo: bool | None, options: dict):
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown engine profile: {profile}")
+    settings = ENGINE_PROFILES[profile]
+
+    engine_options = {"echo": _echo_from_env() if echo is None else echo}
+    # In-memory databases use a single shared connection, pool sizing does
+    # not apply to them.
+    if make_url(url).database not in (None, "", ":memory:"):
+        engine_options.update(settings["pool"])
+    engine_options.update(options)
+    return settings["pragmas"], engine_options
+
+
+def make_engine(
+    url: str = f"sqlite:///{DB_PATH}",
+    profile: str = DEFAULT_PROFILE,
+    echo: bool | None = None,
+    **options,
+) -> Engine:
+    pragmas, engine_options = _engine_options(url, profile, echo, options)
+    new_engine = create_engine(url, **engine_options)
+    _set_sqlite_pragmas(new_engine, pragmas)
+    instrument_engine(new_engine)
+    return new_engine
+
+
+def make_async_engine(
+    url: str = f"sqlite+aiosqlite:///{DB_PATH}",
+    profile: str = DEFAULT_PROFILE,
+    echo: bool | None = None,
+    **options,
+) -> AsyncEngine:
+    pragmas, engine_options = _engine_options(url, profile, echo, options)
+    new_engine = create_async_engine(url, **engine_options)
+    _set_sqlite_pragmas(new_engine.sync_engine, pragmas)
+    instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+engine = make_engine()
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = make_async_engine()
+
+# expire_on_commit=False: attributes can't be lazily reloaded once the
+# request has returned to the event loop, so keep them after commit.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False
+)
+
 def get_db_connection():
-    with SessionLocal() as db: 
-        yield db
\ No newline at end of file
+    with SessionLocal() as db:
+        yield db
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,414 @@
+import argparse
+import time
+from datetime import date
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from api.loyalty import POINTS_PER_EURO
+from api.rollups import rebuild_rollups
+from .connect_db import DB_PATH, make_engine
+from .models import (
+    Base,
+    Client,
+    Commande,
+    Facture,
+    HistoriqueFidelite,
+    LigneCommande,
+    Livraison,
+    Magasin,
+    Produit,
+    Promotion,
+    StockMagasin,
+)
+
+# Deterministic synthetic dataset for benchmarks and local testing: same seed
+# and scale, same database. Scale 1 is about 1.6 million rows (25 stores, 400
+# products, 25,000 clients, 250,000 orders over two years, with their lines,
+# deliveries, invoices, store stock and loyalty history), Zipf-skewed towards
+# a few products, clients and stores and following the week and the
+# Christmas peak. Rows are built with NumPy and loaded with executemany, one
+# transaction per table, with secondary indexes and triggers dropped until
+# the end. From the repository root:
+#
+#     python -m database.generate_data --scale 1 --seed 42
+
+BASE_COUNTS = {
+    Magasin: 25,
+    Produit: 400,
+    Client: 25_000,
+    Commande: 250_000,
+}
+END_DATE = date(2024, 12, 31)
+DAYS = 730
+VOUCHER_POINTS = 100
+
+VILLES = [
+    "Annecy",
+    "Chambéry",
+    "Grenoble",
+    "Albertville",
+    "Chamonix",
+    "Thonon-les-Bains",
+    "Aix-les-Bains",
+    "Bourg-Saint-Maurice",
+    "Megève",
+    "Lyon",
+]
+FROMAGES = [
+    ("Beaufort", "Pâte pressée cuite"),
+    ("Comté", "Pâte pressée cuite"),
+    ("Abondance", "Pâte pressée cuite"),
+    ("Emmental de Savoie", "Pâte pressée cuite"),
+    ("Tomme de Savoie", "Pâte pressée non cuite"),
+    ("Reblochon", "Pâte pressée non cuite"),
+    ("Raclette", "Pâte pressée non cuite"),
+    ("Tamié", "Pâte pressée non cuite"),
+    ("Vacherin", "Pâte molle"),
+    ("Saint-Marcellin", "Pâte molle"),
+    ("Bleu de Bonneval", "Pâte persillée"),
+    ("Persillé des Aravis", "Pâte persillée"),
+    ("Chevrotin", "Chèvre"),
+    ("Tomme de chèvre", "Chèvre"),
+]
+AFFINAGES = ["jeune", "fruité", "vieux", "d'alpage", "fermier", "extra-vieux"]
+
+
+def _zipf_weights(rng, n: int, s: float) -> np.ndarray:
+    # Weight 1/rank**s, ranks shuffled so the best sellers aren't ids 1, 2...
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+def _day_weights(days: np.ndarray) -> np.ndarray:
+    # Growing business, busy weekends, Christmas peak
+    trend = np.linspace(1.0, 1.5, len(days))
+    weekday = np.array([0.9, 0.9, 1.0, 1.0, 1.2, 1.6, 0.6])[
+        (days.astype("datetime64[D]").view("int64") - 4) % 7
+    ]
+    month = days.astype("datetime64[M]").astype(int) % 12 + 1
+    season = np.where(month == 12, 1.8, np.where(month <= 2, 1.3, 1.0))
+    weights = trend * weekday * season
+    return weights / weights.sum()
+
+
+def _datetimes(values: np.ndarray) -> list[str]:
+    # SQLAlchemy's SQLite DateTime format, which the queries compare against
+    return np.char.replace(np.datetime_as_string(values, unit="us"), "T", " ").tolist()
+
+
+def _counts(scale: float) -> dict:
+    return {model: max(1, round(n * scale)) for model, n in BASE_COUNTS.items()}
+
+
+def generate(scale: float = 1.0, seed: int = 42) -> dict:
+    """Build every table's rows, as {model: (columns, rows)}."""
+    rng = np.random.default_rng(seed)
+    counts = _counts(scale)
+    nb_magasins, nb_produits = counts[Magasin], counts[Produit]
+    nb_clients, nb_commandes = counts[Client], counts[Commande]
+    data = {}
+
+    id_magasin = np.arange(1, nb_magasins + 1)
+    villes = rng.choice(VILLES, nb_magasins)
+    data[Magasin] = (
+        ("id_magasin", "nom_magasin", "adresse", "ville", "telephone"),
+        [
+            (
+                i,
+                f"Affineur des Alpes {ville} {i}",
+                f"{i} place du Marché",
+                ville,
+                f"04{i:08d}",
+            )
+            for i, ville in zip(id_magasin.tolist(), villes.tolist())
+        ],
+    )
+
+    # Products: popularity drives sales, stock and promotions
+    id_produit = np.arange(1, nb_produits + 1)
+    popularite = _zipf_weights(rng, nb_produits, 1.1)
+    fromage = rng.integers(0, len(FROMAGES), nb_produits)
+    affinage = rng.integers(0, len(AFFINAGES), nb_produits)
+    prix_centimes = np.round(rng.lognormal(np.log(1500), 0.5, nb_produits)).astype(
+        np.int64
+    )
+    stock_central = rng.poisson(50 + 20_000 * popularite)
+    data[Produit] = (
+        ("id_produit", "nom_produit", "categorie", "prix_unitaire", "stock_central"),
+        [
+            (
+                i,
+                f"{FROMAGES[f][0]} {AFFINAGES[a]} {i}",
+                FROMAGES[f][1],
+                p / 100,
+                s,
+            )
+            for i, f, a, p, s in zip(
+                id_produit.tolist(),
+                fromage.tolist(),
+                affinage.tolist(),
+                prix_centimes.tolist(),
+                stock_central.tolist(),
+            )
+        ],
+    )
+
+    stock = rng.poisson(2 + 2_000 * np.tile(popularite, nb_magasins))
+    data[StockMagasin] = (
+        ("id_magasin", "id_produit", "stock_disponible"),
+        list(
+            zip(
+                np.repeat(id_magasin, nb_produits).tolist(),
+                np.tile(id_produit, nb_magasins).tolist(),
+                stock.tolist(),
+            )
+        ),
+    )
+
+    first_day = np.datetime64(END_DATE) - np.timedelta64(DAYS - 1, "D")
+    days = first_day + np.arange(DAYS)
+    nb_promotions = 2 * nb_produits
+    debut = days[rng.integers(0, DAYS, nb_promotions)]
+    data[Promotion] = (
+        (
+            "id_promotion",
+            "id_produit",
+            "description",
+            "date_debut",
+            "date_fin",
+            "taux_reduction",
+        ),
+        list(
+            zip(
+                range(1, nb_promotions + 1),
+                rng.choice(id_produit, nb_promotions, p=popularite).tolist(),
+                ["Promotion"] * nb_promotions,
+                np.datetime_as_string(debut, unit="D").tolist(),
+                np.datetime_as_string(
+                    debut + rng.integers(7, 31, nb_promotions), unit="D"
+                ).tolist(),
+                rng.choice([5.0, 10.0, 15.0, 20.0, 30.0], nb_promotions).tolist(),
+            )
+        ),
+    )
+
+    # Orders: who, where and when
+    id_commande = np.arange(1, nb_commandes + 1)
+    commande_client = rng.choice(
+        nb_clients, nb_commandes, p=_zipf_weights(rng, nb_clients, 0.7)
+    )
+    commande_magasin = rng.choice(
+        id_magasin, nb_commandes, p=_zipf_weights(rng, nb_magasins, 0.8)
+    )
+    commande_jour = np.sort(rng.choice(DAYS, nb_commandes, p=_day_weights(days)))
+    date_commande = days[commande_jour].astype("datetime64[s]") + rng.integers(
+        8 * 3600, 20 * 3600, nb_commandes
+    ).astype("timedelta64[s]")
+    age = DAYS - 1 - commande_jour
+    statut = np.where(age > 7, "Livrée", np.where(age > 2, "Expédiée", "En cours"))
+    data[Commande] = (
+        ("id_commande", "id_client", "id_magasin", "date_commande", "statut_commande"),
+        list(
+            zip(
+                id_commande.tolist(),
+                (commande_client + 1).tolist(),
+                commande_magasin.tolist(),
+                _datetimes(date_commande),
+                statut.tolist(),
+            )
+        ),
+    )
+
+    # Lines: one per product in an order, like checkout writes them
+    nb_lignes = np.minimum(1 + rng.poisson(1.5, nb_commandes), 8)
+    ligne_commande = np.repeat(np.arange(nb_commandes), nb_lignes)
+    ligne_produit = rng.choice(nb_produits, len(ligne_commande), p=popularite)
+    keys = np.unique(ligne_commande * nb_produits + ligne_produit)
+    ligne_commande, ligne_produit = keys // nb_produits, keys % nb_produits
+    quantite = np.minimum(rng.geometric(0.45, len(keys)), 12)
+    montant_centimes = quantite * prix_centimes[ligne_produit]
+    data[LigneCommande] = (
+        ("id_ligne", "id_commande", "id_produit", "quantite", "prix_unitaire"),
+        list(
+            zip(
+                range(1, len(keys) + 1),
+                (ligne_commande + 1).tolist(),
+                (ligne_produit + 1).tolist(),
+                quantite.tolist(),
+                (prix_centimes[ligne_produit] / 100).tolist(),
+            )
+        ),
+    )
+
+    total_centimes = np.bincount(
+        ligne_commande, weights=montant_centimes, minlength=nb_commandes
+    ).astype(np.int64)
+    dates = _datetimes(date_commande)
+    data[Facture] = (
+        ("id_facture", "id_commande", "montant_total", "date_facture"),
+        list(
+            zip(
+                id_commande.tolist(),
+                id_commande.tolist(),
+                (total_centimes / 100).tolist(),
+                dates,
+            )
+        ),
+    )
+
+    livre = statut != "En cours"
+    date_livraison = date_commande[livre] + rng.integers(1, 5, livre.sum()).astype(
+        "timedelta64[D]"
+    )
+    data[Livraison] = (
+        (
+            "id_livraison",
+            "id_commande",
+            "id_magasin",
+            "date_livraison",
+            "statut_livraison",
+        ),
+        list(
+            zip(
+                range(1, livre.sum() + 1),
+                id_commande[livre].tolist(),
+                commande_magasin[livre].tolist(),
+                _datetimes(date_livraison),
+                np.where(statut[livre] == "Livrée", "Livrée", "En cours").tolist(),
+            )
+        ),
+    )
+
+    # Loyalty: each invoice earns its points, as checkout credits them, and
+    # clients turn every 2 * VOUCHER_POINTS into a voucher
+    points = total_centimes // 100 * POINTS_PER_EURO
+    credite = points > 0
+    earned = np.bincount(
+        commande_client[credite], weights=points[credite], minlength=nb_clients
+    ).astype(np.int64)
+    redeemed = earned // (2 * VOUCHER_POINTS) * VOUCHER_POINTS
+    redeemers = np.flatnonzero(redeemed)
+    end = f"{END_DATE.isoformat()} 23:00:00.000000"
+    historique = list(
+        zip(
+            (commande_client[credite] + 1).tolist(),
+            [dates[i] for i in np.flatnonzero(credite).tolist()],
+            points[credite].tolist(),
+            [f"Commande {i}" for i in id_commande[credite].tolist()],
+            id_commande[credite].tolist(),
+        )
+    ) + [
+        (id_client + 1, end, -r, "Bon d'achat", None)
+        for id_client, r in zip(redeemers.tolist(), redeemed[redeemers].tolist())
+    ]
+    data[HistoriqueFidelite] = (
+        ("id_client", "date_operation", "points_ajoutes", "description", "id_facture"),
+        historique,
+    )
+
+    type_client = np.where(rng.random(nb_clients) < 0.9, "Individu", "Professionnel")
+    data[Client] = (
+        (
+            "id_client",
+            "nom_client",
+            "type_client",
+            "adresse",
+            "telephone",
+            "points_fidelite",
+        ),
+        [
+            (i, f"Client {i}", t, f"{i} chemin des Alpages", f"06{i:08d}", p)
+            for i, t, p in zip(
+                range(1, nb_clients + 1),
+                type_client.tolist(),
+                (earned - redeemed).tolist(),
+            )
+        ],
+    )
+    return data
+
+
+def _secondary_schema(connection) -> list[str]:
+    # CREATE statements of the indexes and triggers, as SQLite stores them;
+    # automatic indexes (primary keys, UNIQUE columns) have no SQL.
+    return [
+        sql
+        for (sql,) in connection.execute(
+            text(
+                "SELECT sql FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL "
+                "ORDER BY type"
+            )
+        )
+    ]
+
+
+def seed_database(engine: Engine, scale: float = 1.0, seed: int = 42) -> dict:
+    """Recreate the schema and load the dataset, return {table: rows}."""
+    data = generate(scale, seed)
+
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        secondary = _secondary_schema(connection)
+        for name, kind in connection.execute(
+            text(
+                "SELECT name, type FROM sqlite_master "
+                "WHERE type IN ('index', 'trigger') AND sql IS NOT NULL"
+            )
+        ).all():
+            connection.execute(text(f'DROP {kind.upper()} "{name}"'))
+
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        (synchronous,) = cursor.execute("PRAGMA synchronous").fetchone()
+        cursor.execute("PRAGMA synchronous=OFF")
+        for model, (columns, rows) in data.items():
+            cursor.execute("BEGIN")
+            cursor.executemany(
+                f'INSERT INTO "{model.__tablename__}" ({", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})',
+                rows,
+            )
+            cursor.execute("COMMIT")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.close()
+    finally:
+        raw.close()
+
+    with engine.begin() as connection:
+        for statement in secondary:
+            connection.exec_driver_sql(statement)
+        connection.exec_driver_sql(
+            "INSERT INTO Produits_fts(Produits_fts) VALUES ('rebuild')"
+        )
+    with Session(engine) as db:
+        rebuild_rollups(db)
+    with engine.begin() as connection:
+        connection.exec_driver_sql("ANALYZE")
+
+    return {model.__tablename__: len(rows) for model, (_, rows) in data.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a deterministic synthetic dataset"
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", default=f"sqlite:///{DB_PATH}")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    counts = seed_database(make_engine(args.url), args.scale, args.seed)
+    elapsed = time.perf_counter() - start
+    for table, count in counts.items():
+        print(f"{table:20} {count:>10,}")
+    print(f"{sum(counts.values()):,} rows in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
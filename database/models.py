@@ -1,5 +1,6 @@
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import (
+    DDL,
     Column,
     Integer,
     String,
@@ -8,6 +9,10 @@ from sqlalchemy import (
     DECIMAL,
     DateTime,
     Enum,
+    Index,
+    column,
+    event,
+    table,
 )
 from sqlalchemy.orm import declarative_base, relationship
 import enum
@@ -34,14 +39,20 @@ class User(Base):
 
 class Session(Base):
     __tablename__ = "Sessions"
+    # The sweeper deletes by expiry, workers poll for recent revocations
+    __table_args__ = (
+        Index("ix_sessions_expires_at", "expires_at"),
+        Index("ix_sessions_revoked_at", "revoked_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey("Users.id_user"), nullable=False)
     session_token = Column(String, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.now(timezone.utc))
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     expires_at = Column(
         DateTime, default=lambda: datetime.now(timezone.utc) + timedelta(days=7)
     )  # Example: sessions expire in 1 hour
+    revoked_at = Column(DateTime, nullable=True)
 
     user = relationship("User", back_populates="sessions")
 
@@ -63,6 +74,15 @@ class Magasin(Base):
 
 class Produit(Base):
     __tablename__ = "Produits"
+    # Keyset pagination of the product listing: one index per sort order,
+    # with and without the category filter, ending in the primary key that
+    # breaks ties between equal names or prices.
+    __table_args__ = (
+        Index("ix_produits_nom", "nom_produit", "id_produit"),
+        Index("ix_produits_prix", "prix_unitaire", "id_produit"),
+        Index("ix_produits_categorie_nom", "categorie", "nom_produit", "id_produit"),
+        Index("ix_produits_categorie_prix", "categorie", "prix_unitaire", "id_produit"),
+    )
 
     id_produit = Column(Integer, primary_key=True, autoincrement=True)
     nom_produit = Column(String, nullable=False)
@@ -75,6 +95,55 @@ class Produit(Base):
     stocks_magasins = relationship("StockMagasin", back_populates="produit")
 
 
+# Full-text index over the catalog (SQLite FTS5). It is an external content
+# table: it stores only the index and reads the text back from Produits. The
+# triggers keep it in sync with every write path, bulk inserts included.
+produits_fts = table("Produits_fts", column("rowid"), column("rank"))
+
+_PRODUITS_FTS_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS Produits_fts USING fts5(
+        nom_produit, categorie,
+        content='Produits', content_rowid='id_produit',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Produits_fts_ai AFTER INSERT ON Produits BEGIN
+        INSERT INTO Produits_fts(rowid, nom_produit, categorie)
+        VALUES (new.id_produit, new.nom_produit, new.categorie);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Produits_fts_ad AFTER DELETE ON Produits BEGIN
+        INSERT INTO Produits_fts(Produits_fts, rowid, nom_produit, categorie)
+        VALUES ('delete', old.id_produit, old.nom_produit, old.categorie);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS Produits_fts_au
+    AFTER UPDATE OF nom_produit, categorie ON Produits BEGIN
+        INSERT INTO Produits_fts(Produits_fts, rowid, nom_produit, categorie)
+        VALUES ('delete', old.id_produit, old.nom_produit, old.categorie);
+        INSERT INTO Produits_fts(rowid, nom_produit, categorie)
+        VALUES (new.id_produit, new.nom_produit, new.categorie);
+    END
+    """,
+]
+
+for _statement in _PRODUITS_FTS_DDL:
+    event.listen(
+        Produit.__table__,
+        "after_create",
+        DDL(_statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    Produit.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS Produits_fts").execute_if(dialect="sqlite"),
+)
+
+
 class Client(Base):
     __tablename__ = "Clients"
 
@@ -91,6 +160,10 @@ class Client(Base):
 
 class Promotion(Base):
     __tablename__ = "Promotions"
+    # Active promotions of a product at a given date (effective prices)
+    __table_args__ = (
+        Index("ix_promotions_produit_dates", "id_produit", "date_debut", "date_fin"),
+    )
 
     id_promotion = Column(Integer, primary_key=True, autoincrement=True)
     id_produit = Column(Integer, ForeignKey("Produits.id_produit"), nullable=False)
@@ -104,6 +177,8 @@ class Promotion(Base):
 
 class Commande(Base):
     __tablename__ = "Commandes"
+    # The exports read a date range of Commandes, in date order
+    __table_args__ = (Index("ix_commandes_date_commande", "date_commande"),)
 
     id_commande = Column(Integer, primary_key=True, autoincrement=True)
     id_client = Column(Integer, ForeignKey("Clients.id_client"), nullable=False)
@@ -120,6 +195,8 @@ class Commande(Base):
 
 class LigneCommande(Base):
     __tablename__ = "Lignes_Commande"
+    # The lines of each Commande, for the exports and the rollup rebuild
+    __table_args__ = (Index("ix_lignes_commande_commande", "id_commande"),)
 
     id_ligne = Column(Integer, primary_key=True, autoincrement=True)
     id_commande = Column(Integer, ForeignKey("Commandes.id_commande"), nullable=False)
@@ -146,6 +223,8 @@ class Livraison(Base):
 
 class Facture(Base):
     __tablename__ = "Factures"
+    # The nightly loyalty accrual reads a day of Factures
+    __table_args__ = (Index("ix_factures_date_facture", "date_facture"),)
 
     id_facture = Column(Integer, primary_key=True, autoincrement=True)
     id_commande = Column(Integer, ForeignKey("Commandes.id_commande"), nullable=False)
@@ -168,11 +247,168 @@ class StockMagasin(Base):
 
 class HistoriqueFidelite(Base):
     __tablename__ = "Historique_Fidelite"
+    # A Facture earns points once: the accrual relies on the unique index
+    __table_args__ = (
+        Index("ix_historique_fidelite_client", "id_client"),
+        Index("ix_historique_fidelite_facture", "id_facture", unique=True),
+    )
 
     id_historique = Column(Integer, primary_key=True, autoincrement=True)
     id_client = Column(Integer, ForeignKey("Clients.id_client"), nullable=False)
     date_operation = Column(DateTime, nullable=False)
+    # Negative for redemptions
     points_ajoutes = Column(Integer, nullable=False)
     description = Column(String(255))
+    id_facture = Column(Integer, ForeignKey("Factures.id_facture"), nullable=True)
 
     client = relationship("Client", back_populates="historique_fidelite")
+
+
+class Panier(Base):
+    __tablename__ = "Paniers"
+
+    id_user = Column(Integer, ForeignKey("Users.id_user"), primary_key=True)
+    id_produit = Column(Integer, ForeignKey("Produits.id_produit"), primary_key=True)
+    quantite = Column(Integer, nullable=False)
+
+    produit = relationship("Produit")
+
+
+class Reservation(Base):
+    __tablename__ = "Reservations"
+    # One row per reserved line; the sweeper releases by expiry
+    __table_args__ = (
+        Index("ix_reservations_token", "token"),
+        Index("ix_reservations_expires_at", "expires_at"),
+    )
+
+    id_reservation = Column(Integer, primary_key=True, autoincrement=True)
+    token = Column(String, nullable=False)
+    id_produit = Column(Integer, ForeignKey("Produits.id_produit"), nullable=False)
+    # None when the quantity was taken from the central stock
+    id_magasin = Column(Integer, ForeignKey("Magasins.id_magasin"), nullable=True)
+    quantite = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+# Sales rollups: daily totals kept up to date by triggers on the order lines
+# and invoices, so dashboards never scan the order history. Amounts are in
+# centimes, which keeps the running sums exact. Updating a Commande's date or
+# store isn't tracked; api/rollups.py can check and rebuild the tables.
+class VenteJournaliere(Base):
+    __tablename__ = "Ventes_Journalieres"
+    __table_args__ = (
+        Index("ix_ventes_journalieres_magasin", "id_magasin", "jour"),
+        Index("ix_ventes_journalieres_produit", "id_produit", "jour"),
+    )
+
+    jour = Column(Date, primary_key=True)
+    id_magasin = Column(Integer, ForeignKey("Magasins.id_magasin"), primary_key=True)
+    id_produit = Column(Integer, ForeignKey("Produits.id_produit"), primary_key=True)
+    quantite = Column(Integer, nullable=False, default=0)
+    montant_centimes = Column(Integer, nullable=False, default=0)
+    # Distinct orders, however many lines each has for the product
+    nb_commandes = Column(Integer, nullable=False, default=0)
+
+
+class FactureJournaliere(Base):
+    __tablename__ = "Factures_Journalieres"
+    __table_args__ = (Index("ix_factures_journalieres_magasin", "id_magasin", "jour"),)
+
+    jour = Column(Date, primary_key=True)
+    id_magasin = Column(Integer, ForeignKey("Magasins.id_magasin"), primary_key=True)
+    montant_centimes = Column(Integer, nullable=False, default=0)
+    nb_factures = Column(Integer, nullable=False, default=0)
+
+
+def _rollup_lines(row: str, sign: str) -> str:
+    key = f"""
+        SELECT date(c.date_commande), c.id_magasin, {row}.id_produit
+        FROM Commandes c WHERE c.id_commande = {row}.id_commande
+    """
+    # nb_commandes counts orders: a line only counts if no other line of its
+    # order has the same product (the trigger runs after the write)
+    first_of_order = f"""
+        (NOT EXISTS (
+            SELECT 1 FROM Lignes_Commande l
+            WHERE l.id_commande = {row}.id_commande
+              AND l.id_produit = {row}.id_produit
+              AND l.id_ligne != {row}.id_ligne
+        ))
+    """
+    statement = f"""
+        INSERT INTO Ventes_Journalieres
+            (jour, id_magasin, id_produit, quantite, montant_centimes, nb_commandes)
+        SELECT date(c.date_commande), c.id_magasin, {row}.id_produit,
+               {sign}{row}.quantite,
+               {sign}CAST(round({row}.quantite * {row}.prix_unitaire * 100) AS INTEGER),
+               {sign}{first_of_order}
+        FROM Commandes c WHERE c.id_commande = {row}.id_commande
+        ON CONFLICT (jour, id_magasin, id_produit) DO UPDATE SET
+            quantite = quantite + excluded.quantite,
+            montant_centimes = montant_centimes + excluded.montant_centimes,
+            nb_commandes = nb_commandes + excluded.nb_commandes;
+    """
+    if sign:
+        # A key that lost all its lines goes away rather than staying at zero
+        statement += f"""
+            DELETE FROM Ventes_Journalieres
+            WHERE (jour, id_magasin, id_produit) = ({key}) AND nb_commandes = 0;
+        """
+    return statement
+
+
+def _rollup_invoice(row: str, sign: str) -> str:
+    statement = f"""
+        INSERT INTO Factures_Journalieres
+            (jour, id_magasin, montant_centimes, nb_factures)
+        SELECT date({row}.date_facture), c.id_magasin,
+               {sign}CAST(round({row}.montant_total * 100) AS INTEGER), {sign}1
+        FROM Commandes c WHERE c.id_commande = {row}.id_commande
+        ON CONFLICT (jour, id_magasin) DO UPDATE SET
+            montant_centimes = montant_centimes + excluded.montant_centimes,
+            nb_factures = nb_factures + excluded.nb_factures;
+    """
+    if sign:
+        statement += f"""
+            DELETE FROM Factures_Journalieres
+            WHERE (jour, id_magasin) = (
+                SELECT date({row}.date_facture), c.id_magasin
+                FROM Commandes c WHERE c.id_commande = {row}.id_commande
+            ) AND nb_factures = 0;
+        """
+    return statement
+
+
+ROLLUP_TRIGGERS = {
+    LigneCommande.__table__: [
+        "CREATE TRIGGER IF NOT EXISTS Lignes_Commande_rollup_ai"
+        " AFTER INSERT ON Lignes_Commande BEGIN"
+        f" {_rollup_lines('new', '')} END",
+        "CREATE TRIGGER IF NOT EXISTS Lignes_Commande_rollup_ad"
+        " AFTER DELETE ON Lignes_Commande BEGIN"
+        f" {_rollup_lines('old', '-')} END",
+        "CREATE TRIGGER IF NOT EXISTS Lignes_Commande_rollup_au"
+        " AFTER UPDATE OF id_commande, id_produit, quantite, prix_unitaire"
+        " ON Lignes_Commande BEGIN"
+        f" {_rollup_lines('old', '-')} {_rollup_lines('new', '')} END",
+    ],
+    Facture.__table__: [
+        "CREATE TRIGGER IF NOT EXISTS Factures_rollup_ai"
+        " AFTER INSERT ON Factures BEGIN"
+        f" {_rollup_invoice('new', '')} END",
+        "CREATE TRIGGER IF NOT EXISTS Factures_rollup_ad"
+        " AFTER DELETE ON Factures BEGIN"
+        f" {_rollup_invoice('old', '-')} END",
+        "CREATE TRIGGER IF NOT EXISTS Factures_rollup_au"
+        " AFTER UPDATE OF id_commande, montant_total, date_facture"
+        " ON Factures BEGIN"
+        f" {_rollup_invoice('old', '-')} {_rollup_invoice('new', '')} END",
+    ],
+}
+
+for _table, _statements in ROLLUP_TRIGGERS.items():
+    for _statement in _statements:
+        event.listen(
+            _table, "after_create", DDL(_statement).execute_if(dialect="sqlite")
+        )
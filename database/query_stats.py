@@ -0,0 +1,177 @@
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Per-request SQL statistics. Engine hooks time every statement and add it
+# to the stats of the request being served (a context variable, which
+# follows the request into the async engine's greenlets and into the
+# threads that run sync dependencies), and to process-wide counters. The
+# same statement shape run over and over within a request is how an N+1
+# shows up: a lazy load per row of a list.
+N_PLUS_ONE_THRESHOLD = 5
+SLOWEST_KEPT = 3
+SLOW_STATEMENT_MS = 100.0
+# N+1 shapes remembered in the aggregated counters
+MAX_SHAPES = 100
+
+logger = logging.getLogger(__name__)
+
+stats = {
+    "requests": 0,
+    "statements": 0,
+    "db_time_ms": 0.0,
+    "slow_statements": 0,
+    "n_plus_one_requests": 0,
+}
+n_plus_one_shapes: Counter = Counter()
+_lock = threading.Lock()
+
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+
+def debug_headers_enabled() -> bool:
+    return os.getenv("DB_DEBUG_HEADERS", "").lower() in ("1", "true", "yes")
+
+
+def statement_shape(statement: str) -> str:
+    # Values are already bound parameters; IN lists of any length are one shape
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+
+@dataclass
+class RequestStats:
+    statements: int = 0
+    db_time_ms: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+    # (ms, statement) min-heap of the slowest ones
+    slowest: list = field(default_factory=list)
+
+    def record(self, statement: str, ms: float) -> None:
+        self.statements += 1
+        self.db_time_ms += ms
+        self.shapes[statement_shape(statement)] += 1
+        entry = (ms, statement)
+        if len(self.slowest) < SLOWEST_KEPT:
+            heapq.heappush(self.slowest, entry)
+        elif entry > self.slowest[0]:
+            heapq.heapreplace(self.slowest, entry)
+
+    def n_plus_one(self) -> dict[str, int]:
+        """Statement shapes run at least N_PLUS_ONE_THRESHOLD times."""
+        return {
+            shape: count
+            for shape, count in self.shapes.items()
+            if count >= N_PLUS_ONE_THRESHOLD
+        }
+
+    def headers(self) -> list[tuple[bytes, bytes]]:
+        headers = [
+            (b"x-db-statements", str(self.statements).encode()),
+            (b"x-db-time-ms", f"{self.db_time_ms:.2f}".encode()),
+        ]
+        if self.slowest:
+            ms, statement = max(self.slowest)
+            headers.append(
+                (
+                    b"x-db-slowest",
+                    f"{ms:.2f}ms {statement_shape(statement)[:200]}".encode(
+                        "ascii", "replace"
+                    ),
+                )
+            )
+        suspects = self.n_plus_one()
+        if suspects:
+            headers.append((b"x-db-n-plus-one", str(len(suspects)).encode()))
+        return headers
+
+
+_current: ContextVar[RequestStats | None] = ContextVar(
+    "request_sql_stats", default=None
+)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    ms = (time.perf_counter() - context._query_start) * 1000
+    request = _current.get()
+    if request is not None:
+        request.record(statement, ms)
+    slow = ms >= SLOW_STATEMENT_MS
+    with _lock:
+        stats["statements"] += 1
+        stats["db_time_ms"] += ms
+        stats["slow_statements"] += slow
+    if slow:
+        logger.warning("Slow statement (%.1f ms): %s", ms, statement_shape(statement))
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Time every statement run through engine (a sync Engine; pass
+    async_engine.sync_engine for an AsyncEngine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def finish_request(request: RequestStats, label: str) -> None:
+    """Fold a finished request into the counters and report its N+1s."""
+    suspects = request.n_plus_one()
+    with _lock:
+        stats["requests"] += 1
+        if suspects:
+            stats["n_plus_one_requests"] += 1
+            for shape, count in suspects.items():
+                if shape in n_plus_one_shapes or len(n_plus_one_shapes) < MAX_SHAPES:
+                    n_plus_one_shapes[shape] += count
+    for shape, count in suspects.items():
+        logger.warning("Likely N+1 in %s: %d x %s", label, count, shape)
+
+
+class QueryStatsMiddleware:
+    """Pure ASGI middleware collecting the SQL stats of each HTTP request.
+
+    With DB_DEBUG_HEADERS set, the response carries them as X-DB-* headers.
+    """
+
+    def __init__(self, app, debug_headers: bool | None = None):
+        self.app = app
+        self.debug_headers = (
+            debug_headers_enabled() if debug_headers is None else debug_headers
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request = RequestStats()
+        token = _current.set(request)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and self.debug_headers:
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", []), *request.headers()],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            finish_request(request, f"{scope['method']} {scope['path']}")
@@ -1,8 +1,25 @@
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
 from fastapi import FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
-from .api import auth, routes
+from .api import (
+    auth,
+    cart,
+    catalog_cache,
+    metrics,
+    passwords,
+    pricing,
+    reservations,
+    routes,
+    sessions,
+    token_cache,
+)
+from .api.static_assets import DIST_DIR, PrecompressedStaticFiles
+from .database import query_stats
+from .database.connect_db import AsyncSessionLocal, SessionLocal, async_engine, engine
 from pathlib import Path
 
 load_dotenv()
@@ -10,10 +27,57 @@ load_dotenv()
 secret_key = os.getenv("SECRET_KEY")
 if not secret_key:
     raise ValueError("Secret key not provided in environment")
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carts live in memory: refuse to start next to another worker
+    cart.claim_carts()
+    tasks = [
+        asyncio.create_task(sessions.run_session_maintenance(AsyncSessionLocal)),
+        asyncio.create_task(cart.run_cart_flusher(AsyncSessionLocal)),
+        asyncio.create_task(reservations.run_reservation_sweeper(SessionLocal)),
+    ]
+    yield
+    for task in tasks:
+        task.cancel()
+    # Let a flush or sweep that was running finish unwinding first
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Save the cart changes made since the last periodic flush
+    async with AsyncSessionLocal() as db:
+        await cart.flush_carts(db)
+    cart.release_carts()
+
+
+app = FastAPI(lifespan=lifespan)
 
 BASE_DIR = Path(__file__).resolve().parent
 
+# HTML and JSON responses; the built static assets are already compressed and
+# bodies this small aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=6)
+# Statements and DB time per request; X-DB-* headers with DB_DEBUG_HEADERS=1
+app.add_middleware(query_stats.QueryStatsMiddleware)
+# Outermost, so the latencies in /metrics include the other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+metrics.register_pool("sync", engine)
+metrics.register_pool("async", async_engine.sync_engine)
+metrics.register_stats("bcrypt", passwords.stats, gauges=("pending",))
+metrics.register_stats("token_cache", token_cache.stats)
+metrics.register_stats("session_cache", sessions.stats)
+metrics.register_stats("cart", cart.stats)
+metrics.register_stats("fragment_cache", catalog_cache.stats)
+metrics.register_stats("price_cache", pricing.stats)
+metrics.register_stats("sql", query_stats.stats)
+
+# Fingerprinted, precompressed assets from `python -m api.static_assets`,
+# mounted first so that /static doesn't shadow them
+app.mount(
+    "/static/dist",
+    PrecompressedStaticFiles(directory=str(DIST_DIR), check_dir=False),
+    name="static_dist",
+)
 # Mount the static directory
 app.mount("/static", StaticFiles(directory=str(BASE_DIR / "static")), name="static")
 
@@ -1,12 +1,18 @@
+import asyncio
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 import pytest
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database.models import Base
+import api.crud as crud
+from api.checkout import place_order
+from database.models import Base, StockMagasin
 
 MEM_DB_URL = "sqlite:///:memory:"
+ASYNC_MEM_DB_URL = "sqlite+aiosqlite:///:memory:"
+PRODUITS = ("Beaufort", "Tomme", "Reblochon", "Comté")
 
 @pytest.fixture(scope="function")
 def db_session():
@@ -24,4 +30,62 @@ def db_session():
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)  # Clean up after the test
\ No newline at end of file
+        Base.metadata.drop_all(bind=engine)  # Clean up after the test
+
+
+@pytest.fixture
+def run_with_session():
+    """Run an async test body against a fresh in-memory database."""
+
+    def run(test_body):
+        async def runner():
+            engine = create_async_engine(ASYNC_MEM_DB_URL)
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            AsyncSessionLocal = async_sessionmaker(bind=engine, expire_on_commit=False)
+            try:
+                async with AsyncSessionLocal() as db:
+                    await test_body(db)
+            finally:
+                await engine.dispose()
+
+        asyncio.run(runner())
+
+    return run
+
+
+@pytest.fixture
+def seed():
+    """Fill a session with the stores, clients and products tests start from.
+
+    Returns seed(db, ...): magasins stores (ids from 1), clients as
+    (id_client, fidelite), products as (prix, stock_central) from id 1
+    (Beaufort, Tomme, ...), store stock as (id_magasin, id_produit, stock),
+    promotions as (id_produit, description, debut, fin, taux) and orders
+    placed by client 1 as (id_magasin, lines, date_commande). For an
+    AsyncSession, use `await db.run_sync(seed, ...)`.
+    """
+    def seed(
+        db,
+        magasins=2,
+        clients=((1, 0),),
+        produits=((12.5, 100), (8.1, 100)),
+        stock_magasins=(),
+        promotions=(),
+        orders=(),
+    ):
+        for i in range(1, magasins + 1):
+            crud.insert_magasin(db, i, f"Store{i}", f"{i} Street", "City", f"{i}" * 9)
+        for id_client, fidelite in clients:
+            crud.insert_client(db, id_client, f"client {id_client}", "Individu", None, None, fidelite)
+        for i, (prix, stock) in enumerate(produits, 1):
+            crud.insert_produit(db, i, PRODUITS[i - 1], "Cheese", prix, stock)
+        for id_magasin, id_produit, stock in stock_magasins:
+            db.add(StockMagasin(id_magasin=id_magasin, id_produit=id_produit, stock_disponible=stock))
+        db.commit()
+        for promotion in promotions:
+            crud.insert_promotion(db, None, *promotion)
+        for id_magasin, lines, date_commande in orders:
+            place_order(db, 1, id_magasin, lines, date_commande)
+
+    return seed
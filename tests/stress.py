@@ -0,0 +1,165 @@
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+from database.connect_db import make_engine
+from database.models import Base, Magasin, Produit, Reservation, StockMagasin
+import api.reservations as reservations
+
+# Concurrent stock reservations against a throwaway SQLite file. Threads
+# reserve random products from the central stock and from a store's stock
+# until it runs out; each reservation is then confirmed, released, or
+# abandoned to expire while a sweeper thread releases expired ones. At the
+# end, every unit must be accounted for: still in stock, sold, or held.
+# Shared by the oversell test and benchmarks/bench_reservations.py.
+
+ID_MAGASIN = 1
+
+
+def _seed(SessionLocal, nb_produits: int, stock: int) -> None:
+    with SessionLocal() as db:
+        db.add(
+            Magasin(
+                id_magasin=ID_MAGASIN,
+                nom_magasin="Store1",
+                adresse="123 Street",
+                ville="City",
+                telephone="123456789",
+            )
+        )
+        for i in range(1, nb_produits + 1):
+            db.add(
+                Produit(
+                    id_produit=i,
+                    nom_produit=f"Produit {i}",
+                    categorie="Cheese",
+                    prix_unitaire=10,
+                    stock_central=stock,
+                )
+            )
+            db.add(
+                StockMagasin(
+                    id_magasin=ID_MAGASIN, id_produit=i, stock_disponible=stock
+                )
+            )
+        db.commit()
+
+
+def _worker(SessionLocal, ops, nb_produits, seed, sold: Counter, counts: Counter):
+    rng = random.Random(seed)
+    with SessionLocal() as db:
+        for _ in range(ops):
+            id_magasin = rng.choice((None, ID_MAGASIN))
+            lines = [(rng.randint(1, nb_produits), rng.randint(1, 3))]
+            outcome = rng.random()
+            try:
+                token = reservations.reserve_stock(
+                    db,
+                    lines,
+                    id_magasin,
+                    # Abandoned checkouts expire right away for the sweeper
+                    ttl=timedelta(0) if outcome < 0.2 else timedelta(minutes=5),
+                )
+            except ValueError:
+                counts["rejected"] += 1
+                continue
+            counts["reserved"] += 1
+            if outcome >= 0.6:
+                for id_produit, quantite in reservations.confirm_reservation(
+                    db, token
+                ).items():
+                    sold[(id_magasin, id_produit)] += quantite
+                counts["confirmed"] += 1
+            elif outcome >= 0.2:
+                reservations.release_reservation(db, token)
+                counts["released"] += 1
+
+
+def _sweeper(SessionLocal, done: threading.Event, counts: Counter):
+    with SessionLocal() as db:
+        while not done.is_set():
+            counts["expired"] += reservations.release_expired_reservations(db)
+            time.sleep(0.01)
+        counts["expired"] += reservations.release_expired_reservations(db)
+
+
+def _check_stock(SessionLocal, stock: int, sold: Counter) -> int:
+    """Return the number of units unaccounted for (oversold if positive)."""
+    with SessionLocal() as db:
+        remaining = {
+            (None, id_produit): quantite
+            for id_produit, quantite in db.execute(
+                select(Produit.id_produit, Produit.stock_central)
+            )
+        }
+        remaining.update(
+            ((ID_MAGASIN, id_produit), quantite)
+            for id_produit, quantite in db.execute(
+                select(StockMagasin.id_produit, StockMagasin.stock_disponible)
+            )
+        )
+        held = Counter()
+        for id_magasin, id_produit, quantite in db.execute(
+            select(Reservation.id_magasin, Reservation.id_produit, Reservation.quantite)
+        ):
+            held[(id_magasin, id_produit)] += quantite
+
+    mismatch = 0
+    for location, left in remaining.items():
+        if left < 0:
+            mismatch += -left
+        mismatch += abs(stock - left - sold[location] - held[location])
+    return mismatch
+
+
+def run_stress(threads: int, ops: int, nb_produits: int, stock: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = make_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(engine)
+        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+        _seed(SessionLocal, nb_produits, stock)
+
+        # One pair of counters per thread, merged once they're done
+        tallies = [(Counter(), Counter()) for _ in range(threads + 1)]
+        done = threading.Event()
+        sweeper = threading.Thread(
+            target=_sweeper, args=(SessionLocal, done, tallies[-1][1])
+        )
+        workers = [
+            threading.Thread(
+                target=_worker,
+                args=(SessionLocal, ops, nb_produits, seed, *tallies[seed]),
+            )
+            for seed in range(threads)
+        ]
+        start = time.perf_counter()
+        sweeper.start()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        sweeper.join()
+
+        sold, counts = Counter(), Counter()
+        for thread_sold, thread_counts in tallies:
+            sold.update(thread_sold)
+            counts.update(thread_counts)
+        mismatch = _check_stock(SessionLocal, stock, sold)
+        engine.dispose()
+
+    return {
+        **{
+            key: counts[key]
+            for key in ("reserved", "rejected", "confirmed", "released", "expired")
+        },
+        "seconds": round(elapsed, 3),
+        "reservations_per_second": round(counts["reserved"] / elapsed, 1),
+        "unaccounted_units": mismatch,
+    }
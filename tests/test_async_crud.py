@@ -0,0 +1,77 @@
+from datetime import datetime
+import pytest
+import api.async_crud as async_crud
+from database.models import Produit
+
+
+def test_async_insert_and_fetch_produit(run_with_session):
+    async def body(db):
+        produit = await async_crud.insert_produit(
+            db=db,
+            id_produit=None,
+            nom_produit="Beaufort",
+            categorie="Cheese",
+            prix_unitaire=25,
+            stock_central=10,
+        )
+        produit_from_db = await async_crud.fetch_produit_by_id(db, produit.id_produit)
+
+        assert produit_from_db.nom_produit == "Beaufort"
+        assert produit_from_db.stock_central == 10
+
+    run_with_session(body)
+
+
+def test_async_update_and_decrement_produit(run_with_session):
+    async def body(db):
+        await async_crud.insert_produit(
+            db=db,
+            id_produit=1,
+            nom_produit="Tomme",
+            categorie="Cheese",
+            prix_unitaire=600,
+            stock_central=50,
+        )
+        assert await async_crud.update_produit_prix(db, 1, 800) == 1
+        assert await async_crud.decrement_produit_stock(db, 1, 1000) == 1
+
+        produits = await async_crud._fetch_by(db, Produit, {"id_produit": 1})
+        assert produits[0].prix_unitaire == 800
+        assert produits[0].stock_central == 0
+
+    run_with_session(body)
+
+
+def test_async_update_missing_record(run_with_session):
+    async def body(db):
+        with pytest.raises(ValueError):
+            await async_crud.update_produit_prix(db, 999, 10)
+
+    run_with_session(body)
+
+
+def test_async_insert_promotion_with_invalid_produit(run_with_session):
+    async def body(db):
+        with pytest.raises(ValueError) as exc:
+            await async_crud.insert_promotion(
+                db, None, 999, "Invalid Promotion", "2024-06-01", "2024-06-30", 10
+            )
+        assert str(exc.value) == "Produit not found with filters {'id_produit': 999}"
+
+    run_with_session(body)
+
+
+def test_async_insert_historique_fidelite(run_with_session):
+    async def body(db):
+        client = await async_crud.insert_client(
+            db, 1, "test client", "Individu", None, None, 0
+        )
+        historique = await async_crud.insert_historique_fidelite(
+            db, None, 1, datetime(2024, 12, 27), 10, "Bienvenue"
+        )
+
+        assert historique.points_ajoutes == 10
+        await db.refresh(client)
+        assert client.points_fidelite == 10
+
+    run_with_session(body)
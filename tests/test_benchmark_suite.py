@@ -0,0 +1,29 @@
+from benchmarks.bench_crud import run_crud
+from benchmarks.bench_http import run_http
+from benchmarks.suite import compare
+
+
+def test_run_crud():
+    results = run_crud(0.01, repeat=3)
+
+    assert {"insert_produit", "fetch_client_by_id", "increment_fidelite_client"} <= (
+        results.keys()
+    )
+    assert all(stats["p50"] <= stats["p99"] for stats in results.values())
+
+
+def test_run_http():
+    # Raises if an endpoint doesn't answer 200
+    results = run_http(0.01, requests=2, logins=1)
+
+    assert results["GET /api/search"]["n"] == 2
+    assert results["POST /auth/token (htmx)"]["n"] == 1
+
+
+def test_compare():
+    def run(p50):
+        return {"scales": {"0.1": {"crud": {"fetch_client_by_id": {"p50": p50}}}}}
+
+    assert compare(run(1.0), run(1.5)) == [
+        ("0.1", "crud", "fetch_client_by_id", 1.0, 1.5, 1.5)
+    ]
@@ -0,0 +1,82 @@
+from decimal import Decimal
+import pytest
+from sqlalchemy import select
+from api import cart
+from database.models import Panier
+
+PRODUITS = ((20, 10), (8.5, 10))
+
+
+async def _saved(db, id_user):
+    rows = await db.execute(
+        select(Panier.id_produit, Panier.quantite).where(Panier.id_user == id_user)
+    )
+    return dict(rows.all())
+
+
+def test_cart_operations_and_coalesced_flush(run_with_session, seed):
+    async def body(db):
+        await db.run_sync(seed, produits=PRODUITS)
+
+        for _ in range(3):
+            await cart.add_item(db, 101, 1)
+        assert await cart.add_item(db, 101, 2, 2) == 5
+        assert await cart.update_quantity(db, 101, 1, 1) == 3
+        # Nothing is written until the flush, which coalesces the edits
+        assert await _saved(db, 101) == {}
+        assert await cart.flush_carts(db) == 2
+        assert await _saved(db, 101) == {1: 1, 2: 2}
+        assert await cart.flush_carts(db) == 0
+
+        assert await cart.remove_item(db, 101, 2) == 1
+        await cart.flush_carts(db)
+        assert await _saved(db, 101) == {1: 1}
+
+        items = await cart.cart_items(db, 101)
+        assert [(item.id, item.quantity, item.price) for item in items] == [
+            (1, 1, Decimal("20.00"))
+        ]
+        assert items[0].product.nom_produit == "Beaufort"
+
+    run_with_session(body)
+
+
+def test_cart_reloads_from_database(run_with_session, seed):
+    async def body(db):
+        await db.run_sync(seed, produits=PRODUITS)
+        await cart.add_item(db, 102, 2, 4)
+        await cart.flush_carts(db)
+
+        cart._carts.pop(102)
+        cart._counts.pop(102)
+        assert await cart.cart_count(db, 102) == 4
+
+    run_with_session(body)
+
+
+def test_cart_rejects_invalid_items(run_with_session, seed):
+    async def body(db):
+        await db.run_sync(seed, produits=PRODUITS)
+        with pytest.raises(ValueError):
+            await cart.add_item(db, 103, 99)
+        with pytest.raises(ValueError):
+            await cart.add_item(db, 103, 1, 0)
+        with pytest.raises(ValueError):
+            await cart.update_quantity(db, 103, 2, 1)
+        assert await cart.cart_count(db, 103) == 0
+
+    run_with_session(body)
+
+
+def test_carts_served_by_a_single_process(tmp_path):
+    path = str(tmp_path / "carts.lock")
+    cart.claim_carts(path)
+    try:
+        # A second worker opens the file on its own and can't get the lock
+        with pytest.raises(RuntimeError, match="run a single worker"):
+            cart.claim_carts(path)
+    finally:
+        cart.release_carts()
+
+    cart.claim_carts(path)
+    cart.release_carts()
@@ -0,0 +1,131 @@
+import asyncio
+from datetime import date
+import api.crud as crud
+from api import catalog_cache
+
+
+def test_catalog_invalidated_on_commit(db_session):
+    version = catalog_cache.catalog_version()
+    crud.insert_produit(
+        db=db_session,
+        id_produit=1,
+        nom_produit="Test product",
+        categorie="Cheese",
+        prix_unitaire=600,
+        stock_central=50,
+    )
+    assert catalog_cache.catalog_version() == version + 1
+
+    crud.update_produit_prix(db=db_session, id_produit=1, new_prix=800)
+    assert catalog_cache.catalog_version() == version + 2
+
+
+def test_catalog_invalidated_by_every_bulk_chunk(db_session):
+    version = catalog_cache.catalog_version()
+    crud.bulk_insert_produits(
+        db_session,
+        [
+            {
+                "nom_produit": f"Produit {i}",
+                "categorie": "Cheese",
+                "prix_unitaire": 10,
+                "stock_central": 1,
+            }
+            for i in range(3)
+        ],
+        chunk_size=1,
+    )
+    assert catalog_cache.catalog_version() == version + 3
+
+    version = catalog_cache.catalog_version()
+    with crud.transaction(db_session):
+        crud.bulk_insert_produits(
+            db_session,
+            [
+                {
+                    "nom_produit": f"Fromage {i}",
+                    "categorie": "Cheese",
+                    "prix_unitaire": 10,
+                    "stock_central": 1,
+                }
+                for i in range(2)
+            ],
+            chunk_size=1,
+        )
+    assert catalog_cache.catalog_version() == version + 1
+
+
+def test_catalog_not_invalidated_by_other_writes(db_session):
+    version = catalog_cache.catalog_version()
+    crud.insert_magasin(
+        db=db_session,
+        id_magasin=None,
+        nom_magasin="Store1",
+        adresse="123 Street",
+        ville="City",
+        telephone="123456789",
+    )
+    assert catalog_cache.catalog_version() == version
+
+
+def test_fragment_rendered_once_until_invalidated():
+    renders = []
+
+    async def render():
+        renders.append(1)
+        return f"<p>{len(renders)}</p>"
+
+    async def fetch():
+        return await catalog_cache.get_fragment(("test-fragment",), render)
+
+    catalog_cache.invalidate_catalog()
+    assert asyncio.run(fetch()) == "<p>1</p>"
+    assert asyncio.run(fetch()) == "<p>1</p>"
+
+    catalog_cache.invalidate_catalog()
+    assert asyncio.run(fetch()) == "<p>2</p>"
+
+
+def test_fragments_bounded_and_expired(monkeypatch):
+    async def render():
+        return "<p></p>"
+
+    async def fetch(key):
+        return await catalog_cache.get_fragment(key, render)
+
+    catalog_cache.invalidate_catalog()
+    monkeypatch.setattr(catalog_cache, "MAX_FRAGMENTS", 2)
+    asyncio.run(fetch(("a",)))
+    asyncio.run(fetch(("b",)))
+    asyncio.run(fetch(("a",)))  # b is now the least recently used
+    asyncio.run(fetch(("c",)))
+    assert list(catalog_cache._fragments) == [("a",), ("c",)]
+
+    # Expired entries are dropped when the next one is stored
+    catalog_cache.invalidate_catalog()
+    monkeypatch.setattr(catalog_cache, "FRAGMENT_TTL", 0.0)
+    asyncio.run(fetch(("d",)))
+    asyncio.run(fetch(("e",)))
+    assert list(catalog_cache._fragments) == [("e",)]
+
+
+def test_fetch_active_promotions(db_session):
+    crud.insert_produit(
+        db=db_session,
+        id_produit=1,
+        nom_produit="Test product",
+        categorie="Cheese",
+        prix_unitaire=100,
+        stock_central=200,
+    )
+    crud.insert_promotion(
+        db_session, None, 1, "Past", date(2024, 1, 1), date(2024, 1, 31), 10
+    )
+    crud.insert_promotion(
+        db_session, None, 1, "Current", date(2024, 6, 1), date(2024, 6, 30), 20
+    )
+
+    promotions = crud.fetch_active_promotions(db_session, date(2024, 6, 15))
+
+    assert [promo.description for promo in promotions] == ["Current"]
+    assert promotions[0].produit.nom_produit == "Test product"
@@ -0,0 +1,135 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+import api.crud as crud
+from api.checkout import place_order
+from api.reservations import reserve_stock
+from database.models import (
+    Client,
+    Commande,
+    Facture,
+    HistoriqueFidelite,
+    LigneCommande,
+    Produit,
+    Reservation,
+    StockMagasin,
+)
+
+SEED = {"clients": ((1, 5),), "produits": ((12.5, 10), (8, 3))}
+
+
+def test_place_order(db_session, seed):
+    seed(db_session, **SEED)
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(1))
+
+    commande = place_order(
+        db_session,
+        id_client=1,
+        id_magasin=1,
+        lines=[(1, 2), (2, 3), (1, 1)],
+        date_commande=datetime(2024, 12, 27, 12, 30),
+    )
+
+    assert len(commits) == 1
+    lignes = db_session.query(LigneCommande).order_by(LigneCommande.id_produit).all()
+    assert [(ligne.id_produit, ligne.quantite) for ligne in lignes] == [(1, 3), (2, 3)]
+    assert all(ligne.id_commande == commande.id_commande for ligne in lignes)
+
+    facture = db_session.query(Facture).one()
+    assert facture.montant_total == 61.5  # 3 * 12.5 + 3 * 8
+
+    stocks = dict(db_session.query(Produit.id_produit, Produit.stock_central))
+    assert stocks == {1: 7, 2: 0}
+
+    client = db_session.query(Client).one()
+    historique = db_session.query(HistoriqueFidelite).one()
+    assert client.points_fidelite == 5 + 61
+    assert historique.points_ajoutes == 61
+
+
+def test_place_order_insufficient_stock(db_session, seed):
+    seed(db_session, **SEED)
+
+    with pytest.raises(ValueError, match=r"Insufficient stock for produits \[2\]"):
+        place_order(db_session, id_client=1, id_magasin=1, lines=[(1, 2), (2, 4)])
+
+    assert db_session.query(Commande).count() == 0
+    stocks = dict(db_session.query(Produit.id_produit, Produit.stock_central))
+    assert stocks == {1: 10, 2: 3}
+
+
+def test_place_order_unknown_produit(db_session, seed):
+    seed(db_session, **SEED)
+
+    with pytest.raises(
+        ValueError, match=r"Produit not found with id_produit in \[99\]"
+    ):
+        place_order(db_session, id_client=1, id_magasin=1, lines=[(1, 1), (99, 1)])
+
+    assert db_session.query(Commande).count() == 0
+
+
+def test_place_order_uses_effective_price(db_session, seed):
+    seed(db_session, **SEED)
+    crud.insert_promotion(
+        db_session,
+        None,
+        1,
+        "Flash",
+        datetime(2024, 12, 1),
+        datetime(2024, 12, 31),
+        20,
+    )
+
+    place_order(
+        db_session,
+        id_client=1,
+        id_magasin=1,
+        lines=[(1, 2)],
+        date_commande=datetime(2024, 12, 27, 12, 30),
+    )
+
+    ligne = db_session.query(LigneCommande).one()
+    assert ligne.prix_unitaire == 10
+    assert db_session.query(Facture).one().montant_total == 20
+
+
+def test_place_order_from_reservation(db_session, seed):
+    seed(db_session, **SEED)
+    token = reserve_stock(db_session, [(1, 2), (2, 3)])
+
+    place_order(db_session, 1, 1, [(2, 3), (1, 2)], reservation=token)
+
+    # Taken once, by the reservation
+    assert db_session.get(Produit, 1).stock_central == 8
+    assert db_session.get(Produit, 2).stock_central == 0
+    assert db_session.query(Reservation).count() == 0
+    assert db_session.query(Commande).count() == 1
+
+
+def test_place_order_reservation_must_match(db_session, seed):
+    seed(db_session, **SEED)
+    token = reserve_stock(db_session, [(1, 2)])
+
+    with pytest.raises(ValueError, match="doesn't match the order"):
+        place_order(db_session, 1, 1, [(1, 3)], reservation=token)
+
+    # Nothing happened: the reservation still holds its stock
+    assert db_session.query(Reservation).count() == 1
+    assert db_session.get(Produit, 1).stock_central == 8
+    assert db_session.query(Commande).count() == 0
+
+
+def test_place_order_reservation_must_be_for_the_store(db_session, seed):
+    seed(db_session, **SEED, stock_magasins=((1, 1, 4),))
+    token = reserve_stock(db_session, [(1, 2)], id_magasin=1)
+
+    with pytest.raises(ValueError, match="held at magasin 1, not 2"):
+        place_order(db_session, 1, 2, [(1, 2)], reservation=token)
+
+    # Still held at store 1, which can sell it
+    assert db_session.query(Reservation).count() == 1
+    place_order(db_session, 1, 1, [(1, 2)], reservation=token)
+    assert db_session.get(StockMagasin, (1, 1)).stock_disponible == 2
+    assert db_session.get(Produit, 1).stock_central == 10
@@ -0,0 +1,28 @@
+import pytest
+from sqlalchemy import text
+from database.connect_db import make_engine
+
+
+def test_production_profile_pragmas(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}", profile="production")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+
+    assert engine.echo is False
+    engine.dispose()
+
+
+def test_legacy_profile_keeps_sqlite_defaults(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'test.db'}", profile="legacy")
+
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "delete"
+    engine.dispose()
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError):
+        make_engine("sqlite:///:memory:", profile="turbo")
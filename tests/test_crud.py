@@ -1,6 +1,17 @@
 from datetime import datetime
+import pytest
+from sqlalchemy import event
 import api.crud as crud
-from database.models import Magasin, Produit, Client, Promotion
+from database.models import Magasin, Produit, Client, Promotion, HistoriqueFidelite
+
+
+def _journal(db_session, id_client):
+    return [
+        (h.points_ajoutes, h.description)
+        for h in db_session.query(HistoriqueFidelite)
+        .filter_by(id_client=id_client)
+        .order_by(HistoriqueFidelite.id_historique)
+    ]
 
 
 def test_insert_magasin(db_session):
@@ -156,6 +167,8 @@ def test_increment_fidelite_client(db_session):
 
     assert affected == 1
     assert client_from_db.points_fidelite == 1050
+    # Through the ledger: the change is journaled
+    assert _journal(db_session, 1) == [(1000, None)]
 
 
 def test_decrement_fidelite_client(db_session):
@@ -179,6 +192,24 @@ def test_decrement_fidelite_client(db_session):
 
     assert affected == 1
     assert client_from_db.points_fidelite == 0
+    # Only the 50 points there were are spent, and journaled
+    assert _journal(db_session, 1) == [(-50, None)]
+
+
+def test_insert_historique_fidelite(db_session):
+    crud.insert_client(db_session, 1, "test client", "Individu", None, None, 0)
+    historique = crud.insert_historique_fidelite(
+        db=db_session,
+        id_historique=None,
+        id_client=1,
+        date_operation=datetime(2024, 12, 27),
+        point_ajoutes=10,
+        description="Bienvenue",
+    )
+
+    assert historique.points_ajoutes == 10
+    assert crud.fetch_client_by_id(db_session, 1).points_fidelite == 10
+    assert _journal(db_session, 1) == [(10, "Bienvenue")]
 
 
 def test_fetch_client_by_id(db_session):
@@ -378,3 +409,236 @@ def test_fetch_promotion(db_session):
     promotions = db_session.query(Promotion).all()
 
     assert promo.description == promotions[0].description
+
+
+def test_bulk_insert_produits(db_session):
+    ids = crud.bulk_insert_produits(
+        db_session,
+        (
+            {
+                "nom_produit": f"Produit {i}",
+                "categorie": "Cheese",
+                "prix_unitaire": 10 + i,
+                "stock_central": 100,
+            }
+            for i in range(25)
+        ),
+        chunk_size=10,
+    )
+
+    produits = db_session.query(Produit).order_by(Produit.id_produit).all()
+    assert ids == [produit.id_produit for produit in produits]
+    assert [produit.nom_produit for produit in produits][:2] == [
+        "Produit 0",
+        "Produit 1",
+    ]
+
+
+def test_bulk_insert_commandes_and_lignes(db_session):
+    crud.insert_magasin(db_session, 1, "Store1", "123 Street", "City", "123456789")
+    crud.insert_client(db_session, 1, "test client", "Individu", None, None, 0)
+    crud.insert_produit(db_session, 1, "Test product", "Cheese", 600, 50)
+
+    id_commandes = crud.bulk_insert_commandes(
+        db_session,
+        [
+            {
+                "id_client": 1,
+                "id_magasin": 1,
+                "date_commande": datetime(2024, 12, 27, 12, 30),
+                "statut_commande": "En cours",
+            }
+            for _ in range(3)
+        ],
+    )
+    id_lignes = crud.bulk_insert_lignes_commande(
+        db_session,
+        [
+            {
+                "id_commande": id_commande,
+                "id_produit": 1,
+                "quantite": 2,
+                "prix_unitaire": 600,
+            }
+            for id_commande in id_commandes
+        ],
+    )
+
+    assert len(id_commandes) == 3
+    assert len(id_lignes) == 3
+
+
+def test_bulk_insert_commandes_with_invalid_client(db_session):
+    crud.insert_magasin(db_session, 1, "Store1", "123 Street", "City", "123456789")
+
+    with pytest.raises(ValueError, match=r"Client not found with id_client in \[42\]"):
+        crud.bulk_insert_commandes(
+            db_session,
+            [
+                {
+                    "id_client": 42,
+                    "id_magasin": 1,
+                    "date_commande": datetime(2024, 12, 27, 12, 30),
+                }
+            ],
+        )
+
+
+def test_transaction_commits_once(db_session):
+    commits = []
+    event.listen(db_session, "after_commit", lambda session: commits.append(1))
+
+    with crud.transaction(db_session):
+        crud.insert_magasin(db_session, 1, "Store1", "123 Street", "City", "1234")
+        crud.insert_client(db_session, 1, "test client", "Individu", None, None, 0)
+        commande = crud.insert_commande(
+            db_session, None, 1, 1, datetime(2024, 12, 27, 12, 30), "En cours"
+        )
+        crud.increment_fidelite_client(db_session, 1, 10)
+        assert commande.id_commande is not None
+
+    assert len(commits) == 1
+    assert crud.fetch_client_by_id(db_session, 1).points_fidelite == 10
+
+
+def test_transaction_rolls_back_on_error(db_session):
+    try:
+        with crud.transaction(db_session):
+            crud.insert_magasin(db_session, 1, "Store1", "123 Street", "City", "1234")
+            crud.insert_client(db_session, 42, "test client", "Individu", None, None, 0)
+            crud.insert_commande(
+                db_session, None, 1, 999, datetime(2024, 12, 27, 12, 30), "En cours"
+            )
+    except ValueError:
+        pass
+
+    assert db_session.query(Magasin).count() == 0
+    assert db_session.query(Client).count() == 0
+
+
+def test_increment_produit_stock_returning(db_session):
+    crud.insert_produit(db_session, 1, "Test product", "Cheese", 600, 50)
+
+    rows = crud.increment_produit_stock(
+        db_session, 1, 25, returning=("id_produit", "stock_central")
+    )
+
+    assert [tuple(row) for row in rows] == [(1, 75)]
+
+
+def test_increment_produit_stock_missing(db_session):
+    with pytest.raises(
+        ValueError, match="No records found for Produit with filters {'id_produit': 1}"
+    ):
+        crud.increment_produit_stock(db=db_session, id_produit=1, increment_value=1)
+
+
+def test_bulk_increment_produit_stock(db_session):
+    for id_produit in (1, 2, 3):
+        crud.insert_produit(db_session, id_produit, "Test product", "Cheese", 10, 50)
+
+    new_stocks = crud.bulk_increment_produit_stock(db_session, {1: 5, 3: -20})
+
+    assert new_stocks == {1: 55, 3: 30}
+    stocks = dict(db_session.query(Produit.id_produit, Produit.stock_central))
+    assert stocks == {1: 55, 2: 50, 3: 30}
+
+
+def test_bulk_increment_fidelite_clients_missing(db_session):
+    crud.insert_client(db_session, 1, "test client", "Individu", None, None, 10)
+
+    with pytest.raises(ValueError, match=r"Client not found with id_client in \[2\]"):
+        crud.bulk_increment_fidelite_clients(db_session, {1: 5, 2: 5})
+
+    assert crud.fetch_client_by_id(db_session, 1).points_fidelite == 10
+    assert _journal(db_session, 1) == []
+
+
+def test_search_produits(db_session):
+    crud.insert_produit(db_session, 1, "Comté 18 mois", "Pâte pressée cuite", 30, 5)
+    crud.insert_produit(db_session, 2, "Beaufort d'été", "Pâte pressée cuite", 35, 5)
+    crud.insert_produit(db_session, 3, "Reblochon", "Pâte pressée non cuite", 12, 5)
+
+    assert [p.id_produit for p in crud.search_produits(db_session, "comte")] == [1]
+    assert [p.id_produit for p in crud.search_produits(db_session, "reblo")] == [3]
+    assert len(crud.search_produits(db_session, "cuite")) == 3
+    assert crud.search_produits(db_session, '  "*) ') == []
+
+    crud.update_produit_nom(db_session, 3, "Tomme de Savoie")
+    assert crud.search_produits(db_session, "reblochon") == []
+    assert [p.id_produit for p in crud.search_produits(db_session, "tomme")] == [3]
+
+    crud.delete_produit_by_id(db_session, 1)
+    assert crud.search_produits(db_session, "comte") == []
+
+
+def test_search_produits_ranks_every_match(db_session):
+    crud.bulk_insert_produits(
+        db_session,
+        [
+            {
+                "id_produit": i,
+                "nom_produit": f"Comté fruité {i}",
+                "categorie": "Pâte pressée cuite",
+                "prix_unitaire": 30,
+                "stock_central": 5,
+            }
+            for i in range(1, 3001)
+        ],
+    )
+    crud.insert_produit(db_session, 3001, "Comte", "Comte", 30, 5)
+
+    results = crud.search_produits(db_session, "comte", limit=5)
+
+    assert results[0].id_produit == 3001
+    assert len(results) == 5
+
+
+def test_fetch_produits_page(db_session):
+    crud.bulk_insert_produits(
+        db_session,
+        [
+            {
+                "nom_produit": f"Produit {i:02d}",
+                "categorie": "Cheese" if i % 2 else "Wine",
+                "prix_unitaire": 10 + i % 5,
+                "stock_central": 1,
+            }
+            for i in range(30)
+        ],
+    )
+
+    seen = []
+    cursor = None
+    while True:
+        produits, cursor = crud.fetch_produits_page(
+            db_session, categorie="Cheese", sort="prix", cursor=cursor, limit=4
+        )
+        seen.extend(produits)
+        if cursor is None:
+            break
+
+    assert len(seen) == 15
+    assert len({produit.id_produit for produit in seen}) == 15
+    assert all(produit.categorie == "Cheese" for produit in seen)
+    keys = [(produit.prix_unitaire, produit.id_produit) for produit in seen]
+    assert keys == sorted(keys)
+
+
+def test_fetch_produits_page_desc(db_session):
+    for id_produit, prix in [(1, 5), (2, 20), (3, 20), (4, 1)]:
+        crud.insert_produit(db_session, id_produit, "Test product", "Cheese", prix, 1)
+
+    first, cursor = crud.fetch_produits_page(db_session, sort="prix_desc", limit=2)
+    second, cursor = crud.fetch_produits_page(
+        db_session, sort="prix_desc", cursor=cursor, limit=2
+    )
+
+    assert [produit.id_produit for produit in first] == [3, 2]
+    assert [produit.id_produit for produit in second] == [1, 4]
+    assert cursor is None
+
+
+def test_fetch_produits_page_invalid_cursor(db_session):
+    with pytest.raises(ValueError, match="Invalid cursor 'not-a-cursor'"):
+        crud.fetch_produits_page(db_session, cursor="not-a-cursor")
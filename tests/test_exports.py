@@ -0,0 +1,110 @@
+import asyncio
+import csv
+import io
+import json
+from datetime import date, datetime
+import pytest
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from api import exports
+from database.models import Base
+
+SEED = {
+    "orders": (
+        (1, [(1, 2), (2, 3)], datetime(2024, 12, 27, 9)),
+        (2, [(2, 1)], datetime(2024, 12, 27, 18)),
+        (1, [(1, 1)], datetime(2024, 12, 28, 10)),
+        (1, [(2, 2)], datetime(2024, 12, 29, 0)),
+    )
+}
+
+
+def test_csv_export_filters_by_dates_and_store(db_session, seed):
+    seed(db_session, **SEED)
+    out = io.StringIO()
+
+    written = exports.write_export(
+        db_session, out, "factures", "csv", date(2024, 12, 27), date(2024, 12, 28), 1
+    )
+
+    assert written == 2
+    assert list(csv.reader(io.StringIO(out.getvalue()))) == [
+        ["id_facture", "id_commande", "id_magasin", "date_facture", "montant_total"],
+        ["1", "1", "1", "2024-12-27 09:00:00", "49.30"],
+        ["3", "3", "1", "2024-12-28 10:00:00", "12.50"],
+    ]
+
+
+def test_ndjson_export_of_lines(db_session, seed):
+    seed(db_session, **SEED)
+    out = io.StringIO()
+
+    exports.write_export(
+        db_session, out, "lignes", "ndjson", date(2024, 12, 27), date(2024, 12, 27)
+    )
+
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [(line["id_commande"], line["id_produit"]) for line in lines] == [
+        (1, 1),
+        (1, 2),
+        (2, 2),
+    ]
+    assert lines[0] == {
+        "id_ligne": 1,
+        "id_commande": 1,
+        "id_magasin": 1,
+        "date_commande": "2024-12-27T09:00:00",
+        "id_produit": 1,
+        "quantite": 2,
+        "prix_unitaire": "12.50",
+    }
+
+
+def test_rows_come_in_batches(db_session, seed):
+    seed(db_session, **SEED)
+
+    batches = list(
+        exports.iter_rows(
+            db_session, "commandes", date(2024, 1, 1), date(2024, 12, 31), batch_size=3
+        )
+    )
+
+    assert [len(batch) for batch in batches] == [3, 1]
+    assert [row[0] for batch in batches for row in batch] == [1, 2, 3, 4]
+
+
+def test_unknown_export():
+    with pytest.raises(ValueError, match="Unknown export"):
+        exports.export_statement("clients", date(2024, 1, 1), date(2024, 1, 2))
+    with pytest.raises(ValueError, match="Unknown export format"):
+        exports.write_export(
+            None, io.StringIO(), "factures", "xlsx", date(2024, 1, 1), date(2024, 1, 2)
+        )
+
+
+def test_stream_export_over_async_session(seed):
+    async def collect():
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(bind=engine)() as db:
+                await db.run_sync(seed, **SEED)
+                return [
+                    chunk
+                    async for chunk in exports.stream_export(
+                        db,
+                        "commandes",
+                        "csv",
+                        date(2024, 12, 28),
+                        date(2024, 12, 29),
+                        batch_size=1,
+                    )
+                ]
+        finally:
+            await engine.dispose()
+
+    assert asyncio.run(collect()) == [
+        "id_commande,id_client,id_magasin,date_commande,statut_commande\r\n",
+        "3,1,1,2024-12-28 10:00:00,En cours\r\n",
+        "4,1,1,2024-12-29 00:00:00,En cours\r\n",
+    ]
@@ -0,0 +1,37 @@
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from api import loyalty, rollups
+from api.checkout import place_order
+from database.connect_db import make_engine
+from database.generate_data import generate, seed_database
+
+
+def test_generate_is_deterministic():
+    first, second = generate(0.002, seed=7), generate(0.002, seed=7)
+
+    assert first.keys() == second.keys()
+    assert all(first[model] == second[model] for model in first)
+    assert generate(0.002, seed=8) != first
+
+
+def test_seed_database(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'seed.db'}", echo=False)
+    counts = seed_database(engine, scale=0.01)
+
+    assert counts["Commandes"] == 2500
+    assert counts["Lignes_Commande"] > counts["Commandes"]
+    with Session(engine) as db:
+        assert not any(rollups.check_rollups(db).values())
+        assert loyalty.reconcile_balances(db) == {}
+        assert db.scalar(
+            text("SELECT count(*) FROM Produits_fts WHERE Produits_fts MATCH 'p*'")
+        )
+
+        # The indexes and triggers are back after the load
+        names = set(
+            db.scalars(text("SELECT name FROM sqlite_master WHERE sql IS NOT NULL"))
+        )
+        assert {"ix_produits_nom", "Lignes_Commande_rollup_ai"} <= names
+        place_order(db, 1, 1, [(1, 1)])
+        assert not any(rollups.check_rollups(db).values())
+    engine.dispose()
@@ -0,0 +1,67 @@
+from datetime import date, datetime
+import pytest
+from sqlalchemy import update
+import api.crud as crud
+from api import loyalty
+from api.checkout import place_order
+from database.models import Client, HistoriqueFidelite
+
+SEED = {"clients": ((1, 0), (2, None)), "produits": ((12.5, 100),)}
+
+
+def _journal(db_session, id_client):
+    return sum(
+        h.points_ajoutes
+        for h in db_session.query(HistoriqueFidelite).filter_by(id_client=id_client)
+    )
+
+
+def test_accrue_and_redeem(db_session, seed):
+    seed(db_session, **SEED)
+
+    assert loyalty.accrue_points(db_session, 2, 30, "Bienvenue") == 30
+    assert loyalty.redeem_points(db_session, 2, 20, "Bon d'achat") == 10
+    with pytest.raises(ValueError, match="Insufficient loyalty points"):
+        loyalty.redeem_points(db_session, 2, 11)
+    with pytest.raises(ValueError, match="Client not found"):
+        loyalty.redeem_points(db_session, 3, 1)
+
+    assert loyalty.balance(db_session, 2) == 10
+    assert _journal(db_session, 2) == 10
+
+
+def test_nightly_accrual_credits_each_facture_once(db_session, seed):
+    seed(db_session, **SEED)
+    day = datetime(2024, 12, 27, 10)
+    # Checkout credits its Facture right away
+    place_order(db_session, 1, 1, [(1, 2)], day)
+    imported = crud.insert_commande(db_session, None, 2, 1, day, "Livrée")
+    crud.insert_facture(db_session, None, imported.id_commande, 42.9, day)
+    later = crud.insert_commande(db_session, None, 2, 1, day, "Livrée")
+    crud.insert_facture(db_session, None, later.id_commande, 10, datetime(2024, 12, 28))
+
+    assert loyalty.accrue_day(db_session, date(2024, 12, 27)) == 1
+    assert loyalty.accrue_day(db_session, date(2024, 12, 27)) == 0
+
+    db_session.expire_all()
+    assert loyalty.balance(db_session, 1) == 25
+    assert loyalty.balance(db_session, 2) == 42
+    assert loyalty.reconcile_balances(db_session) == {}
+
+    # The nightly run catches up on the days before today
+    assert loyalty.nightly_accrual(db_session, date(2024, 12, 29)) == (1, {})
+    assert loyalty.balance(db_session, 2) == 52
+
+
+def test_reconcile_balances(db_session, seed):
+    seed(db_session, **SEED)
+    # Outside the ledger
+    db_session.execute(
+        update(Client).where(Client.id_client == 1).values(points_fidelite=15)
+    )
+    db_session.commit()
+    loyalty.accrue_points(db_session, 1, 5)
+
+    assert loyalty.reconcile_balances(db_session, repair=True) == {1: (20, 5)}
+    assert loyalty.reconcile_balances(db_session) == {}
+    assert loyalty.balance(db_session, 1) == 20
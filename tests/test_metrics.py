@@ -0,0 +1,75 @@
+import asyncio
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import create_engine
+from api import metrics
+
+
+def _app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/produits/{id_produit}")
+    async def produit(id_produit: int):
+        return {"id_produit": id_produit}
+
+    @app.get("/boom")
+    async def boom():
+        raise RuntimeError("boom")
+
+    app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+def _get(app, *paths):
+    async def get():
+        transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return [await c.get(path) for path in paths]
+
+    return asyncio.run(get())
+
+
+def test_request_metrics():
+    metrics.reset_metrics()
+    _get(_app(), "/produits/1", "/produits/2", "/boom", "/nope")
+
+    text = metrics.render_metrics()
+    assert (
+        'http_requests_total{method="GET",route="/produits/{id_produit}",status="200"} 2'
+        in text
+    )
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1' in text
+    assert 'http_request_errors_total{method="GET",route="/boom"} 1' in text
+    assert "http_requests_in_flight 0" in text
+    assert (
+        'http_request_duration_seconds_bucket{method="GET",'
+        'route="/produits/{id_produit}",le="+Inf"} 2' in text
+    )
+
+
+def test_stats_and_pools(tmp_path, monkeypatch):
+    # Registered on copies, so nothing outlives the test
+    monkeypatch.setattr(metrics, "_stats_sources", dict(metrics._stats_sources))
+    monkeypatch.setattr(metrics, "_pools", dict(metrics._pools))
+    stats = {"hits": 3, "misses": 1, "pending": 2}
+    metrics.register_stats("test_cache", stats, gauges=("pending",))
+    engine = create_engine(f"sqlite:///{tmp_path / 'metrics.db'}", pool_size=2)
+    metrics.register_pool("test", engine)
+
+    try:
+        text = metrics.render_metrics()
+    finally:
+        engine.dispose()
+    assert "affineur_test_cache_hits_total 3" in text
+    assert "affineur_test_cache_pending 2" in text
+    assert "affineur_test_cache_hit_ratio 0.7500" in text
+    assert 'affineur_db_pool_size{pool="test"} 2' in text
+
+
+def test_recording_stays_in_microseconds():
+    n = 20_000
+    start = time.perf_counter()
+    for i in range(n):
+        metrics.record_request("GET", "/bench", 200, i * 1e-5, False)
+    assert (time.perf_counter() - start) / n < 20e-6
@@ -0,0 +1,25 @@
+import asyncio
+from passlib.context import CryptContext
+from api import passwords
+
+
+def test_hash_and_verify_off_the_loop():
+    async def body():
+        hashed = await passwords.hash_password("secret")
+        assert await passwords.verify_password("secret", hashed) == (True, None)
+        assert await passwords.verify_password("wrong", hashed) == (False, None)
+
+    asyncio.run(body())
+    assert passwords.stats["pending"] == 0
+
+
+def test_verify_upgrades_outdated_hash():
+    cheap = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("secret")
+
+    valid, new_hash = asyncio.run(passwords.verify_password("secret", cheap))
+
+    assert valid
+    assert f"${passwords.BCRYPT_ROUNDS:02d}$" in new_hash
+    assert asyncio.run(passwords.verify_password("secret", new_hash)) == (True, None)
+    # A wrong password never produces a new hash
+    assert asyncio.run(passwords.verify_password("wrong", cheap)) == (False, None)
@@ -0,0 +1,80 @@
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+import pytest
+from sqlalchemy import text
+import api.crud as crud
+from api import pricing
+
+SEED = {
+    "produits": ((20, 10), (8.5, 10)),
+    "promotions": (
+        (1, "Summer", date(2024, 6, 1), date(2024, 6, 30), 10),
+        (1, "Flash", date(2024, 6, 10), date(2024, 6, 12), 25),
+    ),
+}
+
+
+def test_effective_prices(db_session, seed):
+    seed(db_session, **SEED)
+
+    assert pricing.effective_prices(db_session, [1, 2], date(2024, 5, 31)) == {
+        1: Decimal("20.00"),
+        2: Decimal("8.50"),
+    }
+    assert pricing.effective_price(db_session, 1, date(2024, 6, 1)) == Decimal("18.00")
+    # Overlapping promotions: the best reduction applies
+    assert pricing.effective_price(db_session, 1, date(2024, 6, 11)) == Decimal("15.00")
+
+
+def test_effective_prices_cached_until_price_change(db_session, seed):
+    seed(db_session, **SEED)
+    day = date(2024, 6, 1)
+    pricing.effective_prices(db_session, [1, 2], day)
+
+    hits = pricing.stats["hits"]
+    assert pricing.effective_price(db_session, 2, day) == Decimal("8.50")
+    assert pricing.stats["hits"] == hits + 1
+
+    crud.update_produit_prix(db_session, 2, 10)
+    assert pricing.effective_price(db_session, 2, day) == Decimal("10.00")
+
+    crud.insert_promotion(db_session, None, 2, "New", day, day, 50)
+    assert pricing.effective_price(db_session, 2, day) == Decimal("5.00")
+
+
+def test_cached_prices_expire(db_session, monkeypatch, seed):
+    seed(db_session, **SEED)
+    day = date(2024, 6, 1)
+    pricing.effective_prices(db_session, [2], day)
+
+    # As another worker would: the change doesn't invalidate this cache
+    db_session.execute(
+        text("UPDATE Produits SET prix_unitaire = 9 WHERE id_produit = 2")
+    )
+    db_session.commit()
+    assert pricing.effective_price(db_session, 2, day) == Decimal("8.50")
+
+    later = time.monotonic() + pricing.PRICE_TTL + 1
+    monkeypatch.setattr(pricing.time, "monotonic", lambda: later)
+    assert pricing.effective_price(db_session, 2, day) == Decimal("9.00")
+
+
+def test_price_cache_keeps_recent_days(db_session, monkeypatch, seed):
+    seed(db_session, **SEED)
+    monkeypatch.setattr(pricing, "MAX_CACHED_DAYS", 2)
+    start = date(2024, 6, 1)
+    for offset in range(4):
+        pricing.effective_prices(db_session, [1, 2], start + timedelta(days=offset))
+
+    assert list(pricing._prices) == [
+        start + timedelta(days=2),
+        start + timedelta(days=3),
+    ]
+
+
+def test_effective_price_unknown_produit(db_session):
+    with pytest.raises(
+        ValueError, match="Produit not found with filters {'id_produit': 42}"
+    ):
+        pricing.effective_price(db_session, 42)
@@ -0,0 +1,75 @@
+import asyncio
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+from database import query_stats
+from database.connect_db import make_async_engine, make_engine
+from database.query_stats import QueryStatsMiddleware, statement_shape
+
+
+def test_statement_shape():
+    assert (
+        statement_shape("SELECT *\n  FROM Produits WHERE id_produit IN (?, ?, ?)")
+        == "SELECT * FROM Produits WHERE id_produit IN (?)"
+    )
+
+
+def _app(debug_headers: bool) -> FastAPI:
+    engine = make_engine("sqlite:///:memory:", profile="legacy", echo=False)
+    async_engine = make_async_engine(
+        "sqlite+aiosqlite:///:memory:", profile="legacy", echo=False
+    )
+    app = FastAPI()
+
+    # Sync endpoint: runs in the thread pool
+    @app.get("/loop")
+    def loop():
+        with engine.connect() as conn:
+            for i in range(query_stats.N_PLUS_ONE_THRESHOLD):
+                conn.execute(text("SELECT :i"), {"i": i})
+        return {}
+
+    @app.get("/once")
+    async def once():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+        return {}
+
+    app.add_middleware(QueryStatsMiddleware, debug_headers=debug_headers)
+    return app
+
+
+def _get(app: FastAPI, path: str) -> httpx.Response:
+    async def get():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://t") as c:
+            return await c.get(path)
+
+    return asyncio.run(get())
+
+
+def test_request_stats_headers():
+    app = _app(debug_headers=True)
+    before = dict(query_stats.stats)
+
+    response = _get(app, "/loop")
+    assert response.headers["x-db-statements"] == str(query_stats.N_PLUS_ONE_THRESHOLD)
+    assert response.headers["x-db-n-plus-one"] == "1"
+    assert response.headers["x-db-slowest"].endswith("SELECT ?")
+    assert float(response.headers["x-db-time-ms"]) > 0
+
+    response = _get(app, "/once")
+    assert response.headers["x-db-statements"] == "1"
+    assert "x-db-n-plus-one" not in response.headers
+
+    assert query_stats.stats["requests"] == before["requests"] + 2
+    assert query_stats.stats["n_plus_one_requests"] == (
+        before["n_plus_one_requests"] + 1
+    )
+    assert query_stats.n_plus_one_shapes["SELECT ?"] >= 5
+
+
+def test_no_headers_outside_debug():
+    response = _get(_app(debug_headers=False), "/once")
+
+    assert "x-db-statements" not in response.headers
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+import numpy as np
+import pytest
+import api.crud as crud
+from api import replenishment
+from database.models import Produit, StockMagasin
+
+
+def test_plan_transfers_caps_at_central_stock():
+    # id_magasin, id_produit, vendu (28 days), stock_magasin, stock_central
+    sales = np.array(
+        [
+            [1, 10, 56, 0, 100],  # 2/day, empty: topped up to 28
+            [1, 20, 28, 20, 100],  # 1/day, 20 days of stock: nothing
+            [1, 30, 56, 0, 30],  # product 30 is short: 30 split 28:14
+            [2, 30, 28, 0, 30],
+        ]
+    )
+
+    plan = replenishment.plan_transfers(sales)
+
+    assert plan.rows() == [(1, 10, 28), (1, 30, 20), (2, 30, 10)]
+
+
+def test_plan_and_apply(db_session):
+    crud.insert_magasin(db_session, 1, "Store1", "123 Street", "City", "123456789")
+    crud.insert_client(db_session, 1, "test client", "Individu", None, None, 0)
+    crud.insert_produit(db_session, 1, "Beaufort", "Cheese", 12.5, 100)
+    crud.insert_produit(db_session, 2, "Tomme", "Cheese", 8, 100)
+    db_session.add(StockMagasin(id_magasin=1, id_produit=2, stock_disponible=50))
+    now = datetime(2024, 12, 27)
+    commande = crud.insert_commande(
+        db_session, None, 1, 1, now - timedelta(days=3), "Livrée"
+    )
+    old = crud.insert_commande(
+        db_session, None, 1, 1, now - timedelta(days=60), "Livrée"
+    )
+    crud.insert_ligne_commande(db_session, None, commande.id_commande, 1, 28, 12.5)
+    crud.insert_ligne_commande(db_session, None, commande.id_commande, 2, 28, 8)
+    crud.insert_ligne_commande(db_session, None, old.id_commande, 2, 500, 8)
+
+    plan = replenishment.plan_replenishment(db_session, now)
+    assert plan.rows() == [(1, 1, 14)]
+
+    assert replenishment.apply_plan(db_session, plan) == 1
+    db_session.expire_all()
+    assert db_session.get(Produit, 1).stock_central == 86
+    assert db_session.get(StockMagasin, (1, 1)).stock_disponible == 14
+
+    # The central stock moved on since the plan was made
+    crud.decrement_produit_stock(db_session, 1, 80)
+    with pytest.raises(ValueError):
+        replenishment.apply_plan(db_session, plan)
+    db_session.expire_all()
+    assert db_session.get(StockMagasin, (1, 1)).stock_disponible == 14
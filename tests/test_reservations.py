@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+import pytest
+from api import reservations
+from database.models import Produit, Reservation, StockMagasin
+from tests.stress import run_stress
+
+SEED = {"produits": ((12.5, 10), (8, 3)), "stock_magasins": ((1, 1, 4),)}
+
+
+def _stock_central(db_session, id_produit):
+    db_session.expire_all()
+    return db_session.get(Produit, id_produit).stock_central
+
+
+def test_reserve_confirm_and_release(db_session, seed):
+    seed(db_session, **SEED)
+
+    sold = reservations.reserve_stock(db_session, [(1, 4), (2, 3)])
+    held = reservations.reserve_stock(db_session, [(1, 5)])
+    assert _stock_central(db_session, 1) == 1
+    assert _stock_central(db_session, 2) == 0
+
+    assert reservations.confirm_reservation(db_session, sold) == {1: 4, 2: 3}
+    with pytest.raises(ValueError):
+        reservations.confirm_reservation(db_session, sold)
+
+    assert reservations.release_reservation(db_session, held) == 1
+    assert _stock_central(db_session, 1) == 6
+    assert db_session.query(Reservation).count() == 0
+
+
+def test_reserve_is_all_or_nothing(db_session, seed):
+    seed(db_session, **SEED)
+
+    with pytest.raises(ValueError, match=r"Insufficient stock for produits \[2\]"):
+        reservations.reserve_stock(db_session, [(1, 2), (2, 4)])
+
+    assert _stock_central(db_session, 1) == 10
+    assert db_session.query(Reservation).count() == 0
+
+
+def test_store_stock_and_expiry(db_session, seed):
+    seed(db_session, **SEED)
+
+    token = reservations.reserve_stock(
+        db_session, [(1, 3)], id_magasin=1, ttl=timedelta(minutes=5)
+    )
+    with pytest.raises(ValueError):
+        reservations.reserve_stock(db_session, [(1, 2)], id_magasin=1)
+    assert _stock_central(db_session, 1) == 10
+
+    # Nothing has expired yet
+    assert reservations.release_expired_reservations(db_session) == 0
+    later = datetime.now() + timedelta(minutes=10)
+    assert reservations.release_expired_reservations(db_session, later) == 1
+
+    db_session.expire_all()
+    assert db_session.get(StockMagasin, (1, 1)).stock_disponible == 4
+    with pytest.raises(ValueError):
+        reservations.confirm_reservation(db_session, token)
+
+
+def test_concurrent_reservations_never_oversell():
+    result = run_stress(threads=6, ops=60, nb_produits=3, stock=20)
+
+    assert result["rejected"] > 0  # the stock did run out
+    assert result["unaccounted_units"] == 0
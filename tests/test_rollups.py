@@ -0,0 +1,124 @@
+from datetime import date, datetime
+from decimal import Decimal
+import pytest
+import api.crud as crud
+from api import rollups
+from api.checkout import place_order
+from database.models import LigneCommande, VenteJournaliere
+
+SEED = {
+    "orders": (
+        (1, [(1, 2), (2, 3)], datetime(2024, 12, 27, 9)),
+        (1, [(1, 1)], datetime(2024, 12, 27, 18)),
+        (2, [(2, 1)], datetime(2024, 12, 28, 10)),
+    )
+}
+
+
+def test_triggers_keep_rollups_current(db_session, seed):
+    seed(db_session, **SEED)
+
+    assert rollups.fetch_sales(
+        db_session, date(2024, 12, 27), date(2024, 12, 27), by=("id_produit",)
+    ) == [
+        {
+            "id_produit": 1,
+            "quantite": 3,
+            "nb_commandes": 2,
+            "montant": Decimal("37.50"),
+        },
+        {
+            "id_produit": 2,
+            "quantite": 3,
+            "nb_commandes": 1,
+            "montant": Decimal("24.30"),
+        },
+    ]
+    assert rollups.fetch_invoice_totals(
+        db_session, date(2024, 12, 1), date(2024, 12, 31), by=("id_magasin",)
+    ) == [
+        {"id_magasin": 1, "nb_factures": 2, "montant": Decimal("61.80")},
+        {"id_magasin": 2, "nb_factures": 1, "montant": Decimal("8.10")},
+    ]
+
+    # Deleting a line takes it back out
+    ligne = db_session.query(LigneCommande).filter_by(id_produit=2).first()
+    db_session.delete(ligne)
+    db_session.commit()
+    assert rollups.fetch_sales(
+        db_session, date(2024, 12, 27), date(2024, 12, 28), id_produit=2
+    ) == [
+        {
+            "jour": date(2024, 12, 28),
+            "quantite": 1,
+            "nb_commandes": 1,
+            "montant": Decimal("8.10"),
+        }
+    ]
+
+    assert rollups.check_rollups(db_session) == {
+        "Ventes_Journalieres": [],
+        "Factures_Journalieres": [],
+    }
+
+
+def test_nb_commandes_counts_orders_not_lines(db_session, seed):
+    seed(db_session, **SEED)
+    commande = place_order(db_session, 1, 1, [(1, 1)], datetime(2024, 12, 29, 9))
+    # A second line of the same product in the same order
+    extra = crud.insert_ligne_commande(
+        db_session, None, commande.id_commande, 1, 2, 12.5
+    )
+
+    def sales():
+        return rollups.fetch_sales(
+            db_session, date(2024, 12, 29), date(2024, 12, 29), by=("id_produit",)
+        )
+
+    assert sales() == [
+        {
+            "id_produit": 1,
+            "quantite": 3,
+            "nb_commandes": 1,
+            "montant": Decimal("37.50"),
+        }
+    ]
+    assert not any(rollups.check_rollups(db_session).values())
+
+    # Moving the extra line to another product counts the order there
+    extra.id_produit = 2
+    db_session.commit()
+    assert [(row["id_produit"], row["nb_commandes"]) for row in sales()] == [
+        (1, 1),
+        (2, 1),
+    ]
+
+    db_session.delete(extra)
+    db_session.commit()
+    assert [(row["id_produit"], row["nb_commandes"]) for row in sales()] == [(1, 1)]
+    assert not any(rollups.check_rollups(db_session).values())
+
+
+def test_check_and_rebuild(db_session, seed):
+    seed(db_session, **SEED)
+    db_session.query(VenteJournaliere).filter_by(id_magasin=2).delete()
+    db_session.get(VenteJournaliere, (date(2024, 12, 27), 1, 1)).quantite = 7
+    db_session.commit()
+
+    assert rollups.check_rollups(db_session)["Ventes_Journalieres"] == [
+        (date(2024, 12, 27), 1, 1),
+        (date(2024, 12, 28), 2, 2),
+    ]
+
+    assert rollups.rebuild_rollups(db_session) == {
+        "Ventes_Journalieres": 3,
+        "Factures_Journalieres": 2,
+    }
+    assert not any(rollups.check_rollups(db_session).values())
+
+
+def test_fetch_rejects_unknown_group(db_session):
+    with pytest.raises(ValueError):
+        rollups.fetch_sales(
+            db_session, date(2024, 1, 1), date(2024, 12, 31), by=("ville",)
+        )
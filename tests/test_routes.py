@@ -0,0 +1,96 @@
+import importlib
+import pytest
+from fastapi.testclient import TestClient
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool
+from benchmarks.bench_http import APP_PACKAGE, load_app
+from database.models import Base, Magasin
+
+# routes.py uses package-relative imports: the app is loaded as the
+# benchmarks load it, and its modules are reached under that package.
+
+
+def _module(name):
+    return importlib.import_module(f"{APP_PACKAGE}.{name}")
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = load_app()
+    path = tmp_path / "routes.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.execute(
+            Magasin.__table__.insert(),
+            {
+                "id_magasin": 1,
+                "nom_magasin": "Fromagerie du Lac",
+                "adresse": "1 quai",
+                "ville": "Annecy",
+                "telephone": "0450000000",
+            },
+        )
+    engine.dispose()
+
+    # No pool: the TestClient's event loop is gone once a request is served
+    async_engine = create_async_engine(
+        f"sqlite+aiosqlite:///{path}", poolclass=NullPool
+    )
+    AsyncSessionLocal = async_sessionmaker(bind=async_engine, expire_on_commit=False)
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    app.dependency_overrides[_module("database.connect_db").get_async_db] = get_async_db
+    app.dependency_overrides[_module("api.auth").get_current_user] = lambda: {
+        "id_user": 1,
+        "username": "test",
+        "role": "regular",
+    }
+    _module("api.catalog_cache").invalidate_catalog()
+    try:
+        yield TestClient(app), path
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_home_htmx_partial_and_cached_store_card(client):
+    client, path = client
+
+    full = client.get("/")
+    partial = client.get("/", headers={"HX-Request": "true"})
+
+    assert full.status_code == partial.status_code == 200
+    assert "<html" in full.text
+    assert "<html" not in partial.text
+    assert "Fromagerie du Lac" in partial.text
+
+    # Renamed behind the app's back: the cached store card still answers
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE Magasins SET nom_magasin = 'Renamed'"))
+    engine.dispose()
+    hits = _module("api.catalog_cache").stats["hits"]
+
+    again = client.get("/", headers={"HX-Request": "true"})
+
+    assert "Fromagerie du Lac" in again.text
+    assert "Renamed" not in again.text
+    assert _module("api.catalog_cache").stats["hits"] > hits
+
+
+def test_templates_compiled_to_bytecode_cache(client, tmp_path, monkeypatch):
+    client, _ = client
+    env = _module("api.routes").templates.env
+    cache_dir = tmp_path / "jinja"
+    cache_dir.mkdir()
+    monkeypatch.setattr(env, "bytecode_cache", FileSystemBytecodeCache(str(cache_dir)))
+    env.cache.clear()
+
+    assert client.get("/", headers={"HX-Request": "true"}).status_code == 200
+
+    assert list(cache_dir.glob("__jinja2_*.cache"))
@@ -0,0 +1,67 @@
+from datetime import timedelta
+from sqlalchemy import insert, select, update
+from api import sessions
+from database.models import Session as UserSession
+
+
+def test_create_lookup_revoke(run_with_session):
+    async def body(db):
+        session = await sessions.create_session(db, user_id=7)
+        token = session.session_token
+
+        hits = sessions.stats["hits"]
+        assert await sessions.lookup_session(db, token) == 7
+        assert sessions.stats["hits"] == hits + 1
+
+        # A cold cache falls back to the table
+        sessions.clear_session_cache()
+        assert await sessions.lookup_session(db, token) == 7
+
+        await sessions.revoke_session(db, token)
+        assert await sessions.lookup_session(db, token) is None
+        assert await sessions.lookup_session(db, "unknown") is None
+
+    run_with_session(body)
+
+
+def test_revocation_by_another_worker(run_with_session):
+    async def body(db):
+        token = (await sessions.create_session(db, user_id=7)).session_token
+
+        # Another worker revokes the session: our cached copy still answers
+        await db.execute(
+            update(UserSession)
+            .where(UserSession.session_token == token)
+            .values(revoked_at=sessions._utcnow())
+        )
+        await db.commit()
+        assert await sessions.lookup_session(db, token) == 7
+
+        assert await sessions.poll_revocations(db) >= 1
+        assert await sessions.lookup_session(db, token) is None
+
+    run_with_session(body)
+
+
+def test_sweep_sessions_in_batches(run_with_session):
+    async def body(db):
+        now = sessions._utcnow()
+        await db.execute(
+            insert(UserSession),
+            [
+                {
+                    "user_id": 1,
+                    "session_token": f"expired-{i}",
+                    "expires_at": now - timedelta(minutes=1),
+                }
+                for i in range(12)
+            ],
+        )
+        await db.commit()
+        live = await sessions.create_session(db, user_id=1)
+
+        assert await sessions.sweep_sessions(db, batch_size=5) == 12
+        tokens = (await db.scalars(select(UserSession.session_token))).all()
+        assert tokens == [live.session_token]
+
+    run_with_session(body)
@@ -0,0 +1,54 @@
+import gzip
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from api.static_assets import PrecompressedStaticFiles, build_static
+
+CSS = b"body { color: #333; }\n" * 50
+
+
+def _build(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "main.css").write_bytes(CSS)
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG not compressible")
+    return build_static(tmp_path)
+
+
+def test_build_fingerprints_and_compresses(tmp_path):
+    manifest = _build(tmp_path)
+    dist = tmp_path / "dist"
+
+    css = manifest["css/main.css"]
+    assert css.startswith("css/main.") and css.endswith(".css")
+    assert (dist / css).read_bytes() == CSS
+    assert gzip.decompress((dist / f"{css}.gz").read_bytes()) == CSS
+    assert not (dist / f"{manifest['logo.png']}.gz").exists()
+
+    # Same content, same name; and dist/ isn't picked up as a source
+    assert build_static(tmp_path) == manifest
+
+
+def test_serves_precompressed_variant(tmp_path):
+    manifest = _build(tmp_path)
+    app = Starlette(
+        routes=[Mount("/dist", PrecompressedStaticFiles(directory=tmp_path / "dist"))]
+    )
+    client = TestClient(app)
+    url = f"/dist/{manifest['css/main.css']}"
+
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["content-type"].startswith("text/css")
+    assert "immutable" in response.headers["cache-control"]
+    assert response.content == CSS
+
+    identity = client.get(url, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+    assert identity.headers["etag"] != response.headers["etag"]
+
+    cached = client.get(
+        url,
+        headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["etag"]},
+    )
+    assert cached.status_code == 304
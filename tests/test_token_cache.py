@@ -0,0 +1,39 @@
+import time
+from api import token_cache
+
+
+def test_cached_payload_hit_and_miss():
+    token_cache.clear_token_cache()
+    payload = {"sub": "alice", "id": 1, "exp": time.time() + 60}
+
+    assert token_cache.cached_payload("tok") is None
+    token_cache.cache_payload("tok", payload)
+    hits = token_cache.stats["hits"]
+    assert token_cache.cached_payload("tok") == payload
+    assert token_cache.stats["hits"] == hits + 1
+
+    token_cache.invalidate_token("tok")
+    assert token_cache.cached_payload("tok") is None
+
+
+def test_cached_payload_expires_with_token():
+    token_cache.clear_token_cache()
+    token_cache.cache_payload("old", {"sub": "alice", "exp": time.time() - 1})
+    token_cache.cache_payload("forever", {"sub": "alice"})
+
+    assert token_cache.cached_payload("old") is None
+    assert token_cache.cached_payload("forever") is None
+
+
+def test_cache_is_bounded(monkeypatch):
+    token_cache.clear_token_cache()
+    monkeypatch.setattr(token_cache, "MAX_CACHED_TOKENS", 2)
+    exp = time.time() + 60
+    token_cache.cache_payload("a", {"exp": exp})
+    token_cache.cache_payload("b", {"exp": exp})
+    token_cache.cached_payload("a")  # "b" is now the least recently used
+    token_cache.cache_payload("c", {"exp": exp})
+
+    assert token_cache.cached_payload("b") is None
+    assert token_cache.cached_payload("a") is not None
+    assert token_cache.cached_payload("c") is not None